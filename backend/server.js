@@ -264,6 +264,7 @@ app.post('/api/create-ticket', async (req, res) => {
         
         try {
             let ticketResponse;
+            let ticketQueued = false;
             
             if (process.env.RAILWAY_ENVIRONMENT === 'production') {
                 // Use internal ticket creation for Railway
@@ -282,20 +283,23 @@ app.post('/api/create-ticket', async (req, res) => {
                     throw new Error('Discord bot webhook server is offline');
                 }
                 
+                // Ask the bot to queue the ticket (202) so checkout doesn't wait on Discord
                 const response = await axios.post(DISCORD_BOT_WEBHOOK_URL, webhookData, {
                     timeout: 10000,
                     headers: {
-                        'Content-Type': 'application/json'
+                        'Content-Type': 'application/json',
+                        'Prefer': 'respond-async'
                     }
                 });
                 
                 ticketResponse = response.data;
+                ticketQueued = response.status === 202;
                 console.log('✅ Discord webhook response:', ticketResponse);
             }
             
             res.json({
                 success: true,
-                message: 'Ticket created successfully',
+                message: ticketQueued ? 'Ticket queued successfully' : 'Ticket created successfully',
                 transactionId: transactionId,
                 ticketData: ticketResponse
             });
@@ -412,7 +416,10 @@ async function createDiscordTicketInternal(ticketData) {
         }
         
         const ticketFile = path.join(ticketsDir, `ticket_${ticketData.transactionId}.json`);
-        fs.writeFileSync(ticketFile, JSON.stringify(ticketData, null, 2));
+        // Write under a name the bot ignores, then rename, so it never reads a half-written file
+        const tmpFile = path.join(ticketsDir, `.ticket_${ticketData.transactionId}.json.${process.pid}.tmp`);
+        fs.writeFileSync(tmpFile, JSON.stringify(ticketData, null, 2));
+        fs.renameSync(tmpFile, ticketFile);
         
         console.log('✅ Ticket data saved for Discord bot processing:', ticketFile);
         return { success: true, ticket_id: ticketData.transactionId };
@@ -0,0 +1,118 @@
+#!/usr/bin/env python3
+# -*- coding: utf-8 -*-
+"""Micro-benchmarks for the bot's hot paths
+
+Usage: python benchmarks.py [benchmark ...]
+Runs every benchmark when none are named. Needs no Discord connection.
+"""
+
+import sys
+import timeit
+from types import SimpleNamespace
+
+from member_index import MemberIndex
+from permissions import PermissionEngine
+
+
+class _FakeMember(SimpleNamespace):
+    def __str__(self):
+        return self.name
+
+
+def _fake_member(index):
+    return _FakeMember(
+        id=100000 + index,
+        name=f"buyer{index}",
+        global_name=f"Buyer {index}",
+        display_name=f"Buyer{index}Nick",
+    )
+
+
+def _best_of(func, number, repeat=3):
+    """Best per-call time in microseconds over a few repeats"""
+    return min(timeit.repeat(func, number=number, repeat=repeat)) / number * 1e6
+
+
+def bench_member_index(sizes=(1_000, 10_000, 100_000), lookups=2_000):
+    """Buyer resolution: linear guild.members scan vs MemberIndex"""
+    print("👥 Member lookup (µs per lookup)")
+    print(f"   {'members':>9} {'linear scan':>12} {'index':>9}")
+    for size in sizes:
+        members = [_fake_member(i) for i in range(size)]
+        index = MemberIndex()
+        index.rebuild(members)
+        # Worst case for the scan: the buyer is the last member
+        target = members[-1]
+        discord_user = str(target)
+        buyer_name = target.display_name
+
+        def linear():
+            for member in members:
+                if str(member) == discord_user or member.display_name.lower() == buyer_name.lower():
+                    return member
+            return None
+
+        def indexed():
+            return index.resolve(discord_user, buyer_name)
+
+        scan_runs = max(1, lookups * 100 // size)
+        linear_us = _best_of(linear, scan_runs)
+        index_us = _best_of(indexed, lookups)
+        print(f"   {size:>9,} {linear_us:>12.1f} {index_us:>9.2f}")
+
+
+def bench_permissions(role_counts=(5, 50), allowed_roles=20, checks=100_000):
+    """has_ticket_permissions: list/any() check vs PermissionEngine (cold and cached)"""
+    owner_id = 1
+    allowed_user_ids = list(range(10, 30))
+    allowed_role_ids = list(range(1_000, 1_000 + allowed_roles))
+    guild = SimpleNamespace(id=42, owner_id=owner_id)
+    engine = PermissionEngine(owner_id, allowed_user_ids, allowed_role_ids)
+
+    print("🔐 Permission check (µs per check)")
+    print(f"   {'member roles':>12} {'list/any':>9} {'engine cold':>12} {'engine cached':>14}")
+    for role_count in role_counts:
+        # Worst case: a non-staff member, so every role has to be checked
+        member = SimpleNamespace(
+            id=999,
+            roles=[SimpleNamespace(id=5_000 + i) for i in range(role_count)],
+            guild_permissions=SimpleNamespace(administrator=False),
+        )
+
+        def legacy():
+            if member.id == guild.owner_id or member.id == owner_id:
+                return True
+            if member.id in allowed_user_ids:
+                return True
+            user_role_ids = [role.id for role in member.roles]
+            return any(role_id in allowed_role_ids for role_id in user_role_ids)
+
+        def cold():
+            engine.clear()
+            return engine.allows(member, guild)
+
+        def cached():
+            return engine.allows(member, guild)
+
+        print(f"   {role_count:>12} {_best_of(legacy, checks // 10):>9.2f} "
+              f"{_best_of(cold, checks // 10):>12.2f} {_best_of(cached, checks):>14.3f}")
+
+
+BENCHMARKS = {
+    'member_index': bench_member_index,
+    'permissions': bench_permissions,
+}
+
+
+def main(argv):
+    names = argv or list(BENCHMARKS)
+    for name in names:
+        if name not in BENCHMARKS:
+            print(f"❌ Unknown benchmark: {name} (available: {', '.join(BENCHMARKS)})")
+            return 1
+        BENCHMARKS[name]()
+    return 0
+
+
+if __name__ == "__main__":
+    sys.exit(main(sys.argv[1:]))
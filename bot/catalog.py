@@ -0,0 +1,222 @@
+#!/usr/bin/env python3
+# -*- coding: utf-8 -*-
+"""In-memory product catalog built from stores/*.json, used to check order totals with exact decimals"""
+
+import json
+import logging
+import os
+import re
+import time
+from collections import namedtuple
+from decimal import Decimal, InvalidOperation
+from types import MappingProxyType
+
+log = logging.getLogger('donutmarket.catalog')
+
+CENTS = Decimal('0.01')
+
+Product = namedtuple('Product', 'store_id store_name name price currency type unit min_amount max_amount')
+
+# "12M", "12.5 M", "3x", "1"
+_AMOUNT = re.compile(r'^\s*(\d+(?:\.\d+)?)\s*([A-Za-z]*)\s*$')
+
+
+def to_decimal(value):
+    """Exact decimal for a JSON number or string ("$1.20" allowed); None if unparseable"""
+    if value is None or isinstance(value, bool):
+        return None
+    try:
+        return Decimal(str(value).strip().lstrip('$'))
+    except InvalidOperation:
+        return None
+
+
+def parse_amount(amount):
+    """(quantity, unit) for an order amount like "12M" or "1x"; None if unreadable"""
+    match = _AMOUNT.match(str(amount if amount is not None else '1x'))
+    if not match:
+        return None
+    return Decimal(match.group(1)), match.group(2)
+
+
+def _key(name):
+    return str(name or '').strip().casefold()
+
+
+class OrderCheck:
+    __slots__ = ('issues', 'expected_total')
+
+    def __init__(self, issues, expected_total):
+        self.issues = issues
+        self.expected_total = expected_total
+
+    @property
+    def ok(self):
+        return not self.issues
+
+
+class StoreCatalog:
+    """Read-only product tables for every store file, keyed by store and by product name
+
+    refresh() stats the directory and re-parses only files whose mtime
+    changed; check_order() triggers it at most once per reload_interval,
+    so checking an order is otherwise a few dictionary lookups.
+    """
+
+    def __init__(self, directory, reload_interval=30.0):
+        self.directory = directory
+        self.reload_interval = reload_interval
+        self._files = {}
+        # store key (id or name) -> {product key: Product}
+        self._stores = MappingProxyType({})
+        # product key -> Products with that name across stores
+        self._products = MappingProxyType({})
+        # store key (id or name) -> store id
+        self._store_ids = MappingProxyType({})
+        self._scanned_at = None
+
+    def __len__(self):
+        return len(self._files)
+
+    def refresh(self):
+        """Reload changed store files; returns True if the tables were rebuilt"""
+        self._scanned_at = time.monotonic()
+        try:
+            entries = [entry for entry in os.scandir(self.directory) if entry.name.endswith('.json') and entry.is_file()]
+        except OSError as e:
+            log.warning(f"⚠️ Can't read store directory {self.directory}: {e}")
+            return False
+        changed = False
+        seen = set()
+        for entry in entries:
+            seen.add(entry.name)
+            mtime = entry.stat().st_mtime_ns
+            cached = self._files.get(entry.name)
+            if cached and cached[0] == mtime:
+                continue
+            products = self._load(entry.path)
+            if products is None:
+                # Keep the last good version of a file that is mid-edit or broken
+                if cached:
+                    self._files[entry.name] = (mtime, cached[1])
+                continue
+            self._files[entry.name] = (mtime, products)
+            changed = True
+        for name in set(self._files) - seen:
+            del self._files[name]
+            changed = True
+        if changed:
+            self._rebuild()
+        return changed
+
+    def _load(self, path):
+        try:
+            with open(path, 'r', encoding='utf-8') as f:
+                data = json.load(f)
+        except (OSError, ValueError) as e:
+            log.warning(f"⚠️ Skipping store file {os.path.basename(path)}: {e}")
+            return None
+        if not isinstance(data, dict) or not isinstance(data.get('storeProducts'), list):
+            return ()
+        store_id = data.get('storeId') or os.path.splitext(os.path.basename(path))[0]
+        store_name = data.get('storeName') or store_id
+        products = []
+        for raw in data['storeProducts']:
+            price = to_decimal(raw.get('productPrice'))
+            if not raw.get('productName') or price is None:
+                log.warning(f"⚠️ {store_id}: skipping product without a name or valid price: {raw.get('productName')!r}")
+                continue
+            products.append(Product(
+                store_id, store_name, raw['productName'], price,
+                raw.get('productCurrency', 'USD'), raw.get('productType', 'item'), raw.get('productUnit') or '',
+                to_decimal(raw.get('minAmount')), to_decimal(raw.get('maxAmount')),
+            ))
+        return tuple(products)
+
+    def _rebuild(self):
+        stores = {}
+        by_name = {}
+        store_ids = {}
+        for _, products in self._files.values():
+            for product in products:
+                store_ids[_key(product.store_id)] = store_ids[_key(product.store_name)] = product.store_id
+                table = stores.setdefault(_key(product.store_id), {})
+                table[_key(product.name)] = product
+                stores[_key(product.store_name)] = table
+                by_name.setdefault(_key(product.name), []).append(product)
+        self._stores = MappingProxyType({key: MappingProxyType(table) for key, table in stores.items()})
+        self._products = MappingProxyType({key: tuple(products) for key, products in by_name.items()})
+        self._store_ids = MappingProxyType(store_ids)
+        log.info(f"🏪 Loaded catalog: {len(self._files)} store file(s), {len(self._products)} products")
+
+    def _maybe_refresh(self):
+        if self._scanned_at is None or time.monotonic() - self._scanned_at >= self.reload_interval:
+            self.refresh()
+
+    def store_id(self, store):
+        """Store id for a store id or display name (as carried on orders), or None"""
+        return self._store_ids.get(_key(store))
+
+    def product(self, name, store=None):
+        """The catalog entry for an item name in the given store (or the only one by that name if no store)"""
+        if store is not None:
+            table = self._stores.get(_key(store))
+            return table.get(_key(name)) if table is not None else None
+        matches = self._products.get(_key(name))
+        return matches[0] if matches and len(matches) == 1 else None
+
+    def check_order(self, items, total_amount, store=None):
+        """Compare an order's item prices, amounts and total with the catalog"""
+        self._maybe_refresh()
+        issues = []
+        expected_total = Decimal(0)
+        for item in items:
+            name = item.get('name', 'Unknown Item')
+            item_store = item.get('store') or store
+            if item_store is not None and _key(item_store) not in self._stores:
+                # Never price against another store's product of the same name
+                issues.append(f"{name}: unknown store {item_store!r}")
+                expected_total = None
+                continue
+            product = self.product(name, item_store)
+            if product is None:
+                issues.append(f"{name}: not in the catalog")
+                expected_total = None
+                continue
+            quantity = self._quantity(product, item.get('amount'), issues)
+            if quantity is None:
+                expected_total = None
+                continue
+            expected = (product.price * quantity).quantize(CENTS)
+            if expected_total is not None:
+                expected_total += expected
+            if 'price' in item:
+                charged = to_decimal(item['price'])
+                if charged is None or charged.quantize(CENTS) != expected:
+                    issues.append(f"{name}: charged ${item['price']}, catalog price ${expected}")
+        total = to_decimal(total_amount)
+        if total is None:
+            issues.append(f"Total {total_amount!r} is not a number")
+        elif expected_total is not None and total.quantize(CENTS) != expected_total:
+            issues.append(f"Total ${total.quantize(CENTS)} doesn't match catalog total ${expected_total}")
+        return OrderCheck(issues, expected_total)
+
+    @staticmethod
+    def _quantity(product, amount, issues):
+        parsed = parse_amount(amount)
+        if parsed is None:
+            issues.append(f"{product.name}: unreadable amount {amount!r}")
+            return None
+        quantity, unit = parsed
+        if product.type == 'currency':
+            if unit and unit.casefold() != product.unit.casefold():
+                issues.append(f"{product.name}: amount {amount} is not in {product.unit}")
+                return None
+            if product.min_amount is not None and quantity < product.min_amount:
+                issues.append(f"{product.name}: {amount} is below the minimum {product.min_amount}{product.unit}")
+            if product.max_amount is not None and quantity > product.max_amount:
+                issues.append(f"{product.name}: {amount} is above the maximum {product.max_amount}{product.unit}")
+        elif unit and unit.casefold() != 'x':
+            issues.append(f"{product.name}: unexpected amount {amount}")
+            return None
+        return quantity
@@ -0,0 +1,148 @@
+#!/usr/bin/env python3
+# -*- coding: utf-8 -*-
+"""Ticket category pool that overflows past Discord's 50-channels-per-category cap"""
+
+import asyncio
+import logging
+import re
+from contextlib import asynccontextmanager
+
+# Discord rejects new channels in a category that already holds this many
+CATEGORY_CHANNEL_LIMIT = 50
+
+log = logging.getLogger('donutmarket.category_pool')
+
+
+class CategoryPoolFull(Exception):
+    """Every category is full and no more overflow categories may be created"""
+
+
+class CategoryPool:
+    """The primary ticket category plus overflow categories created on demand
+
+    Overflow categories are named "<primary name> (overflow N)", copy the
+    primary category's permission overwrites, and are deleted again once
+    they are empty. N is remembered per category id, so an overflow
+    category renamed by staff keeps its slot in the pool.
+    """
+
+    def __init__(self, primary_id, limit=CATEGORY_CHANNEL_LIMIT, max_overflow=10, scheduler=None):
+        self.primary_id = primary_id
+        self.scheduler = scheduler
+        self.limit = limit
+        self.max_overflow = max_overflow
+        # overflow category id -> N
+        self._overflow = {}
+        self._pending = {}
+        self._lock = None
+
+    def primary(self, guild):
+        return guild.get_channel(self.primary_id) if guild else None
+
+    def _overflow_pattern(self, primary):
+        return re.compile(rf"^{re.escape(primary.name)} \(overflow (\d+)\)$")
+
+    def refresh(self, guild):
+        """Rediscover overflow categories left over from a previous run"""
+        known = self._overflow
+        self._overflow = {}
+        primary = self.primary(guild)
+        if not primary:
+            return
+        pattern = self._overflow_pattern(primary)
+        for category in guild.categories:
+            if category.id == self.primary_id:
+                continue
+            match = pattern.match(category.name)
+            if match:
+                self._overflow[category.id] = int(match.group(1))
+            elif category.id in known:
+                # Renamed since we created or found it
+                self._overflow[category.id] = known[category.id]
+
+    def __contains__(self, category_id):
+        return category_id == self.primary_id or category_id in self._overflow
+
+    def categories(self, guild):
+        """Primary category first, then overflow categories"""
+        primary = self.primary(guild)
+        if not primary:
+            return []
+        overflow = [guild.get_channel(category_id) for category_id in sorted(self._overflow)]
+        return [primary] + [category for category in overflow if category]
+
+    def load(self, category):
+        """Channels in the category plus creations still in flight"""
+        return len(category.channels) + self._pending.get(category.id, 0)
+
+    def capacity(self, guild):
+        """(used, total) channel slots across the pool"""
+        categories = self.categories(guild)
+        return sum(len(category.channels) for category in categories), len(categories) * self.limit
+
+    async def _rest(self, route, key, factory):
+        if self.scheduler is None:
+            return await factory()
+        return await self.scheduler.run(route, factory, key=key)
+
+    async def _create_overflow(self, guild, primary):
+        if len(self._overflow) >= self.max_overflow:
+            raise CategoryPoolFull(f"All {len(self._overflow) + 1} ticket categories are full")
+        used = set(self._overflow.values())
+        number = next(n for n in range(2, self.max_overflow + 3) if n not in used)
+        category = await self._rest('create_category', guild.id, lambda: guild.create_category(
+            f"{primary.name} (overflow {number})",
+            overwrites=primary.overwrites,
+            position=primary.position + number - 1,
+            reason="Ticket category overflow"
+        ))
+        self._overflow[category.id] = number
+        log.info(f"📁 Created overflow ticket category: {category.name}")
+        return category
+
+    async def acquire(self, guild):
+        """Least-full category with a free slot, creating an overflow category if needed"""
+        primary = self.primary(guild)
+        if not primary:
+            return None
+        candidates = [category for category in self.categories(guild) if self.load(category) < self.limit]
+        if candidates:
+            return min(candidates, key=self.load)
+        if self._lock is None:
+            self._lock = asyncio.Lock()
+        async with self._lock:
+            # Another task may have created one while we waited
+            candidates = [category for category in self.categories(guild) if self.load(category) < self.limit]
+            if candidates:
+                return min(candidates, key=self.load)
+            return await self._create_overflow(guild, primary)
+
+    @asynccontextmanager
+    async def slot(self, guild):
+        """Reserve a slot in the least-full category for the duration of a channel creation"""
+        category = await self.acquire(guild)
+        if category is None:
+            yield None
+            return
+        self._pending[category.id] = self._pending.get(category.id, 0) + 1
+        try:
+            yield category
+        finally:
+            self._pending[category.id] -= 1
+            if not self._pending[category.id]:
+                del self._pending[category.id]
+
+    async def release(self, guild, category_id):
+        """Delete an overflow category once its last channel is gone"""
+        if category_id not in self._overflow or self._pending.get(category_id):
+            return False
+        category = guild.get_channel(category_id)
+        if category is None:
+            self._overflow.pop(category_id, None)
+            return False
+        if category.channels:
+            return False
+        self._overflow.pop(category_id, None)
+        await self._rest('delete_channel', guild.id, lambda: category.delete(reason="Overflow ticket category empty"))
+        log.info(f"🗑️ Removed empty overflow ticket category: {category.name}")
+        return True
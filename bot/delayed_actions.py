@@ -0,0 +1,207 @@
+#!/usr/bin/env python3
+# -*- coding: utf-8 -*-
+"""Persistent timer heap for delayed ticket actions (deferred deletes, inactivity auto-close, reminders)"""
+
+import asyncio
+import heapq
+import itertools
+import logging
+import sqlite3
+import time
+
+log = logging.getLogger('donutmarket.delayed_actions')
+
+
+class DelayedActions:
+    """One task sleeps until the earliest due action and runs handlers[kind](target, payload)
+
+    There is at most one pending action per (kind, target); scheduling it
+    again moves it. Every change is written to the store first (through
+    store.call(), which backs off while another process holds the write
+    lock instead of blocking the event loop), so actions pending when the
+    process stops are replayed by load() on the next start.
+    A fired action's row is only deleted once its handler has succeeded, so
+    one interrupted by a restart runs again (handlers must tolerate that).
+    Moved or cancelled entries stay in the heap and are skipped when popped.
+
+    Replicas sharing the store each lease a row to `owner` before firing it,
+    so only one of them runs it; the others re-check when the lease expires
+    in case its holder died. Calling load() again picks up rows other
+    replicas scheduled. Claims and deletes go through store.call() as well;
+    a claim still locked out after its retries is tried again retry_delay
+    later rather than dropped.
+    """
+
+    def __init__(self, store, handlers, retry_delay=60.0, max_attempts=3, clock=time.time,
+                 owner='local', lease_seconds=120.0):
+        self.store = store
+        self.handlers = dict(handlers)
+        self.retry_delay = retry_delay
+        self.max_attempts = max_attempts
+        self.clock = clock
+        self.owner = owner
+        self.lease_seconds = lease_seconds
+        self.fired = 0
+        self.failed = 0
+        self._heap = []
+        # (kind, target) -> (due_at, payload, attempts) for the live entry
+        self._pending = {}
+        self._seq = itertools.count()
+        self._wake = None
+        self._task = None
+        self._running = set()
+        # (kind, target) of handlers running now; False once cancelled mid-run
+        self._firing = {}
+
+    def __len__(self):
+        return len(self._pending)
+
+    def load(self):
+        """Replay persisted actions (a previous process's or another replica's); overdue ones fire as soon as run() starts"""
+        for kind, target, due_at, payload, attempts in self.store.scheduled_actions():
+            entry = self._pending.get((kind, target))
+            if (kind, target) in self._firing or (entry is not None and entry[0] == due_at):
+                continue
+            self._push(kind, target, due_at, payload, attempts)
+        return len(self._pending)
+
+    def due_at(self, kind, target):
+        entry = self._pending.get((kind, target))
+        return entry[0] if entry else None
+
+    async def schedule(self, kind, target, delay, payload=None, min_shift=0.0, attempts=0):
+        """Run handlers[kind](target, payload) in delay seconds, replacing any pending one
+
+        With min_shift, an existing timer is left alone unless the new due time
+        differs by at least that much (saves a write per chat message).
+        """
+        due_at = self.clock() + delay
+        current = self.due_at(kind, target)
+        if current is not None and min_shift and abs(due_at - current) < min_shift:
+            return False
+        await self.store.call(self.store.save_action, kind, target, due_at, payload, attempts)
+        self._push(kind, target, due_at, payload, attempts)
+        return True
+
+    async def cancel(self, kind, target):
+        firing = self._firing.get((kind, target))
+        if self._pending.pop((kind, target), None) is not None or firing:
+            if firing:
+                self._firing[(kind, target)] = False
+            await self.store.call(self.store.delete_action, kind, target)
+
+    async def cancel_target(self, target):
+        """Drop every pending action for a target (e.g. a deleted channel)"""
+        for key in [key for key in self._pending if key[1] == target]:
+            del self._pending[key]
+        for key in [key for key in self._firing if key[1] == target]:
+            self._firing[key] = False
+        await self.store.call(self.store.delete_actions_for, target)
+
+    def counts(self):
+        counts = {}
+        for kind, _ in self._pending:
+            counts[kind] = counts.get(kind, 0) + 1
+        return counts
+
+    def _push(self, kind, target, due_at, payload, attempts):
+        self._pending[(kind, target)] = (due_at, payload, attempts)
+        heapq.heappush(self._heap, (due_at, next(self._seq), kind, target))
+        if self._wake is not None and self._heap[0][2:] == (kind, target):
+            self._wake.set()
+
+    def start(self):
+        """Start the timer task (idempotent)"""
+        if self._task is None:
+            self._wake = asyncio.Event()
+            self._task = asyncio.create_task(self._run(), name='delayed-actions')
+
+    async def stop(self):
+        if self._task is not None:
+            self._task.cancel()
+            self._task = None
+        for task in list(self._running):
+            task.cancel()
+
+    async def _run(self):
+        while True:
+            if not self._heap:
+                await self._wake.wait()
+                self._wake.clear()
+                continue
+            due_at, _, kind, target = self._heap[0]
+            entry = self._pending.get((kind, target))
+            if entry is None or entry[0] != due_at:
+                # Cancelled or moved since it was pushed
+                heapq.heappop(self._heap)
+                continue
+            delay = due_at - self.clock()
+            if delay > 0:
+                try:
+                    await asyncio.wait_for(self._wake.wait(), delay)
+                except asyncio.TimeoutError:
+                    pass
+                self._wake.clear()
+                continue
+            heapq.heappop(self._heap)
+            # Out of _pending (so the handler can schedule a follow-up of the same kind), but
+            # the stored row stays until the handler has finished
+            del self._pending[(kind, target)]
+            self._firing[(kind, target)] = True
+            task = asyncio.create_task(self._fire(kind, target, due_at, entry[1], entry[2]))
+            self._running.add(task)
+            task.add_done_callback(self._running.discard)
+
+    async def _fire(self, kind, target, due_at, payload, attempts):
+        key = (kind, target)
+        try:
+            try:
+                claimed = await self.store.call(self.store.claim_action, kind, target, due_at, self.owner, self.lease_seconds)
+            except sqlite3.OperationalError as e:
+                log.warning(f"⚠️ Could not claim delayed {kind} for {target}, retrying in {self.retry_delay:.0f}s: {e}")
+                if key not in self._pending:
+                    self._push(kind, target, self.clock() + self.retry_delay, payload, attempts)
+                return
+            if not claimed:
+                self._adopt(kind, target)
+                return
+            handler = self.handlers.get(kind)
+            if handler is None:
+                log.error(f"❌ No handler for delayed action {kind!r}", extra={'target': target})
+                await self._finish(key)
+                return
+            try:
+                await handler(target, payload)
+                self.fired += 1
+            except Exception as e:
+                attempts += 1
+                if attempts >= self.max_attempts:
+                    self.failed += 1
+                    log.exception(f"❌ Delayed {kind} for {target} failed {attempts} times, dropping: {e}")
+                    await self._finish(key)
+                    return
+                delay = self.retry_delay * 2 ** (attempts - 1)
+                log.warning(f"⚠️ Delayed {kind} for {target} failed, retrying in {delay:.0f}s: {e}")
+                if self._firing.get(key) and key not in self._pending:
+                    # Rewrites the stored row with the new due time and attempt count
+                    await self.schedule(kind, target, delay, payload, attempts=attempts)
+                return
+            await self._finish(key)
+        finally:
+            self._firing.pop(key, None)
+
+    def _adopt(self, kind, target):
+        """Follow an action another replica moved or holds: wait for its due time or the end of its lease"""
+        row = self.store.get_action(kind, target)
+        if row is None or (kind, target) in self._pending:
+            return
+        due_at, payload, attempts, lease_owner, lease_expires = row
+        if lease_owner is not None and lease_owner != self.owner and lease_expires is not None:
+            # Lease expiry is wall-clock time shared by every replica
+            due_at = max(due_at, self.clock() + lease_expires - time.time())
+        self._push(kind, target, due_at, payload, attempts)
+
+    async def _finish(self, key):
+        """Delete a fired action's row, unless the handler already scheduled its successor"""
+        if self._firing.get(key) and key not in self._pending:
+            await self.store.call(self.store.delete_action, *key, owner=self.owner)
@@ -1,40 +1,52 @@
 #!/usr/bin/env python3
 # -*- coding: utf-8 -*-
 
-print("🔍 Starting Discord bot script...")
 import sys
-print("🐍 Python executable:", sys.executable)
-print("🐍 Python version:", sys.version)
-print("🔍 About to import discord...")
 
+# Logging isn't set up yet; sys.exit() puts these on stderr
 try:
     import discord
-    print("✅ discord.py imported successfully")
-except ImportError as e:
-    print(f"❌ Failed to import discord.py: {e}")
-    exit(1)
-
-try:
     from discord.ext import commands
-    print("✅ discord.ext.commands imported successfully")
 except ImportError as e:
-    print(f"❌ Failed to import discord.ext.commands: {e}")
-    exit(1)
+    sys.exit(f"❌ Failed to import discord.py: {e}")
 
 import asyncio
 import json
+import math
 import os
+import resource
+import socket
+import sqlite3
 import sys
+import time
 from datetime import datetime, timezone
 
 try:
     import dotenv
-    print("✅ python-dotenv imported successfully")
 except ImportError as e:
-    print(f"❌ Failed to import python-dotenv: {e}")
-    exit(1)
+    sys.exit(f"❌ Failed to import python-dotenv: {e}")
 
-print("🔍 All imports successful!")
+from catalog import StoreCatalog
+from category_pool import CategoryPool
+from delayed_actions import DelayedActions
+from idempotency import IdempotencyIndex
+from ingest_ipc import IngestIpcServer
+from member_cache import MemberCache
+from member_index import MemberIndex
+from metrics import CONTENT_TYPE as METRICS_CONTENT_TYPE, MetricsRegistry
+from order_store import FAILED as ORDER_FAILED, PENDING as ORDER_PENDING, TICKETED as ORDER_TICKETED, OrderStore
+from permissions import ADMIN, PermissionEngine, parse_command_tiers
+from purchases import CREATED, FAILED, IN_PROGRESS, QUEUED, InvalidPurchase, PurchaseJobs, parse_purchase
+from sales_stats import SalesStats
+from rest_scheduler import BACKGROUND, DEFAULT_ROUTE_LIMITS, INTERACTIVE, RestScheduler, parse_route_limits
+from startup import PhaseTimer, StartupState, command_tree_hash, embed_hash
+from store_routing import StoreRouter, parse_store_routes
+from structured_logging import get_logger, parse_sample_rates, setup_logging, transaction_context, transaction_id_var
+from ticket_search import CLOSED as TICKET_CLOSED, OPEN as TICKET_OPEN, TicketEntry, TicketSearchIndex
+from ticket_registry import TicketRecord, TicketRegistry, format_topic, parse_topic, ticket_type_for_name
+from ticket_watcher import CLAIM_MARKER, LatencyStats, TicketWatcher, claim_file, release_stale_claims
+from transcripts import TranscriptArchiver
+from worker_pool import WorkerPool
 
 # Load environment variables from parent directory
 dotenv.load_dotenv(dotenv_path=os.path.join(os.path.dirname(__file__), '..', 'config', '.env'))
@@ -54,6 +66,113 @@ ALLOWED_ROLE_IDS = []
 if os.getenv('ALLOWED_ROLE_IDS'):
     ALLOWED_ROLE_IDS = [int(rid.strip()) for rid in os.getenv('ALLOWED_ROLE_IDS').split(',') if rid.strip()]
 
+# Admin tier (on top of the server owner and members with Administrator)
+ADMIN_USER_IDS = []
+if os.getenv('ADMIN_USER_IDS'):
+    ADMIN_USER_IDS = [int(uid.strip()) for uid in os.getenv('ADMIN_USER_IDS').split(',') if uid.strip()]
+
+ADMIN_ROLE_IDS = []
+if os.getenv('ADMIN_ROLE_IDS'):
+    ADMIN_ROLE_IDS = [int(rid.strip()) for rid in os.getenv('ADMIN_ROLE_IDS').split(',') if rid.strip()]
+
+# Per-command tiers, e.g. "tickets-panel=admin,close_ticket=staff" (unlisted commands are staff)
+COMMAND_PERMISSION_TIERS = parse_command_tiers(os.getenv('COMMAND_PERMISSION_TIERS'), defaults={'tickets-panel': ADMIN, 'sales_stats': ADMIN})
+
+# Local state (ticket index, etc.) lives here
+BOT_DATA_DIR = os.getenv('BOT_DATA_DIR') or os.path.join(os.path.dirname(__file__), '..', 'data')
+
+# How long a transaction id is remembered for duplicate-ticket protection; closed tickets older
+# than this are then deleted from the store (and drop out of /find_ticket)
+IDEMPOTENCY_TTL_DAYS = int(os.getenv('IDEMPOTENCY_TTL_DAYS', '30'))
+
+# Fallback scan interval for the ticket queue when inotify is unavailable
+TICKET_POLL_INTERVAL = float(os.getenv('TICKET_POLL_INTERVAL', '5'))
+
+# Ticket worker pool: parallel ticket creation with per-ticket retries
+TICKET_WORKER_CONCURRENCY = int(os.getenv('TICKET_WORKER_CONCURRENCY', '5'))
+TICKET_MAX_ATTEMPTS = int(os.getenv('TICKET_MAX_ATTEMPTS', '5'))
+
+# Replicas sharing BOT_DATA_DIR and tickets/ split pending orders through leases in the order
+# database; leases of a replica that stops renewing them expire after ORDER_LEASE_SECONDS
+REPLICA_ID = os.getenv('REPLICA_ID') or f"{socket.gethostname()}-{os.getpid()}"
+ORDER_LEASE_SECONDS = float(os.getenv('ORDER_LEASE_SECONDS', '120'))
+# Orders handed to the worker pools (or folded into the sales stats) per pass
+PENDING_ORDER_BATCH = 1000
+
+# Answer /webhook/purchase with 202 + job id and create the ticket in the background
+# (clients can also opt in per request with "Prefer: respond-async" or ?mode=async)
+WEBHOOK_ASYNC_MODE = os.getenv('WEBHOOK_ASYNC_MODE', 'false').lower() in ('1', 'true', 'yes')
+
+# Orders written to the store per transaction by POST /webhook/purchase/batch
+BATCH_INGEST_SIZE = int(os.getenv('BATCH_INGEST_SIZE', '500'))
+
+# "inline" serves webhooks from this process; "socket" leaves HTTP to ingest_server.py
+# workers, which hand validated purchases to this process over INGEST_SOCKET
+INGEST_MODE = os.getenv('INGEST_MODE', 'inline').lower()
+INGEST_SOCKET = os.getenv('INGEST_SOCKET') or os.path.join(BOT_DATA_DIR, 'ingest.sock')
+
+# REST rate limits per route class, e.g. "create_channel=10/10,send_message=5/5" (burst/seconds)
+REST_ROUTE_LIMITS = parse_route_limits(os.getenv('REST_RATE_LIMITS'), defaults=DEFAULT_ROUTE_LIMITS)
+
+# Overflow ticket categories created once the primary category is full
+MAX_OVERFLOW_CATEGORIES = int(os.getenv('MAX_OVERFLOW_CATEGORIES', '10'))
+
+# Channel that always holds the tickets panel; the panel message is tracked and edited in place
+PANEL_CHANNEL_ID = int(os.getenv('PANEL_CHANNEL_ID', '1418736927112302602'))
+# Recent messages searched for an untracked panel before sending a new one
+PANEL_SEARCH_LIMIT = 50
+# Sync slash commands on startup even if the command tree hash is unchanged
+FORCE_COMMAND_SYNC = os.getenv('FORCE_COMMAND_SYNC', 'false').lower() in ('1', 'true', 'yes')
+
+# Store files (stores/*.json) that order prices and totals are checked against; changed files
+# are re-read at most every CATALOG_RELOAD_INTERVAL seconds
+STORES_DIR = os.getenv('STORES_DIR') or os.path.join(os.path.dirname(__file__), '..', 'stores')
+CATALOG_RELOAD_INTERVAL = float(os.getenv('CATALOG_RELOAD_INTERVAL', '30'))
+
+# Seconds between checkpoints of the /sales_stats aggregates
+SALES_CHECKPOINT_INTERVAL = float(os.getenv('SALES_CHECKPOINT_INTERVAL', '60'))
+
+# Closing a ticket first archives its history as gzipped JSONL + HTML under TRANSCRIPTS_DIR
+TRANSCRIPTS_ENABLED = os.getenv('TRANSCRIPTS_ENABLED', 'true').lower() in ('1', 'true', 'yes')
+TRANSCRIPTS_DIR = os.getenv('TRANSCRIPTS_DIR') or os.path.join(BOT_DATA_DIR, 'transcripts')
+
+# Seconds between a close confirmation and the channel being archived and deleted
+TICKET_CLOSE_DELAY = float(os.getenv('TICKET_CLOSE_DELAY', '5'))
+# Hours without a message before the owner is reminded / the ticket is closed (0 disables)
+TICKET_REMINDER_HOURS = float(os.getenv('TICKET_REMINDER_HOURS', '24'))
+TICKET_INACTIVITY_HOURS = float(os.getenv('TICKET_INACTIVITY_HOURS', '72'))
+# Messages only move a ticket's inactivity timers once they would shift by this many seconds
+ACTIVITY_TIMER_RESOLUTION = 300
+
+# "full" chunks and caches every guild member at startup; "lean" skips chunking and looks
+# buyers up on demand through gateway member queries, cached in a bounded LRU with a TTL
+MEMBER_CACHE_MODE = os.getenv('MEMBER_CACHE_MODE', 'full').lower()
+LEAN_MEMBER_CACHE = MEMBER_CACHE_MODE == 'lean'
+MEMBER_CACHE_SIZE = int(os.getenv('MEMBER_CACHE_SIZE', '1000'))
+MEMBER_CACHE_TTL = float(os.getenv('MEMBER_CACHE_TTL', '600'))
+# Seconds a cached permission decision lasts (0 = until a member/role event invalidates it). Lean
+# mode gets no member updates for uncached members, so role changes there only show up on expiry
+PERMISSION_CACHE_TTL = float(os.getenv('PERMISSION_CACHE_TTL', '60' if LEAN_MEMBER_CACHE else '0'))
+
+# Per-store ticket routing, e.g. "donutmarket=111/222,other-store=333/444" (store id or
+# name = guild id / ticket category id); unlisted stores use GUILD_ID / TICKET_CATEGORY_ID
+STORE_ROUTES = parse_store_routes(os.getenv('STORE_ROUTES'))
+
+# Run as an AutoShardedBot (one process, several gateway shards); SHARD_COUNT=0 asks Discord
+AUTO_SHARD = os.getenv('AUTO_SHARD', 'false').lower() in ('1', 'true', 'yes')
+SHARD_COUNT = int(os.getenv('SHARD_COUNT', '0'))
+
+# Logs are JSON lines (or "text") written by a background thread; LOG_SAMPLE_RATES keeps
+# 1 in N sub-warning records per logger, e.g. "donutmarket.webhook=10"
+LOG_LEVEL = os.getenv('LOG_LEVEL', 'INFO')
+LOG_FORMAT = os.getenv('LOG_FORMAT', 'json')
+LOG_SAMPLE_RATES = parse_sample_rates(os.getenv('LOG_SAMPLE_RATES'))
+
+logging_setup = setup_logging(LOG_LEVEL, LOG_FORMAT, LOG_SAMPLE_RATES)
+log = get_logger('bot')
+ticket_log = get_logger('tickets')
+webhook_log = get_logger('webhook')
+
 # Discord OAuth configuration (for reference)
 DISCORD_CLIENT_ID = os.getenv('DISCORD_CLIENT_ID', 'your_discord_client_id_here')
 DISCORD_CLIENT_SECRET = os.getenv('DISCORD_CLIENT_SECRET', 'your_discord_client_secret_here')
@@ -61,11 +180,268 @@ DISCORD_REDIRECT_URI = os.getenv('DISCORD_REDIRECT_URI', 'http://localhost:3000/
 
 # Bot setup
 intents = discord.Intents.default()
-intents.message_content = True
+# Message content is only read for transcripts; lean mode drops it when those are off
+intents.message_content = TRANSCRIPTS_ENABLED or not LEAN_MEMBER_CACHE
 intents.guilds = True
+# Still needed in lean mode for member update/remove events and member queries
 intents.members = True
 
-bot = commands.Bot(command_prefix='!', intents=intents)
+bot_options = dict(
+    command_prefix='!',
+    intents=intents,
+    chunk_guilds_at_startup=not LEAN_MEMBER_CACHE,
+    member_cache_flags=discord.MemberCacheFlags.none() if LEAN_MEMBER_CACHE else discord.MemberCacheFlags.from_intents(intents)
+)
+if AUTO_SHARD:
+    bot = commands.AutoShardedBot(shard_count=SHARD_COUNT or None, **bot_options)
+else:
+    bot = commands.Bot(**bot_options)
+
+# Every ticket-path REST call is paced through per-route token buckets
+rest_scheduler = RestScheduler(REST_ROUTE_LIMITS)
+# 429s are counted from discord.py's own rate-limit warnings; it retries them internally
+rest_scheduler.install_rate_limit_hook()
+
+# Command tree hash and tickets panel message id, kept across restarts
+startup_state = StartupState(os.path.join(BOT_DATA_DIR, 'startup_state.json')).load()
+
+# Prometheus metrics served on /metrics; queue depths, REST counters and
+# ticket counts are read from live state at scrape time
+metrics = MetricsRegistry()
+ticket_stage_seconds = metrics.histogram(
+    'donutmarket_ticket_stage_seconds',
+    'Time spent in each stage of ticket creation',
+    labelnames=('source', 'stage')
+)
+webhook_request_seconds = metrics.histogram(
+    'donutmarket_webhook_request_seconds',
+    'Webhook server request latency',
+    labelnames=('method', 'route', 'status')
+)
+
+# Buyer name -> member id for the ticket guild, kept current by member events
+member_index = MemberIndex()
+
+# Members fetched on demand in lean mode
+member_cache = MemberCache(max_size=MEMBER_CACHE_SIZE, ttl=MEMBER_CACHE_TTL)
+
+async def find_buyer_member(guild, discord_user, buyer_name=None):
+    """Resolve a buyer to a guild member via the member index (or a member query in lean mode)"""
+    # The member index only covers GUILD_ID; store guilds are always queried on demand
+    if LEAN_MEMBER_CACHE or guild.id != GUILD_ID:
+        return await member_cache.resolve(guild, discord_user, buyer_name)
+    member_id = member_index.resolve(discord_user, buyer_name)
+    return guild.get_member(member_id) if member_id is not None else None
+
+def cached_member(guild, member_id):
+    """A member from whichever cache is active, without asking Discord"""
+    return guild.get_member(member_id) or (member_cache.get(guild.id, member_id) if LEAN_MEMBER_CACHE else None)
+
+# Primary ticket category plus overflow categories once it hits Discord's 50-channel cap
+category_pool = CategoryPool(TICKET_CATEGORY_ID, max_overflow=MAX_OVERFLOW_CATEGORIES, scheduler=rest_scheduler)
+
+# Orders, items and tickets survive restarts in an embedded SQLite database
+order_store = OrderStore(os.path.join(BOT_DATA_DIR, 'donutmarket.db'))
+
+# transactionId -> channel id from the tickets table, so a purchase never gets a second ticket
+ticket_index = IdempotencyIndex(order_store, ttl=IDEMPOTENCY_TTL_DAYS * 24 * 3600)
+# Older releases kept this index in a JSONL log of their own
+ticket_index.import_log(os.path.join(BOT_DATA_DIR, 'ticket_index.jsonl'))
+
+# Product tables for every store, used to flag orders whose prices don't add up
+catalog = StoreCatalog(STORES_DIR, reload_interval=CATALOG_RELOAD_INTERVAL)
+
+def add_catalog_check(embed, items, total_amount, store=None):
+    """Flag items, amounts or totals that don't match the store catalog on the ticket embed"""
+    check = catalog.check_order(items, total_amount, store)
+    if not check.ok:
+        embed.color = discord.Color.orange()
+        issues = '\n'.join(f"• {issue}" for issue in check.issues[:10])
+        embed.add_field(name="⚠️ Catalog Mismatch", value=issues[:1024], inline=False)
+        ticket_log.warning("⚠️ Order doesn't match the catalog", extra={'issues': check.issues})
+    return check
+
+# Store -> guild and ticket category, precomputed; routes sharing a category share its pool
+store_router = StoreRouter(
+    GUILD_ID,
+    category_pool,
+    STORE_ROUTES,
+    pool_factory=lambda category_id: CategoryPool(category_id, max_overflow=MAX_OVERFLOW_CATEGORIES, scheduler=rest_scheduler),
+    alias=catalog.store_id
+)
+
+def purchase_store(store, items):
+    """The store an order belongs to: its own field, else the first item that names one"""
+    return store or next((item['store'] for item in items or () if item.get('store')), None)
+
+def route_status():
+    """Guild, category and slot usage for every store route (default route first)"""
+    statuses = []
+    for route in store_router.routes():
+        guild = bot.get_guild(route.guild_id)
+        used_slots, total_slots = route.pool.capacity(guild)
+        statuses.append({
+            'store': route.store or 'default',
+            'guild_id': route.guild_id,
+            'category_id': route.category_id,
+            'guild_connected': guild is not None,
+            'category_found': route.pool.primary(guild) is not None,
+            'ticket_slots_used': used_slots,
+            'ticket_slots_total': total_slots,
+        })
+    return statuses
+
+def shard_status():
+    """Latency and connection state per gateway shard (a single entry without sharding)"""
+    if isinstance(bot, commands.AutoShardedBot):
+        shards = sorted(bot.shards.items())
+        guilds_per_shard = {}
+        for guild in bot.guilds:
+            guilds_per_shard[guild.shard_id] = guilds_per_shard.get(guild.shard_id, 0) + 1
+        return [{
+            'shard_id': shard_id,
+            'latency_ms': round(shard.latency * 1000, 1) if math.isfinite(shard.latency) else None,
+            'connected': not shard.is_closed(),
+            'guilds': guilds_per_shard.get(shard_id, 0),
+        } for shard_id, shard in shards]
+    return [{
+        'shard_id': bot.shard_id or 0,
+        'latency_ms': round(bot.latency * 1000, 1) if math.isfinite(bot.latency) else None,
+        'connected': bot.is_ready() and not bot.is_closed(),
+        'guilds': len(bot.guilds),
+    }]
+
+# Ticket transcripts, paged out of Discord through the REST scheduler
+transcript_archiver = TranscriptArchiver(TRANSCRIPTS_DIR, scheduler=rest_scheduler)
+
+# Running sales aggregates behind /sales_stats, folded from the orders table by seq. Every
+# replica folds every order (its own and other replicas'), so any checkpoint a replica writes
+# covers exactly the orders up to its watermark, whichever replica wrote it last
+sales_stats = SalesStats(os.path.join(BOT_DATA_DIR, 'sales_stats.json'))
+sales_watermark = 0
+
+def fold_new_orders():
+    """Fold orders stored since the last fold into sales_stats; returns how many"""
+    global sales_watermark
+    folded = 0
+    while True:
+        batch = order_store.orders_after(sales_watermark, limit=PENDING_ORDER_BATCH)
+        if not batch:
+            return folded
+        for seq, order in batch:
+            sales_stats.record(order)
+            sales_watermark = seq
+        folded += len(batch)
+
+def catch_up_sales_stats():
+    """Restore the sales checkpoint and fold in orders stored after it was written"""
+    global sales_watermark
+    sales_watermark = sales_stats.load()
+    folded = fold_new_orders()
+    if folded or not os.path.exists(sales_stats.path):
+        sales_stats.checkpoint(sales_watermark)
+    log.info(f"📊 Sales stats cover {sales_stats.count} orders ({folded} folded in since the last checkpoint)")
+
+async def sales_checkpoint_loop():
+    while True:
+        await asyncio.sleep(SALES_CHECKPOINT_INTERVAL)
+        try:
+            fold_new_orders()
+            if sales_stats.dirty:
+                sales_stats.checkpoint(sales_watermark)
+        except (OSError, sqlite3.Error) as e:
+            log.warning(f"⚠️ Could not checkpoint sales stats: {e}")
+
+# Open tickets across the category pool, rebuilt at startup and kept current by channel events
+ticket_registry = TicketRegistry()
+
+def ticket_record_from_channel(channel):
+    """Build a registry record from a ticket channel's topic, name and overwrites"""
+    ticket_type = ticket_type_for_name(channel.name)
+    if ticket_type is None:
+        return None
+    meta = parse_topic(getattr(channel, 'topic', None))
+    owner_id = meta['owner_id']
+    if owner_id is None:
+        # Tickets created before topics were set: the owner is the non-staff member overwrite
+        for target in channel.overwrites:
+            if isinstance(target, discord.Member) and target.id != channel.guild.me.id and target.id not in ALLOWED_USER_IDS:
+                owner_id = target.id
+                break
+    return TicketRecord(
+        channel.id,
+        meta['type'] or ticket_type,
+        owner_id=owner_id,
+        transaction_id=meta['transaction_id'],
+        created_at=channel.created_at,
+        name=channel.name
+    )
+
+# Buyer / Discord tag / transaction id / item prefix index over open and archived tickets (/find_ticket)
+ticket_search = TicketSearchIndex()
+
+def index_ticket(channel, owner_id=None, transaction_id=None):
+    """Add an open ticket channel to the search index, with its order details when there is one"""
+    order = order_store.get_order(transaction_id) if transaction_id else None
+    owner = cached_member(channel.guild, owner_id) if owner_id else None
+    return ticket_search.add(TicketEntry(
+        channel.id,
+        name=channel.name,
+        status=TICKET_OPEN,
+        buyer=order['buyer'] if order else (owner.display_name if owner else None),
+        discord=order.get('discord') if order else (owner.name if owner else None),
+        transaction_id=transaction_id,
+        items=[item.get('name') for item in order.get('items') or [] if item.get('name')] if order else (),
+        created_at=channel.created_at.timestamp()
+    ))
+
+def rebuild_ticket_search():
+    """Index every ticket in the store, then any open ticket channel the store doesn't know"""
+    ticket_search.load(
+        TicketEntry(
+            ticket['channel_id'],
+            name=ticket['name'],
+            # Channels deleted while the bot was offline count as closed
+            status=TICKET_OPEN if ticket['channel_id'] in ticket_registry else TICKET_CLOSED,
+            buyer=ticket['buyer'],
+            discord=ticket['discord_user'],
+            transaction_id=ticket['transaction_id'],
+            items=ticket['items'],
+            created_at=ticket['created_at'],
+            transcript_path=ticket['transcript_path']
+        )
+        for ticket in order_store.tickets_with_orders()
+    )
+    for record in ticket_registry.records():
+        if ticket_search.get(record.channel_id) is None:
+            channel = bot.get_channel(record.channel_id)
+            if channel is not None:
+                index_ticket(channel, owner_id=record.owner_id, transaction_id=record.transaction_id)
+
+async def register_ticket_channel(channel, ticket_type, owner_id=None, transaction_id=None):
+    """Record a ticket channel the bot just created (its tickets row is also the idempotency record)"""
+    await order_store.call(order_store.add_ticket, channel.id, ticket_type, owner_id=owner_id, transaction_id=transaction_id, created_at=channel.created_at.timestamp(), name=channel.name)
+    await touch_ticket(channel.id)
+    index_ticket(channel, owner_id=owner_id, transaction_id=transaction_id)
+    return ticket_registry.add(TicketRecord(
+        channel.id,
+        ticket_type,
+        owner_id=owner_id,
+        transaction_id=transaction_id,
+        created_at=channel.created_at,
+        name=channel.name
+    ))
+
+def rebuild_ticket_registry(guilds):
+    """Rebuild the registry from the channels currently in every store's ticket categories"""
+    ticket_registry.clear()
+    for guild in guilds:
+        for pool in store_router.pools_for_guild(guild.id):
+            for category in pool.categories(guild):
+                for channel in category.channels:
+                    record = ticket_record_from_channel(channel)
+                    if record:
+                        ticket_registry.add(record)
 
 class TicketView(discord.ui.View):
     def __init__(self):
@@ -74,7 +450,7 @@ class TicketView(discord.ui.View):
     @discord.ui.button(label='Close Ticket', style=discord.ButtonStyle.danger, emoji='🔒')
     async def close_ticket(self, interaction: discord.Interaction, button: discord.ui.Button):
         # Check if user has permission to close ticket
-        if not await has_ticket_permissions(interaction.user, interaction.guild):
+        if not await has_ticket_permissions(interaction.user, interaction.guild, 'close_ticket'):
             await interaction.response.send_message("❌ You don't have permission to close this ticket.", ephemeral=True)
             return
 
@@ -89,6 +465,83 @@ class TicketView(discord.ui.View):
         confirm_view = ConfirmCloseView()
         await interaction.response.send_message(embed=embed, view=confirm_view, ephemeral=True)
 
+async def archive_ticket(channel):
+    """Write the channel's transcript before it is deleted; False means the channel should be kept"""
+    if not TRANSCRIPTS_ENABLED:
+        return True
+    try:
+        transcript = await transcript_archiver.archive(channel)
+    except Exception as e:
+        ticket_log.exception(f"❌ Transcript for #{channel.name} failed: {e}", extra={'channel_id': channel.id})
+        await channel.send("⚠️ Couldn't save this ticket's transcript, so the channel was kept. Try closing it again.")
+        return False
+    await order_store.call(order_store.set_transcript, channel.id, transcript.jsonl_path, transcript.messages)
+    ticket_search.update(channel.id, transcript_path=transcript.jsonl_path)
+    ticket_log.info(
+        f"📜 Archived {transcript.messages} messages from #{channel.name}",
+        extra={'channel_id': channel.id, 'transcript': transcript.jsonl_path}
+    )
+    return True
+
+async def delete_ticket_channel(channel_id, payload):
+    """Delayed 'delete_channel' action: archive the transcript, then delete the channel"""
+    channel = bot.get_channel(channel_id)
+    if channel is None:
+        return
+    if not await archive_ticket(channel):
+        return
+    reason = (payload or {}).get('reason')
+    await rest_scheduler.run('delete_channel', lambda: channel.delete(reason=reason), key=channel.guild.id)
+
+async def remind_ticket(channel_id, payload):
+    """Delayed 'reminder' action: ping the owner of a quiet ticket"""
+    channel = bot.get_channel(channel_id)
+    record = ticket_registry.get(channel_id)
+    if channel is None or record is None:
+        return
+    notice = f"⏰ This ticket has been quiet for {TICKET_REMINDER_HOURS:g} hours. Reply here if you still need help"
+    if TICKET_INACTIVITY_HOURS > 0:
+        notice += f" - it closes automatically after {TICKET_INACTIVITY_HOURS:g} hours without activity"
+    if record.owner_id:
+        notice = f"<@{record.owner_id}> {notice}"
+    await rest_scheduler.run('send_message', lambda: channel.send(notice), key=channel.id)
+
+async def auto_close_ticket(channel_id, payload):
+    """Delayed 'auto_close' action: announce the inactivity close and schedule the delete"""
+    channel = bot.get_channel(channel_id)
+    if channel is None or channel_id not in ticket_registry:
+        return
+    embed = discord.Embed(
+        title="🔒 Ticket Closing",
+        description=f"This ticket is being closed after {TICKET_INACTIVITY_HOURS:g} hours without activity",
+        color=discord.Color.red(),
+        timestamp=datetime.now(timezone.utc)
+    )
+    await rest_scheduler.run('send_message', lambda: channel.send(embed=embed), key=channel.id)
+    await schedule_ticket_close(channel, "Ticket closed after inactivity")
+
+# Deferred deletes, reminders and inactivity closes; persisted in the order store and replayed at startup
+delayed_actions = DelayedActions(order_store, {
+    'delete_channel': delete_ticket_channel,
+    'reminder': remind_ticket,
+    'auto_close': auto_close_ticket,
+}, owner=REPLICA_ID, lease_seconds=ORDER_LEASE_SECONDS)
+
+async def schedule_ticket_close(channel, reason):
+    """Archive and delete the channel after TICKET_CLOSE_DELAY, surviving restarts"""
+    await delayed_actions.cancel('reminder', channel.id)
+    await delayed_actions.cancel('auto_close', channel.id)
+    await delayed_actions.schedule('delete_channel', channel.id, TICKET_CLOSE_DELAY, {'reason': reason})
+
+async def touch_ticket(channel_id):
+    """Restart a ticket's reminder and inactivity timers"""
+    if delayed_actions.due_at('delete_channel', channel_id) is not None:
+        return
+    if TICKET_REMINDER_HOURS > 0:
+        await delayed_actions.schedule('reminder', channel_id, TICKET_REMINDER_HOURS * 3600, min_shift=ACTIVITY_TIMER_RESOLUTION)
+    if TICKET_INACTIVITY_HOURS > 0:
+        await delayed_actions.schedule('auto_close', channel_id, TICKET_INACTIVITY_HOURS * 3600, min_shift=ACTIVITY_TIMER_RESOLUTION)
+
 class ConfirmCloseView(discord.ui.View):
     def __init__(self):
         super().__init__(timeout=60)
@@ -107,30 +560,79 @@ class ConfirmCloseView(discord.ui.View):
         
         await interaction.response.send_message(embed=embed)
         
-        # Wait a moment then delete the channel
-        await asyncio.sleep(3)
-        await channel.delete(reason=f"Ticket closed by {interaction.user}")
+        # Archived and deleted by the delayed action scheduler
+        await schedule_ticket_close(channel, f"Ticket closed by {interaction.user}")
 
     @discord.ui.button(label='Cancel', style=discord.ButtonStyle.secondary, emoji='❌')
     async def cancel_close(self, interaction: discord.Interaction, button: discord.ui.Button):
         await interaction.response.send_message("❌ Ticket closure cancelled.", ephemeral=True)
 
-async def has_ticket_permissions(user: discord.Member, guild: discord.Guild) -> bool:
-    """Check if user has permission to access tickets"""
-    # Check if user is server owner
-    if user.id == guild.owner_id or user.id == SERVER_OWNER_ID:
-        return True
-    
-    # Check if user ID is in allowed list
-    if user.id in ALLOWED_USER_IDS:
-        return True
+# Allowed ids frozen once; decisions cached per member until their roles change
+permission_engine = PermissionEngine(
+    SERVER_OWNER_ID,
+    allowed_user_ids=ALLOWED_USER_IDS,
+    allowed_role_ids=ALLOWED_ROLE_IDS,
+    admin_user_ids=ADMIN_USER_IDS,
+    admin_role_ids=ADMIN_ROLE_IDS,
+    command_tiers=COMMAND_PERMISSION_TIERS,
+    ttl=PERMISSION_CACHE_TTL or None
+)
+
+async def has_ticket_permissions(user: discord.Member, guild: discord.Guild, command: str = None) -> bool:
+    """Check if user has permission to access tickets (or the tier a command requires)"""
+    if command:
+        return permission_engine.allows_command(user, guild, command)
+    return permission_engine.allows(user, guild)
+
+class OverwriteTemplates:
+    """Per-guild cache of the overwrites every ticket channel starts from
+
+    Resolves the bot, @everyone and the allowed staff members/roles once;
+    invalidate() whenever those members or roles change.
+    """
     
-    # Check if user has any allowed roles
-    user_role_ids = [role.id for role in user.roles]
-    if any(role_id in ALLOWED_ROLE_IDS for role_id in user_role_ids):
-        return True
+    HIDDEN = discord.PermissionOverwrite(read_messages=False)
+    ALLOWED = discord.PermissionOverwrite(read_messages=True, send_messages=True)
     
-    return False
+    def __init__(self):
+        self._templates = {}
+    
+    def base(self, guild):
+        template = self._templates.get(guild.id)
+        if template is None:
+            template = {
+                guild.default_role: self.HIDDEN,
+                guild.me: self.ALLOWED
+            }
+            for user_id in ALLOWED_USER_IDS:
+                user = guild.get_member(user_id)
+                if user is None and LEAN_MEMBER_CACHE:
+                    # Staff aren't cached in lean mode; an id-only target is enough for an overwrite
+                    user = discord.Object(id=user_id, type=discord.Member)
+                if user:
+                    template[user] = self.ALLOWED
+            for role_id in ALLOWED_ROLE_IDS:
+                role = guild.get_role(role_id)
+                if role:
+                    template[role] = self.ALLOWED
+            self._templates[guild.id] = template
+        return template
+    
+    def for_ticket(self, guild, *members):
+        """Staff template plus access for the given members (None entries are skipped)"""
+        overwrites = dict(self.base(guild))
+        for member in members:
+            if member is not None:
+                overwrites[member] = self.ALLOWED
+        return overwrites
+    
+    def invalidate(self, guild_id=None):
+        if guild_id is None:
+            self._templates.clear()
+        else:
+            self._templates.pop(guild_id, None)
+
+overwrite_templates = OverwriteTemplates()
 
 class TicketsPanelView(discord.ui.View):
     def __init__(self):
@@ -141,43 +643,40 @@ class TicketsPanelView(discord.ui.View):
         """Handle claim rewards button click"""
         
         guild = interaction.guild
-        category = guild.get_channel(TICKET_CATEGORY_ID)
+        pool = store_router.pool_for_guild(guild.id)
         
-        if not category:
+        if not pool.primary(guild):
             await interaction.response.send_message("❌ Ticket category not found. Please contact an administrator.", ephemeral=True)
             return
         
         # Check if user already has an open ticket
-        existing_ticket = None
-        for channel in category.channels:
-            if channel.name.startswith(f"rewards-{interaction.user.name.lower()}"):
-                existing_ticket = channel
-                break
+        existing_ticket = ticket_registry.find_open(interaction.user.id, 'rewards')
         
         if existing_ticket:
             await interaction.response.send_message(f"❌ You already have an open ticket: {existing_ticket.mention}", ephemeral=True)
             return
         
+        # Acknowledge first: the channel create below can queue behind rate limits past the 3s deadline
+        await interaction.response.defer(ephemeral=True)
+        
         try:
             # Create ticket channel
             channel_name = f"rewards-{interaction.user.name.lower()}-{datetime.now().strftime('%m%d%H%M')}"
             
-            overwrites = {
-                guild.default_role: discord.PermissionOverwrite(read_messages=False),
-                guild.me: discord.PermissionOverwrite(read_messages=True, send_messages=True),
-                interaction.user: discord.PermissionOverwrite(read_messages=True, send_messages=True)
-            }
-            
-            # Add staff permissions
-            for role_id in ALLOWED_ROLE_IDS:
-                role = guild.get_role(role_id)
-                if role:
-                    overwrites[role] = discord.PermissionOverwrite(read_messages=True, send_messages=True)
+            overwrites = overwrite_templates.for_ticket(guild, interaction.user)
             
-            channel = await category.create_text_channel(
-                name=channel_name,
-                overwrites=overwrites
-            )
+            async with pool.slot(guild) as category:
+                channel = await rest_scheduler.run(
+                    'create_channel',
+                    lambda: category.create_text_channel(
+                        name=channel_name,
+                        overwrites=overwrites,
+                        topic=format_topic('rewards', owner_id=interaction.user.id)
+                    ),
+                    key=guild.id,
+                    priority=INTERACTIVE
+                )
+            await register_ticket_channel(channel, 'rewards', owner_id=interaction.user.id)
             
             # Create welcome embed
             embed = discord.Embed(
@@ -204,14 +703,19 @@ class TicketsPanelView(discord.ui.View):
             # Add close button
             close_view = CloseTicketView()
             
-            await channel.send(f"🎫 **Ticket Created**\n{interaction.user.mention}", embed=embed, view=close_view)
+            await rest_scheduler.run(
+                'send_message',
+                lambda: channel.send(f"🎫 **Ticket Created**\n{interaction.user.mention}", embed=embed, view=close_view),
+                key=channel.id,
+                priority=INTERACTIVE
+            )
             
-            await interaction.response.send_message(f"✅ Your rewards ticket has been created: {channel.mention}", ephemeral=True)
+            await interaction.followup.send(f"✅ Your rewards ticket has been created: {channel.mention}", ephemeral=True)
             
         except discord.Forbidden:
-            await interaction.response.send_message("❌ I don't have permission to create channels.", ephemeral=True)
+            await interaction.followup.send("❌ I don't have permission to create channels.", ephemeral=True)
         except Exception as e:
-            await interaction.response.send_message(f"❌ Error creating ticket: {str(e)}", ephemeral=True)
+            await interaction.followup.send(f"❌ Error creating ticket: {str(e)}", ephemeral=True)
 
 class CloseTicketView(discord.ui.View):
     def __init__(self):
@@ -222,7 +726,7 @@ class CloseTicketView(discord.ui.View):
         """Handle close ticket button"""
         
         # Check if user has permission to close
-        if not await has_ticket_permissions(interaction.user, interaction.guild):
+        if not await has_ticket_permissions(interaction.user, interaction.guild, 'close_ticket'):
             await interaction.response.send_message("❌ You don't have permission to close tickets.", ephemeral=True)
             return
         
@@ -235,174 +739,324 @@ class CloseTicketView(discord.ui.View):
         
         await interaction.response.send_message(embed=embed)
         
-        # Delete channel after 5 seconds
-        await asyncio.sleep(5)
-        await interaction.followup.channel.delete()
+        # Archived and deleted by the delayed action scheduler
+        await schedule_ticket_close(interaction.channel, f"Ticket closed by {interaction.user}")
 
-async def auto_send_tickets_panel():
-    """Automatically send tickets panel to specified channel on bot startup"""
-    PANEL_CHANNEL_ID = 1418736927112302602
+def build_tickets_panel_embed():
+    """Embed for the tickets panel (shared by startup and /tickets-panel)"""
+    embed = discord.Embed(
+        title="🎫 Tickets Panel",
+        description="Need help or want to claim rewards? Use the button below!",
+        color=0x036fff
+    )
     
-    try:
-        print(f"🎫 Auto-sending tickets panel to channel {PANEL_CHANNEL_ID}...")
-        
-        # Get the channel
-        channel = bot.get_channel(PANEL_CHANNEL_ID)
-        if not channel:
-            print(f"❌ Could not find channel with ID {PANEL_CHANNEL_ID}")
-            return
-        
-        print(f"✅ Found channel: #{channel.name}")
-        
-        # Purge all messages in the channel
+    embed.add_field(
+        name="📋 How to use:",
+        value="• Click **Claim Rewards** to create a ticket\n• Staff will assist you as soon as possible\n• Only create tickets when needed",
+        inline=False
+    )
+    
+    embed.add_field(
+        name="⏰ Response Time:",
+        value="We typically respond within 1-24 hours",
+        inline=True
+    )
+    
+    embed.add_field(
+        name="🏪 Store Support:",
+        value="For purchase issues, include your transaction ID",
+        inline=True
+    )
+    
+    embed.set_footer(text="DonutMarket Support System", icon_url="https://donutmarket.store/static/logo1.png")
+    return embed
+
+def is_tickets_panel(message):
+    return message.author.id == bot.user.id and any(embed.title == "🎫 Tickets Panel" for embed in message.embeds)
+
+async def find_tickets_panel(channel):
+    """The panel message tracked in startup state, or the bot's most recent panel in the channel"""
+    panel = startup_state.get('tickets_panel') or {}
+    if panel.get('channel_id') == channel.id and panel.get('message_id'):
         try:
-            deleted = await channel.purge(limit=100)
-            print(f"🗑️ Purged {len(deleted)} messages from #{channel.name}")
-        except discord.Forbidden:
-            print(f"⚠️ No permission to purge messages in #{channel.name}")
-        except Exception as e:
-            print(f"⚠️ Error purging messages: {e}")
-        
-        # Create the tickets panel embed
-        embed = discord.Embed(
-            title="🎫 Tickets Panel",
-            description="Need help or want to claim rewards? Use the button below!",
-            color=0x036fff
-        )
-        
-        embed.add_field(
-            name="📋 How to use:",
-            value="• Click **Claim Rewards** to create a ticket\n• Staff will assist you as soon as possible\n• Only create tickets when needed",
-            inline=False
-        )
-        
-        embed.add_field(
-            name="⏰ Response Time:",
-            value="We typically respond within 1-24 hours",
-            inline=True
-        )
-        
-        embed.add_field(
-            name="🏪 Store Support:",
-            value="For purchase issues, include your transaction ID",
-            inline=True
-        )
-        
-        embed.set_footer(text="DonutMarket Support System", icon_url="https://donutmarket.store/static/logo1.png")
-        
-        # Create the view with claim rewards button
-        view = TicketsPanelView()
-        
-        # Send the panel
-        message = await channel.send(embed=embed, view=view)
-        print(f"✅ Tickets panel sent to #{channel.name} (Message ID: {message.id})")
-        
-    except Exception as e:
-        print(f"❌ Error auto-sending tickets panel: {e}")
-        import traceback
-        traceback.print_exc()
+            return await channel.fetch_message(panel['message_id'])
+        except discord.NotFound:
+            log.warning("⚠️ Tracked tickets panel message is gone", extra={'message_id': panel['message_id']})
+    async for message in channel.history(limit=PANEL_SEARCH_LIMIT):
+        if is_tickets_panel(message):
+            return message
+    return None
 
-@bot.event
-async def on_ready():
-    try:
-        print(f"✅ {bot.user} has connected to Discord!")
-        print(f"📊 Bot is in {len(bot.guilds)} guilds")
-        
+def remember_tickets_panel(message, content_hash):
+    startup_state.set('tickets_panel', {'channel_id': message.channel.id, 'message_id': message.id, 'embed_hash': content_hash})
+
+async def reconcile_tickets_panel():
+    """Make sure the panel channel has exactly one up-to-date panel, editing it in place"""
+    channel = bot.get_channel(PANEL_CHANNEL_ID)
+    if not channel:
+        log.error(f"❌ Could not find panel channel with ID {PANEL_CHANNEL_ID}")
+        return 'missing_channel'
+    
+    embed = build_tickets_panel_embed()
+    content_hash = embed_hash(embed.to_dict())
+    message = await find_tickets_panel(channel)
+    if message is None:
+        message = await channel.send(embed=embed, view=TicketsPanelView())
+        remember_tickets_panel(message, content_hash)
+        log.info(f"✅ Tickets panel sent to #{channel.name}", extra={'message_id': message.id})
+        return 'sent'
+    
+    # The persistent view keeps the buttons working, so only edit when the content changed
+    if (startup_state.get('tickets_panel') or {}).get('embed_hash') == content_hash and message.components:
+        remember_tickets_panel(message, content_hash)
+        return 'unchanged'
+    await message.edit(embed=embed, view=TicketsPanelView())
+    remember_tickets_panel(message, content_hash)
+    log.info(f"✅ Tickets panel updated in #{channel.name}", extra={'message_id': message.id})
+    return 'edited'
+
+def command_payloads():
+    payloads = []
+    for command in bot.tree.get_commands():
+        try:
+            payloads.append(command.to_dict(bot.tree))
+        except TypeError:
+            # discord.py < 2.4 takes no tree argument
+            payloads.append(command.to_dict())
+    return payloads
+
+async def sync_commands_if_changed():
+    """Sync the slash command tree only when it differs from the last successful sync"""
+    tree_hash = command_tree_hash(command_payloads(), bot.application_id)
+    if tree_hash == startup_state.get('command_tree_hash') and not FORCE_COMMAND_SYNC:
+        log.info("✅ Slash commands unchanged - skipping sync")
+        return 'unchanged'
+    synced = await bot.tree.sync()
+    startup_state.set('command_tree_hash', tree_hash)
+    log.info(f'✅ Synced {len(synced)} slash command(s)', extra={'commands': [cmd.name for cmd in synced]})
+    return 'synced'
+
+def refresh_guild_caches(guilds):
+    """Rebuild everything derived from guild objects (these are replaced on every fresh session)"""
+    # Guild objects are replaced on reconnect, so drop cached overwrites
+    overwrite_templates.invalidate()
+    member_cache.clear()
+    for guild in guilds:
+        for pool in store_router.pools_for_guild(guild.id):
+            pool.refresh(guild)
+        if guild.id == GUILD_ID and not LEAN_MEMBER_CACHE:
+            member_index.rebuild(guild.members)
+    rebuild_ticket_registry(guilds)
+    
+    # Channels created just before a crash may not have reached the index
+    for record in ticket_registry.records('purchase'):
+        if record.transaction_id and ticket_index.get(record.transaction_id) is None:
+            ticket_index.record(record.transaction_id, record.channel_id)
+    log.info(f"✅ Indexed {len(member_index)} members and {len(ticket_registry)} open tickets", extra={'member_cache': MEMBER_CACHE_MODE})
+
+# Phases of the one-time startup pipeline and their durations (see /health)
+startup_timer = PhaseTimer()
+startup_results = {}
+startup_task = None
+
+async def run_startup():
+    """One-time startup work: persistent views, queue recovery, command sync and the tickets panel"""
+    with startup_timer.phase('views'):
         # Add persistent views for buttons to work after restart
-        print("🔍 Adding persistent views...")
         bot.add_view(TicketsPanelView())
         bot.add_view(CloseTicketView())
-        print("✅ Persistent views added")
-        
-        # Sync slash commands
-        print("🔍 Syncing slash commands...")
+    
+    with startup_timer.phase('requeue'):
+        # Pick up orders that were still waiting for a ticket when the bot stopped
+        requeued = await queue_pending_orders()
+        if requeued:
+            log.info(f"📥 Re-queued {requeued} pending order(s)")
+        asyncio.create_task(order_lease_loop())
+    
+    with startup_timer.phase('search'):
+        rebuild_ticket_search()
+        log.info(f"🔎 Indexed {len(ticket_search)} tickets for search")
+    
+    with startup_timer.phase('catalog'):
+        catalog.refresh()
+    
+    with startup_timer.phase('timers'):
+        # Replay delayed actions from before the restart; tickets without timers start fresh ones
+        replayed = delayed_actions.load()
+        for record in ticket_registry.records():
+            if not any(delayed_actions.due_at(kind, record.channel_id) for kind in ('delete_channel', 'reminder', 'auto_close')):
+                await touch_ticket(record.channel_id)
+        delayed_actions.start()
+        if replayed:
+            log.info(f"⏰ Replayed {replayed} delayed action(s)")
+    
+    with startup_timer.phase('commands'):
         try:
-            synced = await bot.tree.sync()
-            print(f'✅ Synced {len(synced)} slash command(s)')
-            for cmd in synced:
-                print(f'   - /{cmd.name}')
+            startup_results['commands'] = await sync_commands_if_changed()
         except Exception as e:
-            print(f'❌ Failed to sync commands: {e}')
-        
-        # Auto-send tickets panel to specified channel
-        print("🔍 About to call auto_send_tickets_panel()...")
-        await auto_send_tickets_panel()
-        print("🔍 auto_send_tickets_panel() completed")
-        
-        print("✅ Bot startup completed successfully!")
-        
-    except Exception as e:
-        print(f"❌ Error in on_ready: {e}")
-        import traceback
-        traceback.print_exc()
+            startup_results['commands'] = 'failed'
+            log.exception(f'❌ Failed to sync commands: {e}')
     
-    # List all guilds the bot is in
-    print(f"🔍 Available guilds:")
-    for g in bot.guilds:
-        print(f"   - {g.name} (ID: {g.id})")
+    with startup_timer.phase('panel'):
+        try:
+            startup_results['panel'] = await reconcile_tickets_panel()
+        except Exception as e:
+            startup_results['panel'] = 'failed'
+            log.exception(f"❌ Error reconciling tickets panel: {e}")
     
-    # Check if we can find the target guild
-    guild = bot.get_guild(GUILD_ID)
-    if guild:
-        print(f"🏠 Connected to guild: {guild.name}")
-        category = discord.utils.get(guild.categories, id=TICKET_CATEGORY_ID)
-        if category:
-            print(f"📁 Ticket category found: {category.name}")
+    startup_timer.finish()
+    log.info("✅ Bot startup completed", extra={'startup': startup_timer.snapshot(), 'results': startup_results})
+
+@bot.event
+async def on_ready():
+    """Runs on every new gateway session; only cache refreshes repeat after the first"""
+    global startup_task
+    first = startup_task is None
+    log.info(f"✅ {bot.user} has connected to Discord!" if first else f"🔄 {bot.user} started a new gateway session", extra={'guilds': len(bot.guilds)})
+    
+    guilds = []
+    for guild_id in store_router.guild_ids():
+        guild = bot.get_guild(guild_id)
+        if guild:
+            guilds.append(guild)
         else:
-            print(f"❌ Ticket category not found (ID: {TICKET_CATEGORY_ID})")
-            print(f"🔍 Available categories in {guild.name}:")
-    
-    # Sync slash commands
-    try:
-        synced = await bot.tree.sync()
-        print(f'✅ Synced {len(synced)} command(s)')
-    except Exception as e:
-        print(f'❌ Failed to sync commands: {e}')
-    
-    print('🎫 DonutMarket Bot is ready for ticket management!')
+            log.error(f"❌ Guild with ID {guild_id} not found", extra={'available_guilds': {g.id: g.name for g in bot.guilds}})
+    if guilds:
+        with startup_timer.phase('caches' if first else 'caches_reconnect'):
+            refresh_guild_caches(guilds)
+        if first:
+            for route in store_router.routes():
+                guild = bot.get_guild(route.guild_id)
+                if guild and not route.pool.primary(guild):
+                    log.error(f"❌ Ticket category not found (ID: {route.category_id})", extra={'store': route.store, 'categories': {c.id: c.name for c in guild.categories}})
+    
+    if first:
+        startup_task = asyncio.create_task(run_startup())
+
+@bot.event
+async def on_member_join(member):
+    if member.id in ALLOWED_USER_IDS:
+        overwrite_templates.invalidate(member.guild.id)
+    # Lean mode resolves buyers through member_cache; the index is never rebuilt there
+    if member.guild.id == GUILD_ID and not LEAN_MEMBER_CACHE:
+        member_index.add(member)
+
+@bot.event
+async def on_member_update(before, after):
+    if before.roles != after.roles:
+        permission_engine.invalidate(after.id, after.guild.id)
+    if before.display_name != after.display_name or before.name != after.name:
+        if after.guild.id == GUILD_ID and not LEAN_MEMBER_CACHE:
+            member_index.add(after)
+        member_cache.invalidate(after.id)
+
+@bot.event
+async def on_user_update(before, after):
+    # Username and global name changes arrive as user updates
+    guild = bot.get_guild(GUILD_ID)
+    member = guild.get_member(after.id) if guild and not LEAN_MEMBER_CACHE else None
+    if member:
+        member_index.add(member)
+    member_cache.invalidate(after.id)
+
+@bot.event
+async def on_member_remove(member):
+    permission_engine.invalidate(member.id, member.guild.id)
+    if member.id in ALLOWED_USER_IDS:
+        overwrite_templates.invalidate(member.guild.id)
+    if member.guild.id == GUILD_ID:
+        member_index.remove(member.id)
+    member_cache.invalidate(member.id)
+
+@bot.listen('on_raw_member_remove')
+async def forget_removed_member(payload):
+    # Lean mode doesn't cache members, so on_member_remove never fires for most of them
+    permission_engine.invalidate(payload.user.id, payload.guild_id)
+    member_cache.invalidate(payload.user.id)
+
+@bot.event
+async def on_guild_role_update(before, after):
+    # Role permission changes can grant or revoke Administrator
+    if before.permissions != after.permissions:
+        permission_engine.clear()
+    if after.id in ALLOWED_ROLE_IDS:
+        overwrite_templates.invalidate(after.guild.id)
+
+@bot.event
+async def on_guild_role_create(role):
+    if role.id in ALLOWED_ROLE_IDS:
+        overwrite_templates.invalidate(role.guild.id)
+
+@bot.event
+async def on_guild_role_delete(role):
+    permission_engine.clear()
+    overwrite_templates.invalidate(role.guild.id)
+
+@bot.event
+async def on_guild_channel_create(channel):
+    if getattr(channel, 'category_id', None) in store_router and channel.id not in ticket_registry:
+        record = ticket_record_from_channel(channel)
+        if record:
+            ticket_registry.add(record)
+            if ticket_search.get(channel.id) is None:
+                index_ticket(channel, owner_id=record.owner_id, transaction_id=record.transaction_id)
+
+@bot.listen('on_message')
+async def track_ticket_activity(message):
+    if not message.author.bot and message.channel.id in ticket_registry:
+        await touch_ticket(message.channel.id)
+
+@bot.event
+async def on_guild_channel_delete(channel):
+    await delayed_actions.cancel_target(channel.id)
+    if ticket_registry.remove(channel.id):
+        await order_store.call(order_store.close_ticket, channel.id)
+        ticket_search.update(channel.id, status=TICKET_CLOSED)
+    pool = store_router.pool_for_category(getattr(channel, 'category_id', None))
+    if pool is not None and channel.guild.id in store_router.guild_ids():
+        try:
+            await pool.release(channel.guild, channel.category_id)
+        except Exception as e:
+            log.warning(f"⚠️ Could not remove empty overflow category: {e}")
 
 @bot.tree.command(name="create_ticket", description="Create a new support ticket")
 async def create_ticket_command(interaction: discord.Interaction, reason: str = "General Support"):
     """Manual ticket creation command"""
-    if not await has_ticket_permissions(interaction.user, interaction.guild):
+    if not await has_ticket_permissions(interaction.user, interaction.guild, 'create_ticket'):
         await interaction.response.send_message("❌ You don't have permission to create tickets.", ephemeral=True)
         return
     
     guild = interaction.guild
-    category = discord.utils.get(guild.categories, id=TICKET_CATEGORY_ID)
+    pool = store_router.pool_for_guild(guild.id)
     
-    if not category:
+    if not pool.primary(guild):
         await interaction.response.send_message("❌ Ticket category not found. Please contact an administrator.", ephemeral=True)
         return
     
+    # Acknowledge first: the channel create below can queue behind rate limits past the 3s deadline
+    await interaction.response.defer(ephemeral=True)
+    
     # Create ticket channel
     channel_name = f"ticket-{interaction.user.name}-{datetime.now().strftime('%m%d%H%M')}"
     
     # Set permissions for the ticket channel
-    overwrites = {
-        guild.default_role: discord.PermissionOverwrite(read_messages=False),
-        interaction.user: discord.PermissionOverwrite(read_messages=True, send_messages=True),
-        guild.me: discord.PermissionOverwrite(read_messages=True, send_messages=True)
-    }
-    
-    # Add permissions for allowed users and roles
-    for user_id in ALLOWED_USER_IDS:
-        user = guild.get_member(user_id)
-        if user:
-            overwrites[user] = discord.PermissionOverwrite(read_messages=True, send_messages=True)
-    
-    for role_id in ALLOWED_ROLE_IDS:
-        role = guild.get_role(role_id)
-        if role:
-            overwrites[role] = discord.PermissionOverwrite(read_messages=True, send_messages=True)
+    overwrites = overwrite_templates.for_ticket(guild, interaction.user)
     
     # Create the channel
-    ticket_channel = await guild.create_text_channel(
-        name=channel_name,
-        category=category,
-        overwrites=overwrites,
-        reason=f"Support ticket created by {interaction.user}"
-    )
+    async with pool.slot(guild) as category:
+        ticket_channel = await rest_scheduler.run(
+            'create_channel',
+            lambda: guild.create_text_channel(
+                name=channel_name,
+                category=category,
+                overwrites=overwrites,
+                topic=format_topic('support', owner_id=interaction.user.id),
+                reason=f"Support ticket created by {interaction.user}"
+            ),
+            key=guild.id,
+            priority=INTERACTIVE
+        )
+    await register_ticket_channel(ticket_channel, 'support', owner_id=interaction.user.id)
     
     # Create ticket embed
     embed = discord.Embed(
@@ -416,65 +1070,82 @@ async def create_ticket_command(interaction: discord.Interaction, reason: str =
     
     # Send ticket message with close button
     view = TicketView()
-    await ticket_channel.send(embed=embed, view=view)
+    await rest_scheduler.run('send_message', lambda: ticket_channel.send(embed=embed, view=view), key=ticket_channel.id, priority=INTERACTIVE)
     
     # Respond to the interaction
-    await interaction.response.send_message(f"✅ Ticket created: {ticket_channel.mention}", ephemeral=True)
+    await interaction.followup.send(f"✅ Ticket created: {ticket_channel.mention}", ephemeral=True)
 
-async def create_purchase_ticket(buyer_name, discord_user, transaction_id, total_amount, items):
-    """Create a ticket for a store purchase"""
-    guild = bot.get_guild(GUILD_ID)
+def existing_purchase_ticket(transaction_id):
+    """Channel already created for this transaction (a bare Object if it has since been closed)
+
+    The tickets table is shared with other replicas; the open-ticket
+    registry also knows channels whose row was never written (a crash
+    right after the channel was created).
+    """
+    channel_id = ticket_index.get(transaction_id)
+    if channel_id is None:
+        record = ticket_registry.by_transaction(transaction_id)
+        if record is None:
+            return None
+        channel_id = record.channel_id
+        ticket_index.record(transaction_id, channel_id)
+    return bot.get_channel(channel_id) or discord.Object(id=channel_id)
+
+async def create_purchase_ticket(buyer_name, discord_user, transaction_id, total_amount, items, store=None):
+    """Create a ticket for a store purchase, at most once per transaction id"""
+    with transaction_context(transaction_id):
+        async with ticket_index.guard(transaction_id):
+            existing = existing_purchase_ticket(transaction_id)
+            if existing is not None:
+                ticket_log.info("♻️ Ticket already exists", extra={'channel_id': existing.id})
+                return existing
+            return await _create_purchase_ticket(buyer_name, discord_user, transaction_id, total_amount, items, store)
+
+async def _create_purchase_ticket(buyer_name, discord_user, transaction_id, total_amount, items, store=None):
+    """Create a ticket for a store purchase in its store's guild and category"""
+    route = store_router.route(purchase_store(store, items))
+    guild = bot.get_guild(route.guild_id)
     if not guild:
-        print(f"❌ Guild with ID {GUILD_ID} not found")
-        print(f"🔍 Available guilds:")
-        for g in bot.guilds:
-            print(f"   - {g.name} (ID: {g.id})")
-        print(f"💡 Make sure the bot is invited to the correct server and has proper permissions")
+        ticket_log.error(
+            f"❌ Guild with ID {route.guild_id} not found - make sure the bot is invited to the correct server and has proper permissions",
+            extra={'store': route.store, 'available_guilds': {g.id: g.name for g in bot.guilds}}
+        )
         return None
     
-    category = discord.utils.get(guild.categories, id=TICKET_CATEGORY_ID)
-    if not category:
-        print(f"Category with ID {TICKET_CATEGORY_ID} not found")
+    if not route.pool.primary(guild):
+        ticket_log.error(f"Category with ID {route.category_id} not found", extra={'store': route.store})
         return None
     
+    started = time.perf_counter()
+    
     # Create ticket channel name
     channel_name = f"purchase-{buyer_name.lower().replace('#', '')}-{datetime.now().strftime('%m%d%H%M')}"
     
-    # Set permissions for the ticket channel
-    overwrites = {
-        guild.default_role: discord.PermissionOverwrite(read_messages=False),
-        guild.me: discord.PermissionOverwrite(read_messages=True, send_messages=True)
-    }
-    
     # Try to find the buyer in the guild
-    buyer_member = None
-    for member in guild.members:
-        if str(member) == discord_user or member.display_name.lower() == buyer_name.lower():
-            buyer_member = member
-            break
-    
-    if buyer_member:
-        overwrites[buyer_member] = discord.PermissionOverwrite(read_messages=True, send_messages=True)
-    
-    # Add permissions for allowed users and roles
-    for user_id in ALLOWED_USER_IDS:
-        user = guild.get_member(user_id)
-        if user:
-            overwrites[user] = discord.PermissionOverwrite(read_messages=True, send_messages=True)
-    
-    for role_id in ALLOWED_ROLE_IDS:
-        role = guild.get_role(role_id)
-        if role:
-            overwrites[role] = discord.PermissionOverwrite(read_messages=True, send_messages=True)
+    buyer_member = await find_buyer_member(guild, discord_user, buyer_name)
+    
+    # Set permissions for the ticket channel
+    overwrites = overwrite_templates.for_ticket(guild, buyer_member)
+    ticket_stage_seconds.observe(time.perf_counter() - started, 'webhook', 'lookup')
     
     try:
         # Create the channel
-        ticket_channel = await guild.create_text_channel(
-            name=channel_name,
-            category=category,
-            overwrites=overwrites,
-            reason=f"Store purchase ticket for {buyer_name}"
-        )
+        owner_id = buyer_member.id if buyer_member else None
+        with ticket_stage_seconds.time('webhook', 'create_channel'):
+            async with route.pool.slot(guild) as category:
+                ticket_channel = await rest_scheduler.run(
+                    'create_channel',
+                    lambda: guild.create_text_channel(
+                        name=channel_name,
+                        category=category,
+                        overwrites=overwrites,
+                        topic=format_topic('purchase', owner_id=owner_id, transaction_id=transaction_id),
+                        reason=f"Store purchase ticket for {buyer_name}"
+                    ),
+                    key=guild.id,
+                    priority=BACKGROUND
+                )
+        await register_ticket_channel(ticket_channel, 'purchase', owner_id=owner_id, transaction_id=transaction_id)
         
         # Create purchase embed with proper formatting
         embed = discord.Embed(
@@ -501,11 +1172,11 @@ async def create_purchase_ticket(buyer_name, discord_user, transaction_id, total
             embed.add_field(name="📦 Purchased Items", value=items_text, inline=False)
         else:
             embed.add_field(name="📦 Purchased Items", value="No items listed", inline=False)
+        add_catalog_check(embed, items, total_amount, store)
         
         # Add store owner mention
-        server_owner = guild.get_member(SERVER_OWNER_ID)
-        if server_owner:
-            embed.add_field(name="🏪 Store Owner", value=server_owner.mention, inline=False)
+        if LEAN_MEMBER_CACHE or guild.get_member(SERVER_OWNER_ID):
+            embed.add_field(name="🏪 Store Owner", value=f"<@{SERVER_OWNER_ID}>", inline=False)
         
         # Add instructions
         embed.add_field(
@@ -517,7 +1188,7 @@ async def create_purchase_ticket(buyer_name, discord_user, transaction_id, total
         embed.set_footer(text=f"Ticket ID: {ticket_channel.id} | DonutMarket Store")
         embed.set_thumbnail(url="https://donutmarket.store/static/logo1.png")
         
-        # Send welcome message first
+        # Welcome message, details embed and close button go out as one message
         welcome_msg = f"🎫 **Purchase Ticket Created**\n\n"
         welcome_msg += f"Hello {buyer_member.mention if buyer_member else buyer_name}! "
         welcome_msg += f"Your purchase ticket has been created.\n\n"
@@ -526,33 +1197,85 @@ async def create_purchase_ticket(buyer_name, discord_user, transaction_id, total
         welcome_msg += f"• Amount: **${total_amount}**\n\n"
         welcome_msg += f"Our team will process your order shortly. Please wait for delivery confirmation."
         
-        await ticket_channel.send(welcome_msg)
-        
-        # Send the detailed embed with close button
         view = TicketView()
-        message = await ticket_channel.send(embed=embed, view=view)
+        with ticket_stage_seconds.time('webhook', 'send_message'):
+            message = await rest_scheduler.run(
+                'send_message',
+                lambda: ticket_channel.send(welcome_msg, embed=embed, view=view),
+                key=ticket_channel.id
+            )
         
         # Pin the detailed message
-        await message.pin()
+        with ticket_stage_seconds.time('webhook', 'pin_message'):
+            await rest_scheduler.run('pin_message', message.pin, key=ticket_channel.id)
         
-        print(f"Purchase ticket created: {ticket_channel.name}")
+        ticket_stage_seconds.observe(time.perf_counter() - started, 'webhook', 'total')
+        ticket_log.info("Purchase ticket created", extra={'channel': ticket_channel.name, 'channel_id': ticket_channel.id})
         return ticket_channel
         
     except Exception as e:
-        print(f"Error creating purchase ticket: {e}")
+        ticket_log.exception(f"Error creating purchase ticket: {e}")
         return None
 
+# Background ticket jobs for the async webhook mode
+purchase_jobs = PurchaseJobs()
+
+async def run_purchase_job(purchase):
+    """Worker-pool handler: create the ticket for an accepted purchase"""
+    transaction_id = purchase['transactionId']
+    if not await order_store.call(order_store.acquire_lease, transaction_id, REPLICA_ID, ORDER_LEASE_SECONDS):
+        # Our lease lapsed and another replica took the order over; /webhook/purchase/<id>
+        # falls back to the order store for its status
+        ticket_log.warning("♻️ Order leased to another replica", extra={'transaction_id': transaction_id})
+        purchase_jobs.forget(transaction_id)
+        return
+    purchase_jobs.update(transaction_id, IN_PROGRESS)
+    ticket_channel = await create_purchase_ticket(
+        buyer_name=purchase['buyer'],
+        discord_user=purchase['discord'],
+        transaction_id=transaction_id,
+        total_amount=purchase['totalAmount'],
+        items=purchase['items'],
+        store=purchase.get('store')
+    )
+    if not ticket_channel:
+        purchase_jobs.update(transaction_id, QUEUED, error='Failed to create ticket')
+        await order_store.call(order_store.record_attempt, transaction_id, 'Failed to create ticket')
+        raise RuntimeError(f"Failed to create ticket for {transaction_id}")
+    await order_store.call(order_store.mark_ticketed, transaction_id, ticket_channel.id)
+    purchase_jobs.update(transaction_id, CREATED, channel_id=ticket_channel.id, ticket_name=getattr(ticket_channel, 'name', None), error=None)
+
+async def fail_purchase_job(purchase, error):
+    purchase_jobs.update(purchase['transactionId'], FAILED, error=str(error))
+    await order_store.call(order_store.mark_failed, purchase['transactionId'], error)
+
+purchase_pool = WorkerPool(
+    run_purchase_job,
+    concurrency=TICKET_WORKER_CONCURRENCY,
+    max_attempts=TICKET_MAX_ATTEMPTS,
+    on_give_up=fail_purchase_job,
+    name='purchases'
+)
+
+def enqueue_purchase(purchase):
+    """Accept a validated purchase for background ticket creation (False if already known)"""
+    transaction_id = purchase['transactionId']
+    if not purchase_jobs.enqueue(transaction_id):
+        return False
+    purchase_pool.submit(transaction_id, purchase)
+    return True
+
 @bot.tree.command(name="test_purchase", description="Test the purchase ticket system")
 async def test_purchase_command(interaction: discord.Interaction):
     """Test command for purchase tickets"""
-    if not await has_ticket_permissions(interaction.user, interaction.guild):
+    if not await has_ticket_permissions(interaction.user, interaction.guild, 'test_purchase'):
         await interaction.response.send_message("❌ You don't have permission to use this command.", ephemeral=True)
         return
     
-    # Test data
+    # Test data (priced from stores/pedrosmarket.json, so it passes the catalog check)
     test_items = [
-        {"name": "DonutSMP Money", "amount": "200M"},
-        {"name": "Netherite Armor", "amount": "1x"}
+        {"name": "DonutSMP Money", "amount": "150M", "price": "15.00"},
+        {"name": "Netherite Set", "amount": "1x", "price": "2.00"}
     ]
     
     await interaction.response.defer()
@@ -560,37 +1283,28 @@ async def test_purchase_command(interaction: discord.Interaction):
     ticket_channel = await create_purchase_ticket(
         buyer_name="TestUser",
         discord_user="TestUser#1234",
-        transaction_id="TEST_12345",
-        total_amount="25.00",
-        items=test_items
+        transaction_id=f"TEST_{int(time.time())}",
+        total_amount="17.00",
+        items=test_items,
+        store="Pedro's Market"
     )
     
-    
-    # Check if this is a ticket channel
-    if not (channel.name.startswith('ticket-') or channel.name.startswith('purchase-')):
-        await interaction.response.send_message("❌ This command can only be used in ticket channels.", ephemeral=True)
+    if ticket_channel is None:
+        await interaction.followup.send("❌ Could not create the test ticket - check the logs.")
         return
-    
-    # Create confirmation embed
-    embed = discord.Embed(
-        title="🔒 Close Ticket",
-        description="Are you sure you want to close this ticket? This action cannot be undone.",
-        color=discord.Color.red()
-    )
-    
-    # Create confirmation view
-    confirm_view = ConfirmCloseView()
-    await interaction.response.send_message(embed=embed, view=confirm_view, ephemeral=True)
+    await interaction.followup.send(f"✅ Test ticket: {ticket_channel.mention}")
 
 @bot.tree.command(name="bot_info", description="Show bot information and configuration")
 async def bot_info_command(interaction: discord.Interaction):
     """Show bot information"""
-    if not await has_ticket_permissions(interaction.user, interaction.guild):
+    if not await has_ticket_permissions(interaction.user, interaction.guild, 'bot_info'):
         await interaction.response.send_message("❌ You don't have permission to use this command.", ephemeral=True)
         return
     
     guild = bot.get_guild(GUILD_ID)
-    category = discord.utils.get(guild.categories, id=TICKET_CATEGORY_ID) if guild else None
+    category = category_pool.primary(guild)
+    categories = category_pool.categories(guild)
+    used_slots, total_slots = category_pool.capacity(guild)
     
     embed = discord.Embed(
         title="🤖 DonutMarket Bot Information",
@@ -599,60 +1313,208 @@ async def bot_info_command(interaction: discord.Interaction):
     )
     
     embed.add_field(name="📊 Bot Status", value=f"✅ Online\n🏠 Guild: {guild.name if guild else 'Not Found'}", inline=True)
-    embed.add_field(name="🎫 Ticket System", value=f"📁 Category: {category.name if category else 'Not Found'}\n🔧 Status: {'Ready' if category else 'Error'}", inline=True)
+    embed.add_field(name="🎫 Ticket System", value=f"📁 Category: {category.name if category else 'Not Found'}\n🗂️ Categories: {len(categories)} ({used_slots}/{total_slots} slots)\n🔧 Status: {'Ready' if category else 'Error'}", inline=True)
     embed.add_field(name="👥 Permissions", value=f"👤 Allowed Users: {len(ALLOWED_USER_IDS)}\n🎭 Allowed Roles: {len(ALLOWED_ROLE_IDS)}", inline=True)
     
+    shard_lines = [
+        f"{'🟢' if shard['connected'] else '🔴'} Shard {shard['shard_id']}: "
+        f"{shard['latency_ms'] if shard['latency_ms'] is not None else '—'}ms, {shard['guilds']} guild(s)"
+        for shard in shard_status()
+    ]
+    embed.add_field(name="🛰️ Shards", value='\n'.join(shard_lines)[:1024], inline=False)
+    store_lines = [
+        f"{'✅' if store['guild_connected'] and store['category_found'] else '❌'} {store['store']}: "
+        f"{store['ticket_slots_used']}/{store['ticket_slots_total']} slots"
+        for store in route_status()
+    ]
+    embed.add_field(name="🏪 Stores", value='\n'.join(store_lines)[:1024], inline=False)
+    
     # Count open tickets
-    open_tickets = 0
-    if guild and category:
-        for channel in category.channels:
-            if channel.name.startswith(('ticket-', 'purchase-')):
-                open_tickets += 1
+    open_tickets = ticket_registry.count('support', 'purchase')
+    rewards_tickets = ticket_registry.count('rewards')
+    
+    embed.add_field(name="📈 Statistics", value=f"🎫 Open Tickets: {open_tickets}\n🎁 Rewards Tickets: {rewards_tickets}\n🔗 Webhook: Running on :8080", inline=False)
     
-    embed.add_field(name="📈 Statistics", value=f"🎫 Open Tickets: {open_tickets}\n🔗 Webhook: Running on :8080", inline=False)
+    rest = rest_scheduler.snapshot()
+    rate_wait = sum(route['wait_seconds_total'] for route in rest['routes'].values())
+    embed.add_field(name="🚦 Discord REST", value=f"📥 Queued Calls: {rest['queue_depth']}\n⏳ Rate-Limit Wait: {rate_wait:.1f}s total", inline=False)
+    
+    latency = ticket_latency.snapshot()
+    if latency['count']:
+        embed.add_field(
+            name="⏱️ Ticket Queue Latency",
+            value=f"Last: {latency['last_seconds']}s\np95: {latency['p95_seconds']}s\nMax: {latency['max_seconds']}s",
+            inline=False
+        )
     
     embed.set_footer(text="DonutMarket Ticket System")
     
     await interaction.response.send_message(embed=embed, ephemeral=False)
 
+# Tickets per /list_tickets page
+TICKET_LIST_PAGE_SIZE = 10
+
+def ticket_list_embed(page):
+    """One page of open tickets from the registry's cached, sorted list"""
+    records = ticket_registry.records('support', 'purchase')
+    pages = max(1, math.ceil(len(records) / TICKET_LIST_PAGE_SIZE))
+    page = min(max(page, 0), pages - 1)
+    if not records:
+        return discord.Embed(title="🎫 Open Tickets", description="No open tickets found.", color=discord.Color.green()), 0, 1
+    
+    tickets = []
+    for record in records[page * TICKET_LIST_PAGE_SIZE:(page + 1) * TICKET_LIST_PAGE_SIZE]:
+        created = record.created_at.strftime("%m/%d %H:%M")
+        ticket_type = "🛒 Purchase" if record.ticket_type == 'purchase' else "🎫 Support"
+        tickets.append(f"{ticket_type} {record.mention} - Created {created}")
+    embed = discord.Embed(title="🎫 Open Tickets", description="\n".join(tickets), color=discord.Color.blue())
+    embed.set_footer(text=f"Page {page + 1} of {pages} | {len(records)} open tickets")
+    return embed, page, pages
+
+class TicketListView(discord.ui.View):
+    """Previous/next pages of /list_tickets for the staff member who ran it"""
+
+    def __init__(self, user_id, page=0):
+        super().__init__(timeout=300)
+        self.user_id = user_id
+        self.page = page
+
+    async def interaction_check(self, interaction: discord.Interaction) -> bool:
+        if interaction.user.id != self.user_id:
+            await interaction.response.send_message("❌ Run /list_tickets to page through tickets yourself.", ephemeral=True)
+            return False
+        return True
+
+    def render(self):
+        embed, self.page, pages = ticket_list_embed(self.page)
+        self.previous_page.disabled = self.page == 0
+        self.next_page.disabled = self.page >= pages - 1
+        return embed
+
+    @discord.ui.button(label='Previous', style=discord.ButtonStyle.secondary, emoji='◀️')
+    async def previous_page(self, interaction: discord.Interaction, button: discord.ui.Button):
+        self.page -= 1
+        await interaction.response.edit_message(embed=self.render(), view=self)
+
+    @discord.ui.button(label='Next', style=discord.ButtonStyle.secondary, emoji='▶️')
+    async def next_page(self, interaction: discord.Interaction, button: discord.ui.Button):
+        self.page += 1
+        await interaction.response.edit_message(embed=self.render(), view=self)
+
 @bot.tree.command(name="list_tickets", description="List all open tickets")
 async def list_tickets_command(interaction: discord.Interaction):
     """List all open tickets"""
-    if not await has_ticket_permissions(interaction.user, interaction.guild):
+    if not await has_ticket_permissions(interaction.user, interaction.guild, 'list_tickets'):
         await interaction.response.send_message("❌ You don't have permission to use this command.", ephemeral=True)
         return
     
     guild = bot.get_guild(GUILD_ID)
-    category = discord.utils.get(guild.categories, id=TICKET_CATEGORY_ID) if guild else None
     
-    if not category:
+    if not category_pool.primary(guild):
         await interaction.response.send_message("❌ Ticket category not found.", ephemeral=True)
         return
     
-    tickets = []
-    for channel in category.channels:
-        if channel.name.startswith(('ticket-', 'purchase-')):
-            # Get creation time
-            created = channel.created_at.strftime("%m/%d %H:%M")
-            ticket_type = "🛒 Purchase" if channel.name.startswith('purchase-') else "🎫 Support"
-            tickets.append(f"{ticket_type} {channel.mention} - Created {created}")
-    
-    if not tickets:
-        embed = discord.Embed(
-            title="🎫 Open Tickets",
-            description="No open tickets found.",
-            color=discord.Color.green()
-        )
+    view = TicketListView(interaction.user.id)
+    embed = view.render()
+    if view.next_page.disabled:
+        # Everything fits on one page
+        await interaction.response.send_message(embed=embed, ephemeral=True)
     else:
-        embed = discord.Embed(
-            title="🎫 Open Tickets",
-            description="\n".join(tickets[:10]),  # Limit to 10 tickets
-            color=discord.Color.blue()
-        )
-        
-        if len(tickets) > 10:
-            embed.set_footer(text=f"Showing 10 of {len(tickets)} tickets")
+        await interaction.response.send_message(embed=embed, view=view, ephemeral=True)
+
+def ticket_search_line(entry):
+    status = "🟢" if entry.status == TICKET_OPEN else "📁"
+    where = f"<#{entry.channel_id}>" if entry.status == TICKET_OPEN else f"#{entry.name or entry.channel_id}"
+    details = " · ".join(f"`{value}`" for value in (entry.buyer, entry.transaction_id) if value)
+    return f"{status} {where}" + (f" · {details}" if details else "")
+
+@bot.tree.command(name="find_ticket", description="Find an open or archived ticket by buyer, Discord tag, transaction id or item")
+@discord.app_commands.describe(query="Buyer, Discord tag, transaction id or item (pick a suggestion to jump to one ticket)")
+async def find_ticket_command(interaction: discord.Interaction, query: str):
+    if not await has_ticket_permissions(interaction.user, interaction.guild, 'find_ticket'):
+        await interaction.response.send_message("❌ You don't have permission to use this command.", ephemeral=True)
+        return
     
+    # Autocomplete suggestions submit the channel id
+    entry = ticket_search.get(int(query)) if query.isdigit() else None
+    matches = [entry] if entry else ticket_search.search(query, limit=TICKET_LIST_PAGE_SIZE)
+    if not matches:
+        await interaction.response.send_message(f"🔎 No tickets match `{query}`.", ephemeral=True)
+        return
+    
+    embed = discord.Embed(title="🔎 Ticket Search", description="\n".join(ticket_search_line(match) for match in matches), color=0x036fff)
+    if len(matches) == 1:
+        match = matches[0]
+        if match.discord:
+            embed.add_field(name="💬 Discord", value=f"`{match.discord}`", inline=True)
+        if match.items:
+            embed.add_field(name="📦 Items", value=", ".join(match.items)[:1024], inline=True)
+        if match.transcript_path:
+            embed.add_field(name="📜 Transcript", value=f"`{os.path.basename(match.transcript_path)}`", inline=False)
+    await interaction.response.send_message(embed=embed, ephemeral=True)
+
+@find_ticket_command.autocomplete('query')
+async def find_ticket_autocomplete(interaction: discord.Interaction, current: str):
+    if not await has_ticket_permissions(interaction.user, interaction.guild, 'find_ticket'):
+        return []
+    choices = []
+    for entry in ticket_search.search(current, limit=25):
+        label = " · ".join(str(value) for value in (entry.buyer, entry.transaction_id, entry.name) if value) or str(entry.channel_id)
+        status = "🟢" if entry.status == TICKET_OPEN else "📁"
+        choices.append(discord.app_commands.Choice(name=f"{status} {label}"[:100], value=str(entry.channel_id)))
+    return choices
+
+# /sales_stats windows: label -> summary() arguments
+SALES_WINDOWS = {
+    '24h': {'hours': 24},
+    '7d': {'days': 7},
+    '30d': {'days': 30},
+    'all': {},
+}
+
+@bot.tree.command(name="sales_stats", description="Show order volume and revenue by store")
+@discord.app_commands.describe(window="Time window", store="Only this store (name as shown in tickets)")
+@discord.app_commands.choices(window=[
+    discord.app_commands.Choice(name="Last 24 hours", value='24h'),
+    discord.app_commands.Choice(name="Last 7 days", value='7d'),
+    discord.app_commands.Choice(name="Last 30 days", value='30d'),
+    discord.app_commands.Choice(name="All time", value='all'),
+])
+async def sales_stats_command(interaction: discord.Interaction, window: str = '24h', store: str = None):
+    """Read the running sales aggregates"""
+    if not await has_ticket_permissions(interaction.user, interaction.guild, 'sales_stats'):
+        await interaction.response.send_message("❌ You don't have permission to use this command.", ephemeral=True)
+        return
+    
+    # Pick up orders stored since the last checkpoint loop, including other replicas'
+    fold_new_orders()
+    summary = sales_stats.summary(store=store, **SALES_WINDOWS.get(window, SALES_WINDOWS['24h']))
+    embed = discord.Embed(
+        title=f"📊 Sales - {store or 'All Stores'} ({window})",
+        color=0x036fff,
+        timestamp=datetime.now(timezone.utc)
+    )
+    embed.add_field(name="🧾 Orders", value=str(summary['orders']), inline=True)
+    embed.add_field(name="💰 Revenue", value=f"${summary['revenue']:.2f}", inline=True)
+    if summary['stores'] and not store:
+        embed.add_field(
+            name="🏪 Top Stores",
+            value="\n".join(f"• {name}: {count} orders, ${revenue:.2f}" for name, (count, revenue) in summary['stores']),
+            inline=False
+        )
+    if summary['products']:
+        embed.add_field(
+            name="📦 Top Products (all time)",
+            value="\n".join(f"• {name}: {count} orders, {units:f}{unit or 'x'}, ${revenue:.2f}" for name, count, units, revenue, unit in summary['products']),
+            inline=False
+        )
+    if summary['buyers']:
+        embed.add_field(
+            name="🏆 Top Buyers",
+            value="\n".join(f"• `{buyer}`: ${revenue:.2f}" + (f" (±${error:.2f})" if error else "") for buyer, revenue, error in summary['buyers']),
+            inline=False
+        )
+    embed.set_footer(text=f"{sales_stats.count} orders recorded | DonutMarket Store")
     await interaction.response.send_message(embed=embed, ephemeral=True)
 
 @bot.tree.command(name="tickets-panel", description="Send a tickets panel to a channel")
@@ -660,36 +1522,11 @@ async def tickets_panel(interaction: discord.Interaction, channel: discord.TextC
     """Send or edit a tickets panel with claim rewards button"""
     
     # Check permissions
-    if not await has_ticket_permissions(interaction.user, interaction.guild):
+    if not await has_ticket_permissions(interaction.user, interaction.guild, 'tickets-panel'):
         await interaction.response.send_message("❌ You don't have permission to use this command.", ephemeral=True)
         return
     
-    # Create the embed
-    embed = discord.Embed(
-        title="🎫 Tickets Panel",
-        description="Need help or want to claim rewards? Use the button below!",
-        color=0x036fff
-    )
-    
-    embed.add_field(
-        name="📋 How to use:",
-        value="• Click **Claim Rewards** to create a ticket\n• Staff will assist you as soon as possible\n• Only create tickets when needed",
-        inline=False
-    )
-    
-    embed.add_field(
-        name="⏰ Response Time:",
-        value="We typically respond within 1-24 hours",
-        inline=True
-    )
-    
-    embed.add_field(
-        name="🏪 Store Support:",
-        value="For purchase issues, include your transaction ID",
-        inline=True
-    )
-    
-    embed.set_footer(text="DonutMarket Support System", icon_url="https://donutmarket.store/static/logo1.png")
+    embed = build_tickets_panel_embed()
     
     # Create the view with claim rewards button
     view = TicketsPanelView()
@@ -713,6 +1550,10 @@ async def tickets_panel(interaction: discord.Interaction, channel: discord.TextC
             # Send new message
             message = await channel.send(embed=embed, view=view)
             await interaction.response.send_message(f"✅ Tickets panel sent to {channel.mention}\n**Message ID:** `{message.id}`", ephemeral=True)
+        
+        # Startup edits this message instead of posting another panel
+        if channel.id == PANEL_CHANNEL_ID:
+            remember_tickets_panel(message, embed_hash(embed.to_dict()))
             
     except discord.Forbidden:
         await interaction.response.send_message("❌ I don't have permission to send messages in that channel.", ephemeral=True)
@@ -722,260 +1563,555 @@ async def tickets_panel(interaction: discord.Interaction, channel: discord.TextC
 # Web server integration (for receiving purchase webhooks)
 try:
     from aiohttp import web
-    import aiohttp_cors
+    from webhook_app import build_app, stream_purchase_batch, wants_async
     AIOHTTP_AVAILABLE = True
 except ImportError:
-    print("⚠️  aiohttp/aiohttp-cors not available - webhook server will be disabled")
+    log.warning("⚠️  aiohttp not available - webhook server will be disabled")
     AIOHTTP_AVAILABLE = False
 
+async def accept_purchase(purchase, wait):
+    """Store a validated purchase and create its ticket now (wait) or in the background
+
+    Returns (HTTP status, response body). Shared by the in-process webhook
+    server and the ingest socket used when ingestion runs in its own process.
+    """
+    buyer_name = purchase['buyer']
+    transaction_id = purchase['transactionId']
+    total_amount = purchase['totalAmount']
+    
+    await order_store.call(order_store.add_orders, [purchase], source='webhook', lease_owner=REPLICA_ID, lease_seconds=ORDER_LEASE_SECONDS)
+    
+    if not await order_store.call(order_store.acquire_lease, transaction_id, REPLICA_ID, ORDER_LEASE_SECONDS):
+        # A retried webhook for an order another replica is already working on
+        webhook_log.info("📥 Ticket queued on another replica", extra={'buyer': buyer_name, 'amount': total_amount})
+        return 202, {
+            'success': True,
+            'job_id': transaction_id,
+            'status': QUEUED,
+            'status_url': f"/webhook/purchase/{transaction_id}"
+        }
+    
+    if not wait:
+        accepted = enqueue_purchase(purchase)
+        job = purchase_jobs.get(transaction_id)
+        webhook_log.info("📥 Queued ticket" if accepted else "📥 Ticket already queued", extra={'buyer': buyer_name, 'amount': total_amount})
+        return 202, {
+            'success': True,
+            'job_id': transaction_id,
+            'status': job['status'],
+            'status_url': f"/webhook/purchase/{transaction_id}"
+        }
+    
+    webhook_log.info("🎫 Creating ticket", extra={'buyer': buyer_name, 'amount': total_amount})
+    
+    # Create the ticket
+    ticket_channel = await create_purchase_ticket(
+        buyer_name=buyer_name,
+        discord_user=purchase['discord'],
+        transaction_id=transaction_id,
+        total_amount=total_amount,
+        items=purchase['items'],
+        store=purchase.get('store')
+    )
+    
+    if ticket_channel:
+        await order_store.call(order_store.mark_ticketed, transaction_id, ticket_channel.id)
+        ticket_name = getattr(ticket_channel, 'name', None)
+        webhook_log.info("✅ Ticket created successfully", extra={'channel': ticket_name, 'channel_id': ticket_channel.id})
+        return 200, {
+            'success': True,
+            'ticket_id': ticket_channel.id,
+            'ticket_name': ticket_name
+        }
+    
+    await order_store.call(order_store.record_attempt, transaction_id, 'Failed to create ticket')
+    webhook_log.error("❌ Failed to create ticket")
+    return 500, {
+        'success': False,
+        'error': 'Failed to create ticket'
+    }
+
+async def accept_purchase_batch(purchases):
+    """Store a batch of validated purchases in one transaction and queue the new ones
+
+    Returns 'queued' or 'duplicate' for each purchase, in order.
+    """
+    inserted = set(await order_store.call(
+        order_store.add_orders, purchases, source='webhook', lease_owner=REPLICA_ID, lease_seconds=ORDER_LEASE_SECONDS
+    )) if purchases else set()
+    statuses = []
+    for purchase in purchases:
+        if purchase['transactionId'] in inserted:
+            inserted.discard(purchase['transactionId'])
+            enqueue_purchase(purchase)
+            statuses.append('queued')
+        else:
+            statuses.append('duplicate')
+    return statuses
+
+def purchase_status(transaction_id):
+    """Status of a purchase's ticket job, or None if the transaction is unknown"""
+    job = purchase_jobs.get(transaction_id)
+    if job is not None:
+        return job
+    # Orders from before a restart (or created synchronously) are in the store
+    order = order_store.get_order(transaction_id)
+    if order is None:
+        return None
+    status = {ORDER_PENDING: QUEUED, ORDER_TICKETED: CREATED, ORDER_FAILED: FAILED}[order['status']]
+    return {'transactionId': transaction_id, 'status': status, 'channel_id': order['channel_id'], 'attempts': order['attempts']}
+
+def process_memory():
+    """Resident and peak memory of this process in MB (Linux reads /proc, elsewhere peak only)"""
+    memory = {'max_rss_mb': round(resource.getrusage(resource.RUSAGE_SELF).ru_maxrss / 1024, 1)}
+    try:
+        with open('/proc/self/statm') as f:
+            memory['rss_mb'] = round(int(f.read().split()[1]) * os.sysconf('SC_PAGE_SIZE') / 1024 / 1024, 1)
+    except (OSError, ValueError):
+        pass
+    return memory
+
+def health_snapshot():
+    guild = bot.get_guild(GUILD_ID)
+    category = discord.utils.get(guild.categories, id=TICKET_CATEGORY_ID) if guild else None
+    used_slots, total_slots = category_pool.capacity(guild)
+    
+    return {
+        'status': 'healthy',
+        'bot_connected': bot.is_ready(),
+        'guild_connected': guild is not None,
+        'category_found': category is not None,
+        'ticket_categories': len(category_pool.categories(guild)),
+        'ticket_slots_used': used_slots,
+        'ticket_slots_total': total_slots,
+        'shards': shard_status(),
+        'stores': route_status(),
+        'ticket_queue_latency': ticket_latency.snapshot(),
+        'ticket_workers': ticket_pool.stats(),
+        'purchase_workers': purchase_pool.stats(),
+        'purchase_jobs': purchase_jobs.counts(),
+        'members': dict(member_cache.stats(), mode=MEMBER_CACHE_MODE, indexed=len(member_index)),
+        'memory': process_memory(),
+        'startup': dict(startup_timer.snapshot(), results=startup_results),
+        'orders': order_store.counts(),
+        'leases': dict(order_store.lease_counts(REPLICA_ID), replica=REPLICA_ID),
+        'scheduled_actions': delayed_actions.counts(),
+        'rest': rest_scheduler.snapshot(),
+        'timestamp': datetime.now(timezone.utc).isoformat()
+    }
+
+async def ipc_purchase(message):
+    purchase = parse_purchase(message['purchase'])
+    with transaction_context(purchase['transactionId']):
+        status, body = await accept_purchase(purchase, wait=bool(message.get('wait')))
+    return {'status': status, 'body': body}
+
+async def ipc_purchases(message):
+    return {'statuses': await accept_purchase_batch([parse_purchase(purchase) for purchase in message['purchases']])}
+
+async def ipc_status(message):
+    return {'job': purchase_status(message['transactionId'])}
+
+async def ipc_health(message):
+    return {'health': health_snapshot()}
+
+async def ipc_metrics(message):
+    return {'text': metrics.render()}
+
+# Gateway end of the ingest socket (INGEST_MODE=socket)
+ingest_server = IngestIpcServer(INGEST_SOCKET, {
+    'purchase': ipc_purchase,
+    'purchases': ipc_purchases,
+    'status': ipc_status,
+    'health': ipc_health,
+    'metrics': ipc_metrics,
+})
+
 if AIOHTTP_AVAILABLE:
     async def handle_purchase_webhook(request):
         """Handle purchase webhook from the website"""
         try:
-            print("🔔 Received purchase webhook!")
-            data = await request.json()
-            print(f"📋 Webhook data: {data}")
-            
-            # Extract purchase data
-            buyer_name = data.get('buyer', 'Unknown')
-            discord_user = data.get('discord', 'Unknown')
-            transaction_id = data.get('transactionId', 'Unknown')
-            total_amount = data.get('totalAmount', '0.00')
-            items = data.get('items', [])
-            
-            print(f"🎫 Creating ticket for {buyer_name} (${total_amount})")
-            
-            # Create the ticket
-            ticket_channel = await create_purchase_ticket(
-                buyer_name=buyer_name,
-                discord_user=discord_user,
-                transaction_id=transaction_id,
-                total_amount=total_amount,
-                items=items
-            )
+            webhook_log.debug("🔔 Received purchase webhook")
+            try:
+                data = await request.json()
+                purchase = parse_purchase(data)
+            except (ValueError, InvalidPurchase) as e:
+                return web.json_response({'success': False, 'error': str(e)}, status=400)
+            transaction_id_var.set(purchase['transactionId'])
+            webhook_log.debug("📋 Webhook data: %s", data)
             
-            if ticket_channel:
-                print(f"✅ Ticket created successfully: {ticket_channel.name}")
-                return web.json_response({
-                    'success': True,
-                    'ticket_id': ticket_channel.id,
-                    'ticket_name': ticket_channel.name
-                })
-            else:
-                print("❌ Failed to create ticket")
-                return web.json_response({
-                    'success': False,
-                    'error': 'Failed to create ticket'
-                }, status=500)
+            status, body = await accept_purchase(purchase, wait=not wants_async(request, WEBHOOK_ASYNC_MODE))
+            return web.json_response(body, status=status)
                 
         except Exception as e:
-            print(f"❌ Error handling purchase webhook: {e}")
-            import traceback
-            traceback.print_exc()
+            webhook_log.exception(f"❌ Error handling purchase webhook: {e}")
             return web.json_response({
                 'success': False,
                 'error': str(e)
             }, status=500)
 
+    async def handle_purchase_batch(request):
+        """Ingest newline-delimited purchases, storing them BATCH_INGEST_SIZE at a time (one transaction each)"""
+        return await stream_purchase_batch(request, accept_purchase_batch, BATCH_INGEST_SIZE, webhook_log)
+    
+    async def handle_purchase_status(request):
+        """Report the status of a background purchase ticket job"""
+        job = purchase_status(request.match_info['transactionId'])
+        if job is None:
+            return web.json_response({'success': False, 'error': 'Unknown transaction'}, status=404)
+        return web.json_response({'success': True, **job})
+
 if AIOHTTP_AVAILABLE:
+    @web.middleware
+    async def transaction_middleware(request, handler):
+        # Keep-alive requests share a task, so never inherit the previous request's transaction id
+        with transaction_context(None):
+            return await handler(request)
+    
+    @web.middleware
+    async def metrics_middleware(request, handler):
+        started = time.perf_counter()
+        status = 500
+        try:
+            response = await handler(request)
+            status = response.status
+            return response
+        except web.HTTPException as e:
+            status = e.status
+            raise
+        finally:
+            resource = request.match_info.route.resource
+            route = resource.canonical if resource is not None else 'unmatched'
+            webhook_request_seconds.observe(time.perf_counter() - started, request.method, route, str(status))
+    
+    async def handle_metrics(request):
+        """Prometheus scrape endpoint"""
+        return web.Response(body=metrics.render().encode(), headers={'Content-Type': METRICS_CONTENT_TYPE})
+    
     async def handle_health_check(request):
         """Health check endpoint"""
-        guild = bot.get_guild(GUILD_ID)
-        category = discord.utils.get(guild.categories, id=TICKET_CATEGORY_ID) if guild else None
-        
-        return web.json_response({
-            'status': 'healthy',
-            'bot_connected': bot.is_ready(),
-            'guild_connected': guild is not None,
-            'category_found': category is not None,
-            'timestamp': datetime.now(timezone.utc).isoformat()
-        })
+        return web.json_response(health_snapshot())
+
+def build_web_app():
+    """aiohttp application with the webhook, status, health and metrics routes"""
+    return build_app(
+        handle_purchase_webhook, handle_purchase_batch, handle_purchase_status, handle_health_check, handle_metrics,
+        middlewares=[metrics_middleware, transaction_middleware]
+    )
 
 async def start_web_server():
     """Start the web server for webhooks"""
     # Skip webhook server in Railway production (Express server handles webhooks)
     if os.getenv('RAILWAY_ENVIRONMENT') == 'production':
-        print("🚀 Running in Railway production - webhook server handled by Express")
+        webhook_log.info("🚀 Running in Railway production - webhook server handled by Express")
         return
         
     if not AIOHTTP_AVAILABLE:
-        print("⚠️  Webhook server disabled - aiohttp not available")
+        webhook_log.warning("⚠️  Webhook server disabled - aiohttp not available")
         return
     
     try:
-        app = web.Application()
-        
-        # Setup CORS
-        cors = aiohttp_cors.setup(app, defaults={
-            "*": aiohttp_cors.ResourceOptions(
-                allow_credentials=True,
-                expose_headers="*",
-                allow_headers="*",
-                allow_methods="*"
-            )
-        })
-        
-        # Add routes
-        app.router.add_post('/webhook/purchase', handle_purchase_webhook)
-        app.router.add_get('/health', handle_health_check)
-        
-        # Add CORS to all routes
-        for route in list(app.router.routes()):
-            cors.add(route)
-        
-        runner = web.AppRunner(app)
+        runner = web.AppRunner(build_web_app())
         await runner.setup()
         site = web.TCPSite(runner, 'localhost', 8080)
         await site.start()
-        print("✅ Webhook server started on http://localhost:8080")
+        webhook_log.info("✅ Webhook server started on http://localhost:8080")
     except Exception as e:
-        print(f"❌ Failed to start webhook server: {e}")
-        print("🤖 Bot will continue without webhook functionality")
+        webhook_log.error(f"❌ Failed to start webhook server: {e}")
+        webhook_log.info("🤖 Bot will continue without webhook functionality")
+
+TICKETS_DIR = os.path.join(os.path.dirname(__file__), '..', 'tickets')
+FAILED_TICKETS_DIR = os.path.join(TICKETS_DIR, 'failed')
+
+# File-written -> channel-created latency for the Railway ticket queue
+ticket_latency = LatencyStats()
 
-async def process_ticket_files():
-    """Process ticket files created by Express server (Railway mode)"""
+# Ticket files that still don't parse after this many seconds are parked in tickets/failed/
+UNREADABLE_TICKET_GRACE = 60
+
+async def process_queued_order(order):
+    """Create the Discord ticket for a queued (file-sourced) order from the store
+
+    Raises on failure so the worker pool can retry the order with backoff.
+    """
+    transaction_id = order['transactionId']
+    with transaction_context(transaction_id):
+        if not await order_store.call(order_store.acquire_lease, transaction_id, REPLICA_ID, ORDER_LEASE_SECONDS):
+            ticket_log.warning("♻️ Order leased to another replica")
+            return
+        try:
+            async with ticket_index.guard(transaction_id):
+                channel = existing_purchase_ticket(transaction_id)
+                if channel is not None:
+                    ticket_log.info("♻️ Ticket already exists", extra={'channel_id': channel.id})
+                else:
+                    channel = await create_file_ticket(order, order['received_at'])
+        except Exception as e:
+            await order_store.call(order_store.record_attempt, transaction_id, str(e))
+            raise
+        await order_store.call(order_store.mark_ticketed, transaction_id, channel.id)
+
+async def create_file_ticket(ticket_data, written_at):
+    """Create the Discord channel and embed for a queued ticket file in its store's guild and category"""
+    route = store_router.route(purchase_store(ticket_data.get('store'), ticket_data.get('items')))
+    guild = bot.get_guild(route.guild_id)
+    if not guild:
+        raise RuntimeError(f"Guild {route.guild_id} not available")
+    if not route.pool.primary(guild):
+        raise RuntimeError(f"Ticket category {route.category_id} not found")
+    
+    started = time.perf_counter()
+    
+    # Create ticket channel
+    channel_name = f"purchase-{ticket_data['buyer'].replace('#', '').replace('.', '').lower()}-{datetime.now().strftime('%m%d%H%M')}"
+    
+    # Add user permissions if they're in the server
+    buyer_member = await find_buyer_member(guild, ticket_data['discord'])
+    overwrites = overwrite_templates.for_ticket(guild, buyer_member)
+    ticket_stage_seconds.observe(time.perf_counter() - started, 'file', 'lookup')
+    
+    owner_id = buyer_member.id if buyer_member else None
+    with ticket_stage_seconds.time('file', 'create_channel'):
+        async with route.pool.slot(guild) as category:
+            channel = await rest_scheduler.run(
+                'create_channel',
+                lambda: category.create_text_channel(
+                    name=channel_name,
+                    overwrites=overwrites,
+                    topic=format_topic('purchase', owner_id=owner_id, transaction_id=ticket_data['transactionId'])
+                ),
+                key=guild.id
+            )
+    await register_ticket_channel(channel, 'purchase', owner_id=owner_id, transaction_id=ticket_data['transactionId'])
+    latency = time.time() - written_at
+    ticket_latency.record(latency)
+    ticket_stage_seconds.observe(latency, 'file', 'queue')
+    
+    # Create embed
+    embed = discord.Embed(
+        title="🛒 New Purchase",
+        description=f"Purchase from {ticket_data.get('store') or 'DonutMarket'}",
+        color=0x036fff,
+        timestamp=datetime.now(timezone.utc)
+    )
+    
+    embed.add_field(name="👤 Buyer", value=ticket_data['buyer'], inline=True)
+    embed.add_field(name="💰 Total", value=f"${ticket_data['totalAmount']}", inline=True)
+    embed.add_field(name="🆔 Transaction", value=ticket_data['transactionId'], inline=True)
+    
+    items_text = ""
+    for item in ticket_data['items']:
+        items_text += f"• {item.get('name', 'Unknown Item')} - {item.get('amount', '1x')} (${item.get('price', '?')})\n"
+    
+    embed.add_field(name="📦 Items", value=items_text, inline=False)
+    embed.add_field(name="🏪 Store", value=ticket_data.get('store') or 'DonutMarket', inline=True)
+    add_catalog_check(embed, ticket_data['items'], ticket_data['totalAmount'], ticket_data.get('store'))
+    
+    with ticket_stage_seconds.time('file', 'send_message'):
+        await rest_scheduler.run('send_message', lambda: channel.send(embed=embed), key=channel.id)
+    
+    ticket_stage_seconds.observe(time.perf_counter() - started, 'file', 'total')
+    ticket_log.info("✅ Created Discord ticket", extra={'channel': channel.name, 'channel_id': channel.id, 'latency_seconds': round(latency, 3)})
+    return channel
+
+def move_failed_ticket_file(file_path):
+    """Park an unreadable (claimed) ticket file under its original name so it is not rescanned forever"""
+    filename = os.path.basename(file_path).rsplit(CLAIM_MARKER, 1)[0]
+    os.makedirs(FAILED_TICKETS_DIR, exist_ok=True)
+    os.replace(file_path, os.path.join(FAILED_TICKETS_DIR, filename))
+    ticket_log.info(f"📥 Moved {filename} to {FAILED_TICKETS_DIR} for manual review")
+
+async def fail_queued_order(order, error):
+    await order_store.call(order_store.mark_failed, order['transactionId'], error)
+
+ticket_pool = WorkerPool(
+    process_queued_order,
+    concurrency=TICKET_WORKER_CONCURRENCY,
+    max_attempts=TICKET_MAX_ATTEMPTS,
+    on_give_up=fail_queued_order,
+    name='tickets'
+)
+
+async def queue_pending_orders():
+    """Lease orders still waiting for a ticket (new, expired or already ours) and hand them to the worker pools"""
+    queued = 0
+    for order in await order_store.call(order_store.claim_orders, REPLICA_ID, ORDER_LEASE_SECONDS, limit=PENDING_ORDER_BATCH):
+        if order['source'] == 'file':
+            queued += ticket_pool.submit(order['transactionId'], order)
+        else:
+            queued += enqueue_purchase(order)
+    return queued
+
+def _queue_depths():
+    for name, pool in (('file', ticket_pool), ('async', purchase_pool)):
+        stats = pool.stats()
+        yield (name, 'queued'), stats['queued'] + stats['retry_pending']
+        yield (name, 'in_flight'), stats['in_flight']
+
+def _rest_routes(field):
+    return lambda: (((route,), stats[field]) for route, stats in rest_scheduler.snapshot()['routes'].items())
+
+def _gateway_latency():
+    # NaN/inf until the first heartbeat is acknowledged
+    latency = bot.latency
+    return [((), latency if math.isfinite(latency) else None)]
+
+metrics.gauge('donutmarket_ticket_queue_depth', 'Tickets waiting or being created', _queue_depths, labelnames=('queue', 'state'))
+metrics.collected_counter('donutmarket_rest_calls_total', 'Discord REST calls by route', _rest_routes('calls'), labelnames=('route',))
+metrics.collected_counter('donutmarket_rest_rate_limited_total', 'Discord 429 responses by route', _rest_routes('rate_limited'), labelnames=('route',))
+metrics.collected_counter('donutmarket_rest_wait_seconds_total', 'Time REST calls spent waiting on rate limits', _rest_routes('wait_seconds_total'), labelnames=('route',))
+metrics.gauge('donutmarket_rest_queue_depth', 'REST calls waiting for a rate-limit token', lambda: [((), rest_scheduler.queue_depth())])
+metrics.gauge('donutmarket_gateway_latency_seconds', 'Discord gateway heartbeat latency', _gateway_latency)
+metrics.gauge('donutmarket_open_tickets', 'Open ticket channels by type', lambda: (((ticket_type,), ticket_registry.count(ticket_type)) for ticket_type in ('purchase', 'support', 'rewards')), labelnames=('type',))
+metrics.gauge('donutmarket_scheduled_actions', 'Pending delayed actions by kind', lambda: (((kind,), count) for kind, count in delayed_actions.counts().items()), labelnames=('kind',))
+metrics.gauge('donutmarket_orders', 'Orders in the store by status', lambda: (((status,), count) for status, count in order_store.counts().items()), labelnames=('status',))
+
+async def process_ticket_files(file_paths=None):
+    """Ingest ticket files created by Express server (Railway mode) into the order store
+
+    Each file is claimed by renaming it, so replicas sharing tickets/ never
+    read the same file. The whole batch is written in one transaction, the
+    claimed files are removed, and the new orders are handed to the worker
+    pool. Claims left behind by a crash are released by order_lease_loop().
+    """
     if os.getenv('RAILWAY_ENVIRONMENT') != 'production':
         return
-        
-    tickets_dir = os.path.join(os.path.dirname(__file__), '..', 'tickets')
-    if not os.path.exists(tickets_dir):
-        return
-        
-    for filename in os.listdir(tickets_dir):
-        if filename.startswith('ticket_') and filename.endswith('.json'):
-            file_path = os.path.join(tickets_dir, filename)
-            try:
-                with open(file_path, 'r') as f:
-                    ticket_data = json.load(f)
-                
-                print(f"🎫 Processing ticket file: {filename}")
-                
-                # Create Discord ticket
-                guild = bot.get_guild(GUILD_ID)
-                if guild:
-                    category = guild.get_channel(TICKET_CATEGORY_ID)
-                    if category:
-                        # Create ticket channel
-                        channel_name = f"purchase-{ticket_data['buyer'].replace('#', '').replace('.', '').lower()}-{datetime.now().strftime('%m%d%H%M')}"
-                        
-                        overwrites = {
-                            guild.default_role: discord.PermissionOverwrite(read_messages=False),
-                            guild.me: discord.PermissionOverwrite(read_messages=True, send_messages=True)
-                        }
-                        
-                        # Add user permissions if they're in the server
-                        for member in guild.members:
-                            if str(member) == ticket_data['discord']:
-                                overwrites[member] = discord.PermissionOverwrite(read_messages=True, send_messages=True)
-                                break
-                        
-                        channel = await category.create_text_channel(
-                            name=channel_name,
-                            overwrites=overwrites
-                        )
-                        
-                        # Create embed
-                        embed = discord.Embed(
-                            title="🛒 New Purchase",
-                            description=f"Purchase from {ticket_data.get('store', 'DonutMarket')}",
-                            color=0x036fff,
-                            timestamp=datetime.now(timezone.utc)
-                        )
-                        
-                        embed.add_field(name="👤 Buyer", value=ticket_data['buyer'], inline=True)
-                        embed.add_field(name="💰 Total", value=f"${ticket_data['totalAmount']}", inline=True)
-                        embed.add_field(name="🆔 Transaction", value=ticket_data['transactionId'], inline=True)
-                        
-                        items_text = ""
-                        for item in ticket_data['items']:
-                            items_text += f"• {item['name']} - {item['amount']} (${item['price']})\n"
-                        
-                        embed.add_field(name="📦 Items", value=items_text, inline=False)
-                        embed.add_field(name="🏪 Store", value=ticket_data.get('store', 'DonutMarket'), inline=True)
-                        
-                        await channel.send(embed=embed)
-                        
-                        print(f"✅ Created Discord ticket: {channel.name}")
-                        
-                        # Delete processed file
-                        os.remove(file_path)
-                        print(f"🗑️ Removed processed ticket file: {filename}")
-                        
-            except Exception as e:
-                print(f"❌ Error processing ticket file {filename}: {e}")
+    
+    if file_paths is None:
+        if not os.path.exists(TICKETS_DIR):
+            return
+        file_paths = [
+            os.path.join(TICKETS_DIR, filename)
+            for filename in sorted(os.listdir(TICKETS_DIR))
+            if filename.startswith('ticket_') and filename.endswith('.json')
+        ]
+    
+    orders = []
+    consumed = []
+    for file_path in file_paths:
+        claimed = claim_file(file_path, REPLICA_ID)
+        if claimed is None:
+            # Taken by another replica or an earlier batch
+            continue
+        try:
+            written_at = os.stat(claimed).st_mtime
+            with open(claimed, 'r') as f:
+                order = parse_purchase(json.load(f))
+        except ValueError as e:
+            # A file caught mid-write stays claimed until its claim goes stale and it is
+            # retried; anything older than the grace period is broken
+            if time.time() - written_at > UNREADABLE_TICKET_GRACE:
+                ticket_log.error(f"❌ Unreadable ticket file {os.path.basename(file_path)}: {e}")
+                try:
+                    move_failed_ticket_file(claimed)
+                except OSError as e:
+                    ticket_log.error(f"❌ Could not move {os.path.basename(file_path)} aside: {e}")
+            continue
+        except OSError as e:
+            # Left claimed; order_lease_loop() releases the claim for a retry once it goes stale
+            ticket_log.error(f"❌ Could not read ticket file {os.path.basename(file_path)}: {e}")
+            continue
+        order['received_at'] = written_at
+        orders.append(order)
+        consumed.append(claimed)
+    
+    if orders:
+        inserted = await order_store.call(order_store.add_orders, orders, source='file', lease_owner=REPLICA_ID, lease_seconds=ORDER_LEASE_SECONDS)
+        ticket_log.info("🎫 Ingested ticket files", extra={'files': len(consumed), 'new_orders': len(inserted)})
+    for file_path in consumed:
+        try:
+            os.remove(file_path)
+        except OSError as e:
+            # Already stored; a copy picked up again later is a duplicate add_orders ignores
+            ticket_log.warning(f"⚠️ Could not remove ingested ticket file {os.path.basename(file_path)}: {e}")
+    
+    await queue_pending_orders()
+
+async def order_lease_loop():
+    """Renew this replica's order leases, take over work abandoned by other replicas and prune expired tickets"""
+    while True:
+        await asyncio.sleep(ORDER_LEASE_SECONDS / 3)
+        try:
+            await order_store.call(order_store.renew_leases, REPLICA_ID, ORDER_LEASE_SECONDS)
+            # Timers scheduled by other replicas; each is leased before it fires, so only one runs it
+            delayed_actions.load()
+            for channel_id in await order_store.call(ticket_index.prune):
+                ticket_search.remove(channel_id)
+            if os.getenv('RAILWAY_ENVIRONMENT') == 'production':
+                release_stale_claims(TICKETS_DIR, ORDER_LEASE_SECONDS)
+            queued = await queue_pending_orders()
+            if queued:
+                ticket_log.info(f"📥 Claimed {queued} pending order(s)")
+        except Exception as e:
+            ticket_log.exception(f"❌ Error renewing order leases: {e}")
 
 async def ticket_file_watcher():
-    """Watch for new ticket files every 5 seconds"""
+    """Create tickets as soon as Express finishes writing them (inotify, polling fallback)"""
+    watcher = TicketWatcher(
+        TICKETS_DIR,
+        process_ticket_files,
+        poll_interval=TICKET_POLL_INTERVAL
+    )
     while True:
         try:
-            await process_ticket_files()
+            await watcher.run()
         except Exception as e:
-            print(f"❌ Error in ticket file watcher: {e}")
-        await asyncio.sleep(5)
+            ticket_log.exception(f"❌ Error in ticket file watcher: {e}")
+            await asyncio.sleep(TICKET_POLL_INTERVAL)
 
 async def main():
     """Main function to start both bot and web server"""
-    # Start web server (only in local mode)
-    await start_web_server()
+    # Before any webhook can store (and count) a new order
+    catch_up_sales_stats()
+    asyncio.create_task(sales_checkpoint_loop())
+    
+    if INGEST_MODE == 'socket':
+        # Webhooks arrive from the ingest_server.py workers instead
+        await ingest_server.start()
+    else:
+        # Start web server (only in local mode)
+        await start_web_server()
     
     # Start ticket file watcher (only in Railway mode)
     if os.getenv('RAILWAY_ENVIRONMENT') == 'production':
-        print("🎫 Starting ticket file watcher for Railway mode...")
+        log.info("🎫 Starting ticket file watcher for Railway mode...")
         asyncio.create_task(ticket_file_watcher())
     
     # Start bot
     await bot.start(BOT_TOKEN)
 
-print("🔍 Discord bot script loaded successfully!")
-
 if __name__ == "__main__":
-    print("🤖 DonutMarket Discord Bot Starting...")
-    print(f"🐍 Python version: {sys.version}")
-    print(f"📁 Current working directory: {os.getcwd()}")
-    print(f"📄 Script path: {__file__}")
-    print(f"📋 Configuration:")
-    print(f"   Guild ID: {GUILD_ID}")
-    print(f"   Category ID: {TICKET_CATEGORY_ID}")
-    print(f"   Server Owner ID: {SERVER_OWNER_ID}")
-    print(f"   Allowed Users: {len(ALLOWED_USER_IDS)} configured")
-    print(f"   Railway Environment: {os.getenv('RAILWAY_ENVIRONMENT', 'local')}")
-    print(f"   Bot Token: {'SET (' + BOT_TOKEN[:10] + '...)' if BOT_TOKEN and BOT_TOKEN != 'YOUR_BOT_TOKEN_HERE' else 'NOT SET'}")
-    
-    # Debug all environment variables
-    print(f"🔍 Environment Variables:")
-    print(f"   BOT_TOKEN: {os.getenv('BOT_TOKEN', 'NOT SET')[:10] if os.getenv('BOT_TOKEN') else 'NOT SET'}...")
-    print(f"   DISCORD_BOT_TOKEN: {os.getenv('DISCORD_BOT_TOKEN', 'NOT SET')[:10] if os.getenv('DISCORD_BOT_TOKEN') else 'NOT SET'}...")
-    print(f"   GUILD_ID: {os.getenv('GUILD_ID', 'NOT SET')}")
-    print(f"   TICKET_CATEGORY_ID: {os.getenv('TICKET_CATEGORY_ID', 'NOT SET')}")
+    log.info("🤖 DonutMarket Discord Bot Starting...", extra={
+        'python': sys.version.split()[0],
+        'executable': sys.executable,
+        'cwd': os.getcwd(),
+        'script': __file__,
+        'guild_id': GUILD_ID,
+        'category_id': TICKET_CATEGORY_ID,
+        'server_owner_id': SERVER_OWNER_ID,
+        'allowed_users': len(ALLOWED_USER_IDS),
+        'allowed_roles': len(ALLOWED_ROLE_IDS),
+        'railway_environment': os.getenv('RAILWAY_ENVIRONMENT', 'local'),
+        'token_set': bool(BOT_TOKEN) and BOT_TOKEN != 'YOUR_BOT_TOKEN_HERE',
+    })
     
     # Check if required environment variables are set
     if BOT_TOKEN == 'YOUR_BOT_TOKEN_HERE' or not BOT_TOKEN:
-        print("❌ BOT_TOKEN not configured!")
-        print("   Please set the BOT_TOKEN environment variable")
-        print("   In Railway: Add BOT_TOKEN to environment variables")
-        print("   Locally: Add BOT_TOKEN=your_token to .env file")
-        print("   Current BOT_TOKEN value:", repr(BOT_TOKEN))
-        print("⚠️  Bot will exit - cannot start without token")
-        exit(1)
+        log.error("❌ BOT_TOKEN not configured - set it in Railway's environment variables or BOT_TOKEN=your_token in .env; cannot start without it")
+        sys.exit(1)
     
     if GUILD_ID == 123456789012345678:
-        print("⚠️  GUILD_ID not configured - using default")
-        print("   Please set the GUILD_ID environment variable")
+        log.warning("⚠️  GUILD_ID not configured - using default; please set the GUILD_ID environment variable")
     
     if TICKET_CATEGORY_ID == 123456789012345678:
-        print("⚠️  TICKET_CATEGORY_ID not configured - using default")
-        print("   Please set the TICKET_CATEGORY_ID environment variable")
-    
-    print(f"   Allowed Roles: {len(ALLOWED_ROLE_IDS)} configured")
+        log.warning("⚠️  TICKET_CATEGORY_ID not configured - using default; please set the TICKET_CATEGORY_ID environment variable")
     
-    print("\n🚀 Starting bot and webhook server...")
+    log.info("🚀 Starting bot and webhook server...")
     
     # Run the bot
     try:
         asyncio.run(main())
     except KeyboardInterrupt:
-        print("\n👋 Bot stopped by user")
+        log.info("👋 Bot stopped by user")
     except Exception as e:
-        print(f"\n❌ Bot crashed: {e}")
-        import traceback
-        traceback.print_exc()
+        log.exception(f"❌ Bot crashed: {e}")
@@ -0,0 +1,101 @@
+#!/usr/bin/env python3
+# -*- coding: utf-8 -*-
+"""Transaction id -> ticket channel lookups so a purchase only ever gets one ticket"""
+
+import asyncio
+import json
+import logging
+import os
+import time
+from contextlib import asynccontextmanager
+
+DEFAULT_TTL = 30 * 24 * 3600
+
+log = logging.getLogger('donutmarket.idempotency')
+
+
+class IdempotencyIndex:
+    """Transaction id -> channel id, answered from the order store's tickets table
+
+    The tickets table is the one record of which channel belongs to which
+    transaction. It is written transactionally and shared by every replica
+    using the same data directory. Tickets older than ttl no longer block a
+    new one, and prune() deletes the closed ones so the table stays bounded.
+    guard() serializes ticket creation for a transaction within this
+    process; across replicas the order leases do that.
+    """
+
+    def __init__(self, store, ttl=DEFAULT_TTL, clock=time.time):
+        self.store = store
+        self.ttl = ttl
+        self.clock = clock
+        self._locks = {}
+
+    def __contains__(self, transaction_id):
+        return self.get(transaction_id) is not None
+
+    def get(self, transaction_id):
+        """Channel id already created for this transaction, or None"""
+        ticket = self.store.ticket_for_transaction(transaction_id, since=self.clock() - self.ttl)
+        return ticket['channel_id'] if ticket else None
+
+    def record(self, transaction_id, channel_id, ticket_type='purchase', created_at=None):
+        """Remember a channel found for a transaction (e.g. one created just before a crash)"""
+        self.store.record_tickets([(channel_id, transaction_id, ticket_type, created_at or self.clock())])
+
+    def prune(self):
+        """Delete closed tickets past the TTL; returns their channel ids
+
+        Open tickets are kept whatever their age: their channels still exist.
+        """
+        return self.store.prune_tickets(self.clock() - self.ttl)
+
+    def import_log(self, path):
+        """Move entries from the JSONL log older releases kept into the tickets table (once)
+
+        Returns the number of live entries imported; the log is renamed to
+        <path>.imported so it is not read again.
+        """
+        try:
+            with open(path, 'r') as f:
+                lines = f.readlines()
+        except FileNotFoundError:
+            return 0
+        entries = {}
+        for line in lines:
+            try:
+                entry = json.loads(line)
+            except ValueError:
+                # A torn final line from a crash mid-write
+                continue
+            transaction_id = entry.get('txn')
+            if not transaction_id:
+                continue
+            entries.pop(transaction_id, None)
+            if entry.get('channel') is not None:
+                entries[transaction_id] = (entry['channel'], entry.get('ts') or self.clock())
+        cutoff = self.clock() - self.ttl
+        live = [(channel_id, transaction_id, 'purchase', ts) for transaction_id, (channel_id, ts) in entries.items() if ts >= cutoff]
+        self.store.record_tickets(live)
+        try:
+            os.replace(path, path + '.imported')
+        except FileNotFoundError:
+            # Another replica imported it at the same time
+            pass
+        log.info(f"📥 Imported {len(live)} ticket index entries from {os.path.basename(path)}")
+        return len(live)
+
+    @asynccontextmanager
+    async def guard(self, transaction_id):
+        """Serialize ticket creation for one transaction id"""
+        entry = self._locks.get(transaction_id)
+        if entry is None:
+            entry = self._locks[transaction_id] = [asyncio.Lock(), 0]
+        entry[1] += 1
+        try:
+            async with entry[0]:
+                yield
+        finally:
+            entry[1] -= 1
+            if not entry[1]:
+                del self._locks[transaction_id]
@@ -0,0 +1,170 @@
+#!/usr/bin/env python3
+# -*- coding: utf-8 -*-
+"""Newline-delimited JSON request/response channel between ingest workers and the gateway over a Unix socket
+
+Each request is {"id": n, "op": "...", ...} and each response
+{"id": n, ...}. One connection carries many concurrent requests; the
+gateway answers them in whatever order they finish.
+"""
+
+import asyncio
+import itertools
+import json
+import logging
+import os
+
+# Big enough for a full batch of orders in one frame
+MAX_FRAME_BYTES = 16 * 1024 * 1024
+
+log = logging.getLogger('donutmarket.ingest_ipc')
+
+
+class IngestUnavailable(ConnectionError):
+    """The gateway process is not listening on the socket (or went away mid-request)"""
+
+
+def _encode(message):
+    return json.dumps(message, separators=(',', ':'), default=str).encode() + b'\n'
+
+
+class IngestIpcServer:
+    """Gateway side: dispatches each request to handlers[op](message) and writes back its result dict"""
+
+    def __init__(self, path, handlers):
+        self.path = path
+        self.handlers = dict(handlers)
+        self._server = None
+        self._writers = set()
+        self.requests = 0
+        self.errors = 0
+
+    async def start(self):
+        os.makedirs(os.path.dirname(os.path.abspath(self.path)), exist_ok=True)
+        if os.path.exists(self.path):
+            # Left behind by a previous gateway that didn't shut down cleanly
+            os.unlink(self.path)
+        self._server = await asyncio.start_unix_server(self._client, path=self.path, limit=MAX_FRAME_BYTES)
+        os.chmod(self.path, 0o660)
+        log.info(f"🔌 Listening for ingest workers on {self.path}")
+
+    async def stop(self):
+        if self._server is not None:
+            self._server.close()
+            # Closing the server only stops accepting; hang up on connected workers too
+            for writer in list(self._writers):
+                writer.close()
+            await self._server.wait_closed()
+            self._server = None
+        if os.path.exists(self.path):
+            os.unlink(self.path)
+
+    async def _client(self, reader, writer):
+        tasks = set()
+        self._writers.add(writer)
+        try:
+            while True:
+                line = await reader.readline()
+                if not line:
+                    break
+                try:
+                    message = json.loads(line)
+                except ValueError:
+                    self.errors += 1
+                    continue
+                # Requests run concurrently so a slow ticket doesn't hold up the rest of the connection
+                task = asyncio.create_task(self._dispatch(message, writer))
+                tasks.add(task)
+                task.add_done_callback(tasks.discard)
+        except (ConnectionError, asyncio.IncompleteReadError, ValueError) as e:
+            log.warning(f"⚠️ Ingest worker connection dropped: {e}")
+        finally:
+            self._writers.discard(writer)
+            for task in tasks:
+                task.cancel()
+            writer.close()
+
+    async def _dispatch(self, message, writer):
+        self.requests += 1
+        handler = self.handlers.get(message.get('op'))
+        try:
+            if handler is None:
+                result = {'error': f"Unknown op {message.get('op')!r}"}
+            else:
+                result = await handler(message)
+        except Exception as e:
+            self.errors += 1
+            log.exception(f"❌ Ingest request {message.get('op')} failed: {e}")
+            result = {'error': str(e)}
+        result['id'] = message.get('id')
+        try:
+            writer.write(_encode(result))
+            await writer.drain()
+        except ConnectionError:
+            pass
+
+
+class IngestIpcClient:
+    """Ingest worker side: one lazily (re)connected socket shared by all requests of the process"""
+
+    def __init__(self, path, timeout=30.0):
+        self.path = path
+        self.timeout = timeout
+        self._ids = itertools.count(1)
+        self._pending = {}
+        self._writer = None
+        self._reader_task = None
+        self._connect_lock = None
+
+    async def _connect(self):
+        if self._connect_lock is None:
+            self._connect_lock = asyncio.Lock()
+        async with self._connect_lock:
+            if self._writer is not None and not self._writer.is_closing():
+                return self._writer
+            try:
+                reader, writer = await asyncio.open_unix_connection(self.path, limit=MAX_FRAME_BYTES)
+            except (OSError, ConnectionError) as e:
+                raise IngestUnavailable(f"Gateway not reachable at {self.path}: {e}") from e
+            self._writer = writer
+            self._reader_task = asyncio.create_task(self._read_responses(reader))
+            return writer
+
+    async def _read_responses(self, reader):
+        try:
+            while True:
+                line = await reader.readline()
+                if not line:
+                    break
+                message = json.loads(line)
+                future = self._pending.pop(message.pop('id', None), None)
+                if future is not None and not future.done():
+                    future.set_result(message)
+        except (ConnectionError, ValueError) as e:
+            log.warning(f"⚠️ Gateway connection dropped: {e}")
+        finally:
+            self._writer = None
+            pending, self._pending = self._pending, {}
+            for future in pending.values():
+                if not future.done():
+                    future.set_exception(IngestUnavailable("Gateway closed the connection"))
+
+    async def request(self, op, timeout=None, **fields):
+        """Send one request and wait for the gateway's reply dict"""
+        writer = await self._connect()
+        request_id = next(self._ids)
+        future = asyncio.get_running_loop().create_future()
+        self._pending[request_id] = future
+        try:
+            writer.write(_encode({'id': request_id, 'op': op, **fields}))
+            await writer.drain()
+            return await asyncio.wait_for(future, timeout or self.timeout)
+        except ConnectionError as e:
+            raise IngestUnavailable(str(e)) from e
+        finally:
+            self._pending.pop(request_id, None)
+
+    async def close(self):
+        if self._writer is not None:
+            self._writer.close()
+        if self._reader_task is not None:
+            self._reader_task.cancel()
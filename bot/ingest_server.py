@@ -0,0 +1,193 @@
+#!/usr/bin/env python3
+# -*- coding: utf-8 -*-
+"""Webhook ingestion in its own process(es), for INGEST_MODE=socket
+
+HTTP parsing and validation run here, across INGEST_WORKERS processes
+sharing the port (SO_REUSEPORT). Validated purchases are handed to the
+gateway process (discord_bot.py) over the INGEST_SOCKET Unix socket, so
+the gateway's event loop only does Discord I/O.
+
+    INGEST_MODE=socket python3 discord_bot.py   # gateway
+    python3 ingest_server.py                    # HTTP ingestion
+"""
+
+import asyncio
+import multiprocessing
+import os
+import signal
+import sys
+import time
+
+from aiohttp import web
+
+from ingest_ipc import IngestIpcClient, IngestUnavailable
+from purchases import InvalidPurchase, parse_purchase
+from structured_logging import get_logger, parse_sample_rates, setup_logging, transaction_context
+from webhook_app import build_app as build_routes, stream_purchase_batch, wants_async
+
+try:
+    import dotenv
+    dotenv.load_dotenv(dotenv_path=os.path.join(os.path.dirname(__file__), '..', 'config', '.env'))
+except ImportError:
+    pass
+
+BOT_DATA_DIR = os.getenv('BOT_DATA_DIR') or os.path.join(os.path.dirname(__file__), '..', 'data')
+INGEST_SOCKET = os.getenv('INGEST_SOCKET') or os.path.join(BOT_DATA_DIR, 'ingest.sock')
+INGEST_HOST = os.getenv('INGEST_HOST', 'localhost')
+INGEST_PORT = int(os.getenv('INGEST_PORT', '8080'))
+INGEST_WORKERS = int(os.getenv('INGEST_WORKERS') or os.cpu_count() or 1)
+WEBHOOK_ASYNC_MODE = os.getenv('WEBHOOK_ASYNC_MODE', 'false').lower() in ('1', 'true', 'yes')
+BATCH_INGEST_SIZE = int(os.getenv('BATCH_INGEST_SIZE', '500'))
+
+# Synchronous webhooks wait for the gateway to create the channel
+SYNC_TICKET_TIMEOUT = 120
+
+log = get_logger('ingest')
+
+
+def gateway_unavailable(error):
+    log.error(f"❌ Gateway unavailable: {error}")
+    return web.json_response({'success': False, 'error': 'Ticket service unavailable'}, status=503)
+
+
+async def handle_purchase_webhook(request):
+    """Validate a purchase and pass it to the gateway"""
+    try:
+        data = await request.json()
+        purchase = parse_purchase(data)
+    except (ValueError, InvalidPurchase) as e:
+        return web.json_response({'success': False, 'error': str(e)}, status=400)
+    wait = not wants_async(request, WEBHOOK_ASYNC_MODE)
+    with transaction_context(purchase['transactionId']):
+        log.debug("📋 Webhook data: %s", data)
+        try:
+            reply = await request.app['gateway'].request(
+                'purchase', purchase=purchase, wait=wait, timeout=SYNC_TICKET_TIMEOUT if wait else None
+            )
+        except (IngestUnavailable, asyncio.TimeoutError) as e:
+            return gateway_unavailable(e)
+    if 'error' in reply:
+        return web.json_response({'success': False, 'error': reply['error']}, status=500)
+    return web.json_response(reply['body'], status=reply['status'])
+
+
+async def handle_purchase_batch(request):
+    """Stream newline-delimited purchases to the gateway in batches, streaming back one result per line"""
+    gateway = request.app['gateway']
+
+    async def accept_batch(purchases):
+        try:
+            reply = await gateway.request('purchases', purchases=purchases)
+        except (IngestUnavailable, asyncio.TimeoutError):
+            return ['failed'] * len(purchases)
+        return reply.get('statuses') or ['failed'] * len(purchases)
+
+    return await stream_purchase_batch(request, accept_batch, BATCH_INGEST_SIZE, log)
+
+
+async def handle_purchase_status(request):
+    try:
+        reply = await request.app['gateway'].request('status', transactionId=request.match_info['transactionId'])
+    except (IngestUnavailable, asyncio.TimeoutError) as e:
+        return gateway_unavailable(e)
+    if not reply.get('job'):
+        return web.json_response({'success': False, 'error': 'Unknown transaction'}, status=404)
+    return web.json_response({'success': True, **reply['job']})
+
+
+async def handle_health_check(request):
+    ingest = {'pid': os.getpid(), 'worker': request.app['worker'], 'workers': INGEST_WORKERS}
+    try:
+        reply = await request.app['gateway'].request('health', timeout=5)
+    except (IngestUnavailable, asyncio.TimeoutError) as e:
+        return web.json_response({'status': 'degraded', 'gateway_reachable': False, 'error': str(e), 'ingest': ingest}, status=503)
+    return web.json_response(dict(reply['health'], gateway_reachable=True, ingest=ingest))
+
+
+async def handle_metrics(request):
+    """The gateway's Prometheus metrics (queues, REST calls and ticket stages live there)"""
+    try:
+        reply = await request.app['gateway'].request('metrics', timeout=5)
+    except (IngestUnavailable, asyncio.TimeoutError) as e:
+        return gateway_unavailable(e)
+    return web.Response(body=reply['text'].encode(), headers={'Content-Type': 'text/plain; version=0.0.4; charset=utf-8'})
+
+
+def build_app(worker):
+    app = build_routes(handle_purchase_webhook, handle_purchase_batch, handle_purchase_status, handle_health_check, handle_metrics)
+    app['worker'] = worker
+    app['gateway'] = IngestIpcClient(INGEST_SOCKET)
+
+    async def close_gateway(app):
+        await app['gateway'].close()
+    app.on_cleanup.append(close_gateway)
+    return app
+
+
+async def serve(worker, reuse_port):
+    runner = web.AppRunner(build_app(worker))
+    await runner.setup()
+    site = web.TCPSite(runner, INGEST_HOST, INGEST_PORT, reuse_port=reuse_port)
+    await site.start()
+    log.info(f"✅ Ingest worker {worker} listening on http://{INGEST_HOST}:{INGEST_PORT}", extra={'pid': os.getpid()})
+    stop = asyncio.Event()
+    loop = asyncio.get_running_loop()
+    for sig in (signal.SIGTERM, signal.SIGINT):
+        loop.add_signal_handler(sig, stop.set)
+    try:
+        await stop.wait()
+    finally:
+        await runner.cleanup()
+
+
+def run_worker(worker, reuse_port):
+    setup_logging(os.getenv('LOG_LEVEL', 'INFO'), os.getenv('LOG_FORMAT', 'json'), parse_sample_rates(os.getenv('LOG_SAMPLE_RATES')))
+    asyncio.run(serve(worker, reuse_port))
+
+
+def main():
+    workers = max(1, INGEST_WORKERS)
+    # Sharing one port between processes needs SO_REUSEPORT
+    if workers > 1 and not sys.platform.startswith('linux'):
+        workers = 1
+    if workers == 1:
+        run_worker(0, reuse_port=False)
+        return
+
+    setup_logging(os.getenv('LOG_LEVEL', 'INFO'), os.getenv('LOG_FORMAT', 'json'))
+    # Not fork: this process already runs the logging queue thread, and forking while it may
+    # hold a lock can deadlock the child. Each spawned worker sets up its own logging
+    context = multiprocessing.get_context('spawn')
+    processes = {}
+    stopping = False
+
+    def start(worker):
+        process = context.Process(target=run_worker, args=(worker, True), name=f"ingest-{worker}", daemon=True)
+        process.start()
+        processes[worker] = process
+
+    def shutdown(signum, frame):
+        nonlocal stopping
+        stopping = True
+
+    signal.signal(signal.SIGTERM, shutdown)
+    signal.signal(signal.SIGINT, shutdown)
+    for worker in range(workers):
+        start(worker)
+    log.info(f"🚀 Started {workers} ingest workers", extra={'pids': [p.pid for p in processes.values()]})
+
+    while not stopping:
+        time.sleep(1)
+        for worker, process in list(processes.items()):
+            if not process.is_alive() and not stopping:
+                log.warning(f"⚠️ Ingest worker {worker} exited with {process.exitcode} - restarting")
+                start(worker)
+
+    for process in processes.values():
+        process.terminate()
+    for process in processes.values():
+        process.join(timeout=10)
+
+
+if __name__ == '__main__':
+    main()
@@ -0,0 +1,502 @@
+#!/usr/bin/env python3
+# -*- coding: utf-8 -*-
+"""Offline load test for the ticket paths against an in-process fake Discord
+
+Usage: python loadtest.py [scenario ...] [--count N] [--concurrency N] ...
+Scenarios: webhook, webhook-async, file, button (default: all). Runs the
+real discord_bot handlers with bot.get_guild()/get_channel() pointed at a
+fake guild whose REST calls sleep for a configurable latency and answer
+with 429s (retried the way discord.py does) once a per-route bucket is
+empty. Needs discord.py and aiohttp installed but no token or network.
+"""
+
+import argparse
+import asyncio
+import itertools
+import json
+import logging
+import os
+import random
+import resource
+import shutil
+import sys
+import tempfile
+import time
+import tracemalloc
+from collections import Counter
+from datetime import datetime, timezone
+
+
+class FakeDiscord:
+    """Stand-in for the Discord REST API: latency, per-route rate limits and call counts"""
+
+    def __init__(self, latency=0.05, jitter=0.02, route_limits=None, retry_after=1.0):
+        self.latency = latency
+        self.jitter = jitter
+        self.retry_after = retry_after
+        # route -> [capacity, period, tokens, updated]
+        self.buckets = {route: [capacity, period, float(capacity), time.monotonic()]
+                        for route, (capacity, period) in (route_limits or {}).items()}
+        self.calls = Counter()
+        self.rate_limited = Counter()
+        self.ids = itertools.count(1_000_000_000_000_000)
+        self.channel_created = {}
+
+    def _take(self, route):
+        bucket = self.buckets.get(route)
+        if bucket is None:
+            return True
+        capacity, period, tokens, updated = bucket
+        now = time.monotonic()
+        tokens = min(capacity, tokens + (now - updated) * capacity / period)
+        bucket[3] = now
+        if tokens < 1:
+            bucket[2] = tokens
+            return False
+        bucket[2] = tokens - 1
+        return True
+
+    async def call(self, route):
+        self.calls[route] += 1
+        # discord.py logs a 429, sleeps out its retry_after and retries internally
+        while not self._take(route):
+            self.rate_limited[route] += 1
+            logging.getLogger('discord.http').warning(
+                'We are being rate limited. %s %s responded with 429. Retrying in %.2f seconds.',
+                'POST', f'fake://{route}', self.retry_after
+            )
+            await asyncio.sleep(self.retry_after)
+        await asyncio.sleep(max(0.0, self.latency + random.uniform(-self.jitter, self.jitter)))
+
+
+class _Snowflake:
+    def __eq__(self, other):
+        return isinstance(other, _Snowflake) and other.id == self.id
+
+    def __hash__(self):
+        return hash(self.id)
+
+    @property
+    def mention(self):
+        return f"<#{self.id}>"
+
+
+class FakeRole(_Snowflake):
+    def __init__(self, role_id, name):
+        self.id = role_id
+        self.name = name
+
+
+class FakePermissions:
+    administrator = False
+
+
+class FakeMember(_Snowflake):
+    def __init__(self, member_id, name):
+        self.id = member_id
+        self.name = name
+        self.global_name = name.title()
+        self.display_name = name.title()
+        self.roles = []
+        self.guild_permissions = FakePermissions()
+        self.bot = False
+
+    @property
+    def mention(self):
+        return f"<@{self.id}>"
+
+    def __str__(self):
+        return self.name
+
+
+class FakeMessage(_Snowflake):
+    def __init__(self, api, channel, content=None, embed=None):
+        self.api = api
+        self.id = next(api.ids)
+        self.channel = channel
+        self.content = content
+        self.embeds = [embed] if embed is not None else []
+
+    async def pin(self, reason=None):
+        await self.api.call('pin_message')
+
+    async def edit(self, **fields):
+        await self.api.call('edit_message')
+
+
+class FakeTextChannel(_Snowflake):
+    def __init__(self, api, guild, category, name, overwrites=None, topic=None):
+        self.api = api
+        self.id = next(api.ids)
+        self.guild = guild
+        self.category = category
+        self.name = name
+        self.overwrites = dict(overwrites or {})
+        self.topic = topic
+        self.created_at = datetime.now(timezone.utc)
+        self.messages = 0
+
+    async def send(self, content=None, embed=None, view=None):
+        await self.api.call('send_message')
+        self.messages += 1
+        return FakeMessage(self.api, self, content, embed)
+
+    async def delete(self, reason=None):
+        await self.api.call('delete_channel')
+        if self in self.category.channels:
+            self.category.channels.remove(self)
+        self.guild.channels.pop(self.id, None)
+
+
+class FakeCategory(_Snowflake):
+    def __init__(self, api, guild, category_id, name, position=0):
+        self.api = api
+        self.id = category_id
+        self.guild = guild
+        self.name = name
+        self.position = position
+        self.overwrites = {}
+        self.channels = []
+
+    async def create_text_channel(self, name, overwrites=None, topic=None, reason=None):
+        return await self.guild.create_text_channel(name, category=self, overwrites=overwrites, topic=topic, reason=reason)
+
+
+class FakeGuild(_Snowflake):
+    """Gateway stand-in: the cached guild state discord.py would hold"""
+
+    def __init__(self, api, guild_id, category_id, members=1000, cache_members=True):
+        self.api = api
+        # False models MEMBER_CACHE_MODE=lean: members exist server-side but aren't in the client cache
+        self.cache_members = cache_members
+        self.id = guild_id
+        self.name = "Load Test Guild"
+        self.owner_id = 1
+        self.default_role = FakeRole(guild_id, "@everyone")
+        self.me = FakeMember(2, "donutmarket-bot")
+        self.all_members = [FakeMember(10_000 + index, f"buyer{index}") for index in range(members)]
+        self.members = self.all_members if cache_members else []
+        self._members = {member.id: member for member in self.all_members}
+        self._members[self.me.id] = self.me
+        self.roles = [self.default_role]
+        self.channels = {}
+        self.categories = []
+        self._add_category(FakeCategory(api, self, category_id, "Tickets"))
+
+    def _add_category(self, category):
+        self.categories.append(category)
+        self.channels[category.id] = category
+        return category
+
+    def get_channel(self, channel_id):
+        return self.channels.get(channel_id)
+
+    def get_member(self, member_id):
+        if not self.cache_members and member_id != self.me.id:
+            return None
+        return self._members.get(member_id)
+
+    async def query_members(self, query=None, limit=5, user_ids=None, cache=True):
+        # A gateway request rather than REST, but it costs a round trip all the same
+        await self.api.call('query_members')
+        if user_ids:
+            return [self._members[member_id] for member_id in user_ids if member_id in self._members]
+        query = query.lower()
+        return [member for member in self.all_members if member.name.startswith(query)][:limit]
+
+    def get_role(self, role_id):
+        return next((role for role in self.roles if role.id == role_id), None)
+
+    async def create_text_channel(self, name, category=None, overwrites=None, topic=None, reason=None):
+        await self.api.call('create_channel')
+        channel = FakeTextChannel(self.api, self, category, name, overwrites, topic)
+        category.channels.append(channel)
+        self.channels[channel.id] = channel
+        self.api.channel_created[channel.id] = time.time()
+        return channel
+
+    async def create_category(self, name, overwrites=None, position=0, reason=None):
+        await self.api.call('create_category')
+        return self._add_category(FakeCategory(self.api, self, next(self.api.ids), name, position))
+
+
+class FakeResponse:
+    def __init__(self):
+        self.sent = []
+        # perf_counter() of the first response (message or defer); Discord wants it within 3s
+        self.responded_at = None
+
+    async def send_message(self, content=None, embed=None, view=None, ephemeral=False):
+        self.responded_at = self.responded_at or time.perf_counter()
+        self.sent.append(content)
+
+    async def defer(self, ephemeral=False):
+        self.responded_at = self.responded_at or time.perf_counter()
+
+
+class FakeFollowup:
+    def __init__(self, response):
+        self.response = response
+
+    async def send(self, content=None, embed=None, view=None, ephemeral=False):
+        self.response.sent.append(content)
+
+
+class FakeInteraction:
+    def __init__(self, user, guild, channel=None):
+        self.user = user
+        self.guild = guild
+        self.channel = channel
+        self.response = FakeResponse()
+        self.followup = FakeFollowup(self.response)
+
+
+def percentiles(samples):
+    if not samples:
+        return {}
+    ordered = sorted(samples)
+
+    def pick(pct):
+        return ordered[min(len(ordered) - 1, int(round(pct / 100 * (len(ordered) - 1))))]
+    return {
+        'p50_ms': round(pick(50) * 1000, 1),
+        'p95_ms': round(pick(95) * 1000, 1),
+        'p99_ms': round(pick(99) * 1000, 1),
+        'max_ms': round(ordered[-1] * 1000, 1),
+    }
+
+
+def purchase(run, index, guild):
+    buyer = guild.all_members[index % len(guild.all_members)]
+    return {
+        'buyer': buyer.name,
+        'discord': buyer.name,
+        'transactionId': f"LOAD_{run}_{index}",
+        # Matches stores/pedrosmarket.json, so tickets don't carry a catalog warning
+        'totalAmount': '15.00',
+        'items': [{'name': 'DonutSMP Money', 'amount': '150M', 'price': '15.00'}],
+        'store': "Pedro's Market",
+    }
+
+
+async def bounded(concurrency, jobs):
+    """Run coroutine factories with at most `concurrency` in flight"""
+    semaphore = asyncio.Semaphore(concurrency)
+
+    async def run(job):
+        async with semaphore:
+            return await job()
+    return await asyncio.gather(*(run(job) for job in jobs))
+
+
+async def scenario_webhook(bot_module, guild, args, run, wait=True):
+    """POST /webhook/purchase over loopback HTTP, sync (ticket created before the reply) or 202-async"""
+    from aiohttp.test_utils import TestClient, TestServer
+
+    latencies = []
+    failures = 0
+    async with TestClient(TestServer(bot_module.build_web_app())) as client:
+        async def post(index):
+            nonlocal failures
+            started = time.perf_counter()
+            response = await client.post(
+                f"/webhook/purchase?mode={'sync' if wait else 'async'}", json=purchase(run, index, guild)
+            )
+            await response.read()
+            latencies.append(time.perf_counter() - started)
+            if response.status not in (200, 202):
+                failures += 1
+        await bounded(args.concurrency, [lambda i=i: post(i) for i in range(args.count)])
+        if not wait:
+            await bot_module.purchase_pool.join()
+    return {'request_latency': percentiles(latencies), 'failures': failures}
+
+
+async def scenario_file(bot_module, guild, args, run):
+    """Ticket files written to the queue directory, ingested and created by the worker pool"""
+    written = {}
+    for index in range(args.count):
+        order = purchase(run, index, guild)
+        path = os.path.join(bot_module.TICKETS_DIR, f"ticket_{order['transactionId']}.json")
+        with open(path, 'w') as f:
+            json.dump(order, f)
+        written[order['transactionId']] = time.time()
+    await bot_module.process_ticket_files()
+    await bot_module.ticket_pool.join()
+    latencies = []
+    for channel in guild.channels.values():
+        meta = bot_module.parse_topic(getattr(channel, 'topic', None))
+        if meta['transaction_id'] in written:
+            latencies.append(guild.api.channel_created[channel.id] - written[meta['transaction_id']])
+    return {'file_to_channel_latency': percentiles(latencies), 'failures': args.count - len(latencies)}
+
+
+async def scenario_button(bot_module, guild, args, run):
+    """Claim Rewards button clicks from distinct members"""
+    latencies = []
+    acks = []
+    failures = 0
+    members = guild.all_members[:args.count]
+
+    async def click(member):
+        nonlocal failures
+        view = bot_module.TicketsPanelView()
+        interaction = FakeInteraction(member, guild)
+        started = time.perf_counter()
+        await view.claim_rewards.callback(interaction)
+        latencies.append(time.perf_counter() - started)
+        if interaction.response.responded_at is not None:
+            acks.append(interaction.response.responded_at - started)
+        if not any(message and message.startswith('✅') for message in interaction.response.sent):
+            failures += 1
+    await bounded(args.concurrency, [lambda m=m: click(m) for m in members])
+    return {'interaction_latency': percentiles(latencies), 'interaction_ack_latency': percentiles(acks), 'failures': failures}
+
+
+SCENARIOS = {
+    'webhook': lambda *a: scenario_webhook(*a, wait=True),
+    'webhook-async': lambda *a: scenario_webhook(*a, wait=False),
+    'file': scenario_file,
+    'button': scenario_button,
+}
+
+
+def parse_args(argv):
+    parser = argparse.ArgumentParser(description=__doc__.split('\n')[0])
+    parser.add_argument('scenarios', nargs='*', default=list(SCENARIOS), help=f"any of: {', '.join(SCENARIOS)}")
+    parser.add_argument('--count', type=int, default=200, help="tickets per scenario")
+    parser.add_argument('--concurrency', type=int, default=20, help="concurrent clients / ticket workers")
+    parser.add_argument('--latency-ms', type=float, default=50.0, help="fake REST latency")
+    parser.add_argument('--jitter-ms', type=float, default=20.0)
+    parser.add_argument('--discord-limits', default='',
+                        help="fake API buckets that answer 429, e.g. 'create_channel=10/10' (default: none)")
+    parser.add_argument('--retry-after', type=float, default=1.0, help="seconds a fake 429 asks the client to wait")
+    parser.add_argument('--route-limits', default='none',
+                        help="bot-side REST scheduler buckets: 'default', 'none' or a REST_RATE_LIMITS spec")
+    parser.add_argument('--members', type=int, default=5000, help="members in the fake guild")
+    parser.add_argument('--member-cache', choices=('full', 'lean'), default='full',
+                        help="MEMBER_CACHE_MODE: cache every member, or query buyers on demand")
+    parser.add_argument('--json', action='store_true', help="print the report as JSON")
+    return parser.parse_args(argv)
+
+
+def load_bot(data_dir, member_cache='full'):
+    """Import discord_bot against throwaway state and a quiet log"""
+    os.environ['BOT_DATA_DIR'] = data_dir
+    os.environ['MEMBER_CACHE_MODE'] = member_cache
+    os.environ.setdefault('LOG_LEVEL', 'WARNING')
+    os.environ.setdefault('GUILD_ID', '900000000000000001')
+    os.environ.setdefault('TICKET_CATEGORY_ID', '900000000000000002')
+    import discord_bot
+    discord_bot.TICKETS_DIR = os.path.join(data_dir, 'tickets')
+    discord_bot.FAILED_TICKETS_DIR = os.path.join(discord_bot.TICKETS_DIR, 'failed')
+    os.makedirs(discord_bot.TICKETS_DIR, exist_ok=True)
+    return discord_bot
+
+
+async def run_scenarios(bot_module, args):
+    from rest_scheduler import DEFAULT_ROUTE_LIMITS, parse_route_limits
+
+    if args.route_limits == 'none':
+        bot_module.rest_scheduler.route_limits = {}
+    elif args.route_limits != 'default':
+        bot_module.rest_scheduler.route_limits = parse_route_limits(args.route_limits, DEFAULT_ROUTE_LIMITS)
+
+    results = {}
+    for run, name in enumerate(args.scenarios):
+        api = FakeDiscord(args.latency_ms / 1000, args.jitter_ms / 1000,
+                          parse_route_limits(args.discord_limits), args.retry_after)
+        guild = FakeGuild(api, bot_module.GUILD_ID, bot_module.TICKET_CATEGORY_ID, members=args.members,
+                          cache_members=args.member_cache == 'full')
+        bot_module.bot.get_guild = lambda guild_id, guild=guild: guild if guild_id == guild.id else None
+        bot_module.bot.get_channel = guild.get_channel
+        # What on_ready does with the guild (chunking itself can't be reproduced offline)
+        refresh_started = time.perf_counter()
+        bot_module.refresh_guild_caches([guild])
+        cache_refresh = time.perf_counter() - refresh_started
+        bot_module.category_pool.max_overflow = args.count // bot_module.category_pool.limit + 2
+        bot_module.ticket_registry.clear()
+        for pool in (bot_module.ticket_pool, bot_module.purchase_pool):
+            pool.concurrency = args.concurrency
+        bot_module.rest_scheduler._stats.clear()
+
+        tracemalloc.start()
+        started = time.perf_counter()
+        outcome = await SCENARIOS[name](bot_module, guild, args, run)
+        elapsed = time.perf_counter() - started
+        _, peak = tracemalloc.get_traced_memory()
+        tracemalloc.stop()
+
+        outcome.update({
+            'tickets': args.count,
+            'seconds': round(elapsed, 3),
+            'tickets_per_second': round(args.count / elapsed, 1) if elapsed else None,
+            'rest_calls': dict(api.calls),
+            'rest_429s': dict(api.rate_limited),
+            # What the bot's donutmarket_rest_rate_limited_total counter saw
+            'rest_429s_counted': {
+                route: stats['rate_limited']
+                for route, stats in bot_module.rest_scheduler.snapshot()['routes'].items() if stats['rate_limited']
+            },
+            'scheduler_wait_seconds': {
+                route: stats['wait_seconds_total']
+                for route, stats in bot_module.rest_scheduler.snapshot()['routes'].items()
+            },
+            'peak_traced_mb': round(peak / 1024 / 1024, 2),
+            'cache_refresh_ms': round(cache_refresh * 1000, 1),
+            'member_cache': bot_module.member_cache.stats(),
+        })
+        results[name] = outcome
+
+    for pool in (bot_module.ticket_pool, bot_module.purchase_pool):
+        await pool.stop()
+    return results
+
+
+def print_report(results):
+    for name, outcome in results.items():
+        print(f"🎫 {name}: {outcome['tickets']} tickets in {outcome['seconds']}s "
+              f"({outcome['tickets_per_second']}/s, {outcome['failures']} failed)")
+        for key in ('request_latency', 'file_to_channel_latency', 'interaction_latency', 'interaction_ack_latency'):
+            if key in outcome:
+                stats = outcome[key]
+                print(f"   {key.replace('_', ' ')}: p50 {stats.get('p50_ms')}ms  p95 {stats.get('p95_ms')}ms  "
+                      f"p99 {stats.get('p99_ms')}ms  max {stats.get('max_ms')}ms")
+        calls = ', '.join(f"{route}={count}" for route, count in sorted(outcome['rest_calls'].items()))
+        print(f"   REST calls: {calls or 'none'}")
+        if outcome['rest_429s']:
+            print(f"   429s: {', '.join(f'{route}={count}' for route, count in sorted(outcome['rest_429s'].items()))} "
+                  f"(counted by the bot: {', '.join(f'{route}={count}' for route, count in sorted(outcome['rest_429s_counted'].items())) or 'none'})")
+        print(f"   peak traced memory: {outcome['peak_traced_mb']} MB, guild cache refresh {outcome['cache_refresh_ms']}ms")
+        if outcome['member_cache']['queries']:
+            stats = outcome['member_cache']
+            print(f"   member queries: {stats['queries']} ({stats['hits']} cache hits)")
+    print(f"📈 Max RSS: {resource.getrusage(resource.RUSAGE_SELF).ru_maxrss / 1024:.1f} MB")
+
+
+def main(argv):
+    args = parse_args(argv)
+    unknown = [name for name in args.scenarios if name not in SCENARIOS]
+    if unknown:
+        print(f"❌ Unknown scenario: {', '.join(unknown)} (available: {', '.join(SCENARIOS)})")
+        return 1
+
+    data_dir = tempfile.mkdtemp(prefix='donutmarket-loadtest-')
+    try:
+        bot_module = load_bot(data_dir, args.member_cache)
+        # The file queue only runs in Railway mode
+        os.environ['RAILWAY_ENVIRONMENT'] = 'production'
+        results = asyncio.run(run_scenarios(bot_module, args))
+    finally:
+        shutil.rmtree(data_dir, ignore_errors=True)
+
+    if args.json:
+        print(json.dumps(results, indent=2))
+    else:
+        print_report(results)
+    failed = sum(outcome['failures'] for outcome in results.values())
+    return 1 if failed else 0
+
+
+if __name__ == "__main__":
+    sys.exit(main(sys.argv[1:]))
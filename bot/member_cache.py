@@ -0,0 +1,131 @@
+#!/usr/bin/env python3
+# -*- coding: utf-8 -*-
+"""Bounded LRU + TTL cache of guild members fetched on demand (MEMBER_CACHE_MODE=lean)"""
+
+import asyncio
+import logging
+import time
+from collections import OrderedDict
+
+from member_index import MemberIndex, normalize_name
+
+log = logging.getLogger('donutmarket.member_cache')
+
+# Members returned per name query; the exact match is picked from these
+QUERY_LIMIT = 10
+
+# Names that matched nobody are retried after this many seconds
+NEGATIVE_TTL = 60.0
+
+
+class MemberCache:
+    """Members and name -> member id lookups per guild, least recently used evicted first
+
+    Misses go to the gateway (guild.query_members) instead of the REST API,
+    so they don't compete with ticket creation for REST rate limits.
+    """
+
+    def __init__(self, max_size=1000, ttl=600.0, clock=time.monotonic):
+        self.max_size = max_size
+        self.ttl = ttl
+        self.clock = clock
+        self._members = OrderedDict()
+        self._names = OrderedDict()
+        self.hits = 0
+        self.misses = 0
+        self.queries = 0
+
+    def __len__(self):
+        return len(self._members)
+
+    def _lookup(self, table, key):
+        entry = table.get(key)
+        if entry is None:
+            return False, None
+        value, expires = entry
+        if expires < self.clock():
+            del table[key]
+            return False, None
+        table.move_to_end(key)
+        return True, value
+
+    def _store(self, table, key, value, ttl):
+        table[key] = (value, self.clock() + ttl)
+        table.move_to_end(key)
+        while len(table) > self.max_size:
+            table.popitem(last=False)
+
+    def get(self, guild_id, member_id):
+        """Cached member or None, without touching Discord"""
+        return self._lookup(self._members, (guild_id, member_id))[1]
+
+    def put(self, guild_id, member):
+        self._store(self._members, (guild_id, member.id), member, self.ttl)
+
+    def invalidate(self, member_id):
+        """Forget a member in every guild"""
+        for key in [key for key in self._members if key[1] == member_id]:
+            del self._members[key]
+        for key in [key for key, (value, _) in self._names.items() if value == member_id]:
+            del self._names[key]
+
+    def clear(self):
+        self._members.clear()
+        self._names.clear()
+
+    async def _query(self, guild, **kwargs):
+        self.queries += 1
+        try:
+            return await guild.query_members(cache=False, **kwargs)
+        except asyncio.TimeoutError:
+            log.warning(f"⚠️ Member query timed out: {kwargs}")
+            return None
+
+    async def fetch(self, guild, member_id):
+        """Member by id: guild cache, then this cache, then a gateway query"""
+        member = guild.get_member(member_id) or self.get(guild.id, member_id)
+        if member is not None:
+            self.hits += 1
+            return member
+        self.misses += 1
+        members = await self._query(guild, user_ids=[member_id])
+        if not members:
+            return None
+        self.put(guild.id, members[0])
+        return members[0]
+
+    async def resolve(self, guild, *names):
+        """Member best matching any of the names (same rules as MemberIndex), or None"""
+        keys = [key for key in dict.fromkeys(normalize_name(name) for name in names) if key]
+        for key in keys:
+            found, member_id = self._lookup(self._names, (guild.id, key))
+            if found:
+                self.hits += 1
+                if member_id is None:
+                    continue
+                member = await self.fetch(guild, member_id)
+                if member is not None:
+                    return member
+                continue
+            self.misses += 1
+            members = await self._query(guild, query=key, limit=QUERY_LIMIT)
+            if members is None:
+                continue
+            index = MemberIndex()
+            index.rebuild(members)
+            member_id = index.resolve(key)
+            self._store(self._names, (guild.id, key), member_id, self.ttl if member_id is not None else NEGATIVE_TTL)
+            if member_id is not None:
+                member = next(member for member in members if member.id == member_id)
+                self.put(guild.id, member)
+                return member
+        return None
+
+    def stats(self):
+        return {
+            'members': len(self._members),
+            'names': len(self._names),
+            'hits': self.hits,
+            'misses': self.misses,
+            'queries': self.queries,
+        }
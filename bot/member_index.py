@@ -0,0 +1,104 @@
+#!/usr/bin/env python3
+# -*- coding: utf-8 -*-
+"""Constant-time lookup of guild members by the names buyers type at checkout"""
+
+
+def normalize_name(name):
+    """Normalize a Discord name for lookup: case-insensitive, no '@' or '#0' suffix"""
+    if not name:
+        return ''
+    name = str(name).strip().lower()
+    if name.startswith('@'):
+        name = name[1:]
+    if name.endswith('#0'):
+        name = name[:-2]
+    return name
+
+
+class MemberIndex:
+    """Maps normalized usernames, global names and display names to member ids
+
+    Usernames are unique so they map to a single id; global and display
+    names can collide, so those map to a set and the lookup only succeeds
+    when the name is unambiguous.
+    """
+
+    def __init__(self):
+        self._usernames = {}
+        self._global_names = {}
+        self._display_names = {}
+        self._keys_by_member = {}
+
+    def __len__(self):
+        return len(self._keys_by_member)
+
+    @staticmethod
+    def _member_keys(member):
+        usernames = {normalize_name(member.name), normalize_name(str(member))}
+        global_name = normalize_name(getattr(member, 'global_name', None))
+        display_name = normalize_name(getattr(member, 'display_name', None))
+        return (
+            {key for key in usernames if key},
+            global_name,
+            display_name,
+        )
+
+    def add(self, member):
+        """Index (or re-index) a member"""
+        self.remove(member.id)
+        usernames, global_name, display_name = self._member_keys(member)
+        for key in usernames:
+            self._usernames[key] = member.id
+        if global_name:
+            self._global_names.setdefault(global_name, set()).add(member.id)
+        if display_name:
+            self._display_names.setdefault(display_name, set()).add(member.id)
+        self._keys_by_member[member.id] = (usernames, global_name, display_name)
+
+    def remove(self, member_id):
+        """Drop a member from every table"""
+        keys = self._keys_by_member.pop(member_id, None)
+        if keys is None:
+            return
+        usernames, global_name, display_name = keys
+        for key in usernames:
+            if self._usernames.get(key) == member_id:
+                del self._usernames[key]
+        for table, key in ((self._global_names, global_name), (self._display_names, display_name)):
+            ids = table.get(key)
+            if ids is not None:
+                ids.discard(member_id)
+                if not ids:
+                    del table[key]
+
+    def rebuild(self, members):
+        """Replace the index with the given members"""
+        self._usernames.clear()
+        self._global_names.clear()
+        self._display_names.clear()
+        self._keys_by_member.clear()
+        for member in members:
+            self.add(member)
+
+    def _unique(self, table, key):
+        ids = table.get(key)
+        if ids and len(ids) == 1:
+            return next(iter(ids))
+        return None
+
+    def resolve(self, *names):
+        """Return the member id best matching any of the names, or None
+
+        Exact usernames win over global names, which win over display names.
+        """
+        keys = [normalize_name(name) for name in names if name]
+        for key in keys:
+            member_id = self._usernames.get(key)
+            if member_id is not None:
+                return member_id
+        for table in (self._global_names, self._display_names):
+            for key in keys:
+                member_id = self._unique(table, key)
+                if member_id is not None:
+                    return member_id
+        return None
@@ -0,0 +1,160 @@
+#!/usr/bin/env python3
+# -*- coding: utf-8 -*-
+"""Minimal Prometheus text-format metrics (histograms, counters and scrape-time collectors)"""
+
+import time
+from bisect import bisect_left
+from contextlib import contextmanager
+
+CONTENT_TYPE = 'text/plain; version=0.0.4; charset=utf-8'
+
+# Seconds; spans a fast REST call up to a ticket stuck behind rate limits
+DEFAULT_BUCKETS = (0.005, 0.01, 0.025, 0.05, 0.1, 0.25, 0.5, 1.0, 2.5, 5.0, 10.0, 30.0, 60.0)
+
+
+def _escape(value):
+    return str(value).replace('\\', '\\\\').replace('\n', '\\n').replace('"', '\\"')
+
+
+def _labels(names, values, extra=None):
+    pairs = [f'{name}="{_escape(value)}"' for name, value in zip(names, values)]
+    if extra:
+        pairs.append(extra)
+    return '{' + ','.join(pairs) + '}' if pairs else ''
+
+
+def _number(value):
+    if value == float('inf'):
+        return '+Inf'
+    if isinstance(value, float) and value.is_integer():
+        return str(int(value))
+    return repr(value) if isinstance(value, float) else str(value)
+
+
+class Histogram:
+    """Fixed-bucket histogram; observe() is a bisect plus two additions
+
+    Bucket counts are stored per bucket and only made cumulative when
+    rendered.
+    """
+
+    kind = 'histogram'
+
+    def __init__(self, name, help, labelnames=(), buckets=DEFAULT_BUCKETS):
+        self.name = name
+        self.help = help
+        self.labelnames = tuple(labelnames)
+        self.buckets = tuple(sorted(buckets))
+        self._series = {}
+
+    def _entry(self, labelvalues):
+        entry = self._series.get(labelvalues)
+        if entry is None:
+            # [per-bucket counts (+Inf last), sum]
+            entry = self._series[labelvalues] = [[0] * (len(self.buckets) + 1), 0.0]
+        return entry
+
+    def observe(self, value, *labelvalues):
+        entry = self._entry(labelvalues)
+        entry[0][bisect_left(self.buckets, value)] += 1
+        entry[1] += value
+
+    @contextmanager
+    def time(self, *labelvalues):
+        started = time.perf_counter()
+        try:
+            yield
+        finally:
+            self.observe(time.perf_counter() - started, *labelvalues)
+
+    def render(self):
+        lines = [f'# HELP {self.name} {self.help}', f'# TYPE {self.name} histogram']
+        for labelvalues, (counts, total) in sorted(self._series.items()):
+            cumulative = 0
+            for bound, count in zip(self.buckets + (float('inf'),), counts):
+                cumulative += count
+                le = 'le="' + _number(float(bound)) + '"'
+                lines.append(f'{self.name}_bucket{_labels(self.labelnames, labelvalues, le)} {cumulative}')
+            labels = _labels(self.labelnames, labelvalues)
+            lines.append(f'{self.name}_sum{labels} {_number(total)}')
+            lines.append(f'{self.name}_count{labels} {cumulative}')
+        return lines
+
+
+class Counter:
+    """Monotonic counter, optionally split by labels"""
+
+    kind = 'counter'
+
+    def __init__(self, name, help, labelnames=()):
+        self.name = name
+        self.help = help
+        self.labelnames = tuple(labelnames)
+        self._series = {}
+
+    def inc(self, *labelvalues, amount=1):
+        self._series[labelvalues] = self._series.get(labelvalues, 0) + amount
+
+    def render(self):
+        lines = [f'# HELP {self.name} {self.help}', f'# TYPE {self.name} counter']
+        for labelvalues, value in sorted(self._series.items()):
+            lines.append(f'{self.name}{_labels(self.labelnames, labelvalues)} {_number(value)}')
+        return lines
+
+
+class Collected:
+    """Gauge or counter whose samples are read from live state at scrape time
+
+    `collect` returns an iterable of (label values tuple, value); nothing is
+    recorded on the hot path.
+    """
+
+    def __init__(self, name, help, collect, labelnames=(), kind='gauge'):
+        self.name = name
+        self.help = help
+        self.collect = collect
+        self.labelnames = tuple(labelnames)
+        self.kind = kind
+
+    def render(self):
+        lines = [f'# HELP {self.name} {self.help}', f'# TYPE {self.name} {self.kind}']
+        for labelvalues, value in self.collect():
+            if value is None:
+                continue
+            lines.append(f'{self.name}{_labels(self.labelnames, labelvalues)} {_number(value)}')
+        return lines
+
+
+class MetricsRegistry:
+    def __init__(self):
+        self._metrics = {}
+
+    def _add(self, metric):
+        if metric.name in self._metrics:
+            raise ValueError(f"Metric {metric.name} already registered")
+        self._metrics[metric.name] = metric
+        return metric
+
+    def histogram(self, name, help, labelnames=(), buckets=DEFAULT_BUCKETS):
+        return self._add(Histogram(name, help, labelnames, buckets))
+
+    def counter(self, name, help, labelnames=()):
+        return self._add(Counter(name, help, labelnames))
+
+    def gauge(self, name, help, collect, labelnames=()):
+        """Gauge read at scrape time; collect() returns (label values, value) pairs"""
+        return self._add(Collected(name, help, collect, labelnames))
+
+    def collected_counter(self, name, help, collect, labelnames=()):
+        """Counter kept elsewhere (e.g. scheduler stats) and read at scrape time"""
+        return self._add(Collected(name, help, collect, labelnames, kind='counter'))
+
+    def render(self):
+        lines = []
+        for metric in self._metrics.values():
+            try:
+                lines.extend(metric.render())
+            except Exception as e:
+                # One broken collector shouldn't take the whole scrape down
+                lines.append(f'# {metric.name} unavailable: {_escape(e)}')
+        return '\n'.join(lines) + '\n'
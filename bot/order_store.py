@@ -0,0 +1,404 @@
+#!/usr/bin/env python3
+# -*- coding: utf-8 -*-
+"""SQLite (WAL) store for orders, their items and the tickets created for them"""
+
+import asyncio
+import json
+import os
+import sqlite3
+import time
+
+# Order states
+PENDING = 'pending'
+TICKETED = 'ticketed'
+FAILED = 'failed'
+
+SCHEMA = """
+CREATE TABLE IF NOT EXISTS orders (
+    transaction_id TEXT PRIMARY KEY,
+    buyer TEXT NOT NULL,
+    discord_user TEXT,
+    store TEXT,
+    total_amount TEXT,
+    source TEXT,
+    status TEXT NOT NULL DEFAULT 'pending',
+    attempts INTEGER NOT NULL DEFAULT 0,
+    last_error TEXT,
+    channel_id INTEGER,
+    payload TEXT NOT NULL,
+    received_at REAL NOT NULL,
+    updated_at REAL NOT NULL
+);
+CREATE INDEX IF NOT EXISTS idx_orders_buyer ON orders (buyer);
+CREATE INDEX IF NOT EXISTS idx_orders_store ON orders (store);
+CREATE INDEX IF NOT EXISTS idx_orders_status ON orders (status, received_at);
+
+CREATE TABLE IF NOT EXISTS order_items (
+    id INTEGER PRIMARY KEY,
+    transaction_id TEXT NOT NULL REFERENCES orders (transaction_id) ON DELETE CASCADE,
+    name TEXT,
+    amount TEXT,
+    price TEXT
+);
+CREATE INDEX IF NOT EXISTS idx_order_items_transaction ON order_items (transaction_id);
+
+CREATE TABLE IF NOT EXISTS tickets (
+    channel_id INTEGER PRIMARY KEY,
+    transaction_id TEXT,
+    ticket_type TEXT NOT NULL,
+    owner_id INTEGER,
+    status TEXT NOT NULL DEFAULT 'open',
+    created_at REAL NOT NULL,
+    closed_at REAL,
+    transcript_path TEXT,
+    transcript_messages INTEGER,
+    name TEXT
+);
+CREATE INDEX IF NOT EXISTS idx_tickets_transaction ON tickets (transaction_id);
+CREATE INDEX IF NOT EXISTS idx_tickets_status ON tickets (status);
+
+CREATE TABLE IF NOT EXISTS scheduled_actions (
+    kind TEXT NOT NULL,
+    target INTEGER NOT NULL,
+    due_at REAL NOT NULL,
+    payload TEXT,
+    attempts INTEGER NOT NULL DEFAULT 0,
+    PRIMARY KEY (kind, target)
+);
+"""
+
+# Milliseconds a statement waits for another process's write lock before failing; kept short
+# because calls run on the event loop, and call() retries them with asyncio sleeps instead
+BUSY_TIMEOUT_MS = 100
+LOCK_RETRIES = 8
+LOCK_RETRY_DELAY = 0.05
+
+# Columns added after the first release: (table, column, type), applied with ALTER TABLE when missing
+MIGRATIONS = [
+    ('tickets', 'transcript_path', 'TEXT'),
+    ('tickets', 'transcript_messages', 'INTEGER'),
+    ('tickets', 'name', 'TEXT'),
+    ('orders', 'lease_owner', 'TEXT'),
+    ('orders', 'lease_expires', 'REAL'),
+    ('scheduled_actions', 'lease_owner', 'TEXT'),
+    ('scheduled_actions', 'lease_expires', 'REAL'),
+    ('orders', 'seq', 'INTEGER'),
+]
+
+
+class OrderStore:
+    """Embedded order/ticket database
+
+    All writes for a batch of orders happen in one transaction, so ingest
+    cost scales with batches rather than with per-file filesystem work.
+    Pending orders are leased to one replica at a time; a lease that isn't
+    renewed expires and the order can be claimed by another replica.
+    """
+
+    def __init__(self, path, busy_timeout=BUSY_TIMEOUT_MS):
+        self.path = path
+        if path != ':memory:':
+            os.makedirs(os.path.dirname(os.path.abspath(path)), exist_ok=True)
+        self.db = sqlite3.connect(path, isolation_level=None, check_same_thread=False)
+        self.db.row_factory = sqlite3.Row
+        self.db.execute("PRAGMA journal_mode=WAL")
+        self.db.execute("PRAGMA synchronous=NORMAL")
+        self.db.execute("PRAGMA foreign_keys=ON")
+        self.db.execute(f"PRAGMA busy_timeout={int(busy_timeout)}")
+        self.db.executescript(SCHEMA)
+        self._migrate()
+
+    def _migrate(self):
+        for table, column, column_type in MIGRATIONS:
+            existing = {row['name'] for row in self.db.execute(f"PRAGMA table_info({table})")}
+            if column not in existing:
+                self.db.execute(f"ALTER TABLE {table} ADD COLUMN {column} {column_type}")
+        # orders.seq numbers orders in insertion order for orders_after(); unlike the implicit rowid
+        # a VACUUM can't renumber it. Orders stored before it existed take their rowid, which is
+        # what sales checkpoints of that time were keyed on
+        self.db.execute("UPDATE orders SET seq = rowid WHERE seq IS NULL")
+        self.db.execute("CREATE UNIQUE INDEX IF NOT EXISTS idx_orders_seq ON orders (seq)")
+
+    def close(self):
+        self.db.close()
+
+    async def call(self, method, *args, **kwargs):
+        """Run a store method, backing off on the event loop while another replica holds the write lock"""
+        delay = LOCK_RETRY_DELAY
+        for attempt in range(LOCK_RETRIES):
+            try:
+                return method(*args, **kwargs)
+            except sqlite3.OperationalError as e:
+                if 'locked' not in str(e) or attempt == LOCK_RETRIES - 1:
+                    raise
+            await asyncio.sleep(delay)
+            delay = min(delay * 2, 1.0)
+
+    def _transaction(self):
+        return _Transaction(self.db)
+
+    def add_orders(self, orders, source, received_at=None, lease_owner=None, lease_seconds=0):
+        """Insert a batch of validated purchases; returns the transaction ids that were new
+
+        Each order may carry its own 'received_at' (e.g. the ticket file's mtime).
+        New orders are leased to lease_owner, if given, so no other replica
+        claims them while this one creates their tickets.
+        """
+        inserted = []
+        now = time.time()
+        lease_expires = now + lease_seconds if lease_owner else None
+        with self._transaction():
+            for order in orders:
+                transaction_id = order['transactionId']
+                order_received = order.get('received_at') or received_at or now
+                cursor = self.db.execute(
+                    "INSERT OR IGNORE INTO orders (transaction_id, buyer, discord_user, store, total_amount,"
+                    " source, payload, received_at, updated_at, lease_owner, lease_expires, seq)"
+                    " VALUES (?, ?, ?, ?, ?, ?, ?, ?, ?, ?, ?, (SELECT COALESCE(MAX(seq), 0) + 1 FROM orders))",
+                    (
+                        transaction_id, order['buyer'], order.get('discord'), order.get('store'),
+                        str(order.get('totalAmount')), source,
+                        json.dumps({key: value for key, value in order.items() if key != 'received_at'}),
+                        order_received, now, lease_owner, lease_expires,
+                    ),
+                )
+                if not cursor.rowcount:
+                    continue
+                self.db.executemany(
+                    "INSERT INTO order_items (transaction_id, name, amount, price) VALUES (?, ?, ?, ?)",
+                    [
+                        (transaction_id, item.get('name'), _text(item.get('amount')), _text(item.get('price')))
+                        for item in order.get('items') or []
+                    ],
+                )
+                inserted.append(transaction_id)
+        return inserted
+
+    @staticmethod
+    def _order_from_row(row):
+        order = json.loads(row['payload'])
+        order['source'] = row['source']
+        order['status'] = row['status']
+        order['attempts'] = row['attempts']
+        order['channel_id'] = row['channel_id']
+        order['received_at'] = row['received_at']
+        return order
+
+    def get_order(self, transaction_id):
+        row = self.db.execute("SELECT * FROM orders WHERE transaction_id = ?", (transaction_id,)).fetchone()
+        return self._order_from_row(row) if row else None
+
+    def pending_orders(self, limit=1000):
+        """Orders still waiting for a ticket, oldest first"""
+        rows = self.db.execute(
+            "SELECT * FROM orders WHERE status = ? ORDER BY received_at LIMIT ?", (PENDING, limit)
+        ).fetchall()
+        return [self._order_from_row(row) for row in rows]
+
+    def claim_orders(self, owner, lease_seconds, limit=1000):
+        """Lease pending orders that are unleased, expired or already owner's to owner; oldest first"""
+        now = time.time()
+        with self._transaction():
+            rows = self.db.execute(
+                "SELECT * FROM orders WHERE status = ? AND (lease_owner IS NULL OR lease_owner = ? OR lease_expires < ?)"
+                " ORDER BY received_at LIMIT ?",
+                (PENDING, owner, now, limit),
+            ).fetchall()
+            self.db.executemany(
+                "UPDATE orders SET lease_owner = ?, lease_expires = ? WHERE transaction_id = ?",
+                [(owner, now + lease_seconds, row['transaction_id']) for row in rows],
+            )
+        return [self._order_from_row(row) for row in rows]
+
+    def acquire_lease(self, transaction_id, owner, lease_seconds):
+        """Take or renew the lease on one order
+
+        Returns False only while another owner holds an unexpired lease on a
+        pending order; orders that are done (or unknown) need no lease.
+        """
+        now = time.time()
+        cursor = self.db.execute(
+            "UPDATE orders SET lease_owner = ?, lease_expires = ? WHERE transaction_id = ? AND status = ?"
+            " AND (lease_owner IS NULL OR lease_owner = ? OR lease_expires < ?)",
+            (owner, now + lease_seconds, transaction_id, PENDING, owner, now),
+        )
+        if cursor.rowcount:
+            return True
+        return self.db.execute(
+            "SELECT 1 FROM orders WHERE transaction_id = ? AND status = ?", (transaction_id, PENDING)
+        ).fetchone() is None
+
+    def renew_leases(self, owner, lease_seconds):
+        """Extend every lease owner holds on a pending order; returns how many"""
+        return self.db.execute(
+            "UPDATE orders SET lease_expires = ? WHERE lease_owner = ? AND status = ?",
+            (time.time() + lease_seconds, owner, PENDING),
+        ).rowcount
+
+    def lease_counts(self, owner):
+        """Pending orders leased to owner, to other replicas, and with expired leases"""
+        now = time.time()
+        row = self.db.execute(
+            "SELECT SUM(lease_owner = ? AND lease_expires >= ?) AS held,"
+            " SUM(lease_owner != ? AND lease_expires >= ?) AS elsewhere,"
+            " SUM(lease_expires < ?) AS expired FROM orders WHERE status = ?",
+            (owner, now, owner, now, now, PENDING),
+        ).fetchone()
+        return {key: row[key] or 0 for key in ('held', 'elsewhere', 'expired')}
+
+    def record_attempt(self, transaction_id, error=None):
+        self.db.execute(
+            "UPDATE orders SET attempts = attempts + 1, last_error = ?, updated_at = ? WHERE transaction_id = ?",
+            (error, time.time(), transaction_id),
+        )
+
+    def mark_ticketed(self, transaction_id, channel_id):
+        self.db.execute(
+            "UPDATE orders SET status = ?, channel_id = ?, last_error = NULL, updated_at = ?,"
+            " lease_owner = NULL, lease_expires = NULL WHERE transaction_id = ?",
+            (TICKETED, channel_id, time.time(), transaction_id),
+        )
+
+    def mark_failed(self, transaction_id, error):
+        self.db.execute(
+            "UPDATE orders SET status = ?, last_error = ?, updated_at = ?, lease_owner = NULL, lease_expires = NULL"
+            " WHERE transaction_id = ?",
+            (FAILED, str(error), time.time(), transaction_id),
+        )
+
+    def add_ticket(self, channel_id, ticket_type, owner_id=None, transaction_id=None, created_at=None, name=None):
+        self.db.execute(
+            "INSERT OR REPLACE INTO tickets (channel_id, transaction_id, ticket_type, owner_id, status, created_at, name)"
+            " VALUES (?, ?, ?, ?, 'open', ?, ?)",
+            (channel_id, transaction_id, ticket_type, owner_id, created_at or time.time(), name),
+        )
+
+    def record_tickets(self, tickets):
+        """Insert (channel_id, transaction_id, ticket_type, created_at) rows not already known"""
+        with self._transaction():
+            self.db.executemany(
+                "INSERT OR IGNORE INTO tickets (channel_id, transaction_id, ticket_type, status, created_at)"
+                " VALUES (?, ?, ?, 'open', ?)",
+                tickets,
+            )
+
+    def prune_tickets(self, before):
+        """Delete closed tickets created before a timestamp; returns their channel ids"""
+        rows = self.db.execute(
+            "DELETE FROM tickets WHERE status = 'closed' AND created_at < ? RETURNING channel_id", (before,)
+        ).fetchall()
+        return [row['channel_id'] for row in rows]
+
+    def close_ticket(self, channel_id):
+        self.db.execute(
+            "UPDATE tickets SET status = 'closed', closed_at = ? WHERE channel_id = ? AND status = 'open'",
+            (time.time(), channel_id),
+        )
+
+    def set_transcript(self, channel_id, path, messages):
+        self.db.execute(
+            "UPDATE tickets SET transcript_path = ?, transcript_messages = ? WHERE channel_id = ?",
+            (path, messages, channel_id),
+        )
+
+    def tickets_with_orders(self):
+        """Every ticket joined with its order's buyer, Discord tag and items (for the search index)"""
+        rows = self.db.execute(
+            "SELECT t.channel_id, t.name, t.status, t.created_at, t.transaction_id, t.transcript_path,"
+            " o.buyer, o.discord_user, o.payload FROM tickets t"
+            " LEFT JOIN orders o ON o.transaction_id = t.transaction_id"
+        ).fetchall()
+        tickets = []
+        for row in rows:
+            ticket = dict(row)
+            payload = json.loads(ticket.pop('payload')) if row['payload'] else {}
+            ticket['items'] = [item.get('name') for item in payload.get('items') or [] if item.get('name')]
+            tickets.append(ticket)
+        return tickets
+
+    def ticket_for_transaction(self, transaction_id, since=None):
+        """Newest ticket created for a transaction (optionally only since a timestamp), or None"""
+        row = self.db.execute(
+            "SELECT * FROM tickets WHERE transaction_id = ? AND created_at >= ? ORDER BY created_at DESC LIMIT 1",
+            (transaction_id, since or 0),
+        ).fetchone()
+        return dict(row) if row else None
+
+    def save_action(self, kind, target, due_at, payload=None, attempts=0):
+        """Insert or move the one pending action of this kind for a target"""
+        self.db.execute(
+            "INSERT OR REPLACE INTO scheduled_actions (kind, target, due_at, payload, attempts) VALUES (?, ?, ?, ?, ?)",
+            (kind, target, due_at, json.dumps(payload) if payload is not None else None, attempts),
+        )
+
+    def claim_action(self, kind, target, now, owner, lease_seconds):
+        """Lease a due action to owner before firing it
+
+        Returns False if the action is gone, was moved past now, or is leased
+        to another owner whose lease hasn't expired. Saving the action again
+        clears its lease.
+        """
+        wall = time.time()
+        return self.db.execute(
+            "UPDATE scheduled_actions SET lease_owner = ?, lease_expires = ? WHERE kind = ? AND target = ? AND due_at <= ?"
+            " AND (lease_owner IS NULL OR lease_owner = ? OR lease_expires < ?)",
+            (owner, wall + lease_seconds, kind, target, now, owner, wall),
+        ).rowcount > 0
+
+    def get_action(self, kind, target):
+        """(due_at, payload, attempts, lease_owner, lease_expires) for one pending action, or None"""
+        row = self.db.execute("SELECT * FROM scheduled_actions WHERE kind = ? AND target = ?", (kind, target)).fetchone()
+        if row is None:
+            return None
+        return (row['due_at'], json.loads(row['payload']) if row['payload'] else None, row['attempts'], row['lease_owner'], row['lease_expires'])
+
+    def delete_action(self, kind, target, owner=None):
+        """Delete an action; with owner, only while that owner still holds its lease"""
+        if owner is not None:
+            self.db.execute(
+                "DELETE FROM scheduled_actions WHERE kind = ? AND target = ? AND lease_owner = ?", (kind, target, owner)
+            )
+            return
+        self.db.execute("DELETE FROM scheduled_actions WHERE kind = ? AND target = ?", (kind, target))
+
+    def delete_actions_for(self, target):
+        self.db.execute("DELETE FROM scheduled_actions WHERE target = ?", (target,))
+
+    def scheduled_actions(self):
+        """Every pending action, soonest first"""
+        rows = self.db.execute("SELECT * FROM scheduled_actions ORDER BY due_at").fetchall()
+        return [
+            (row['kind'], row['target'], row['due_at'], json.loads(row['payload']) if row['payload'] else None, row['attempts'])
+            for row in rows
+        ]
+
+    def orders_after(self, seq, limit=1000):
+        """(seq, order) for orders inserted after seq, in insertion order"""
+        rows = self.db.execute(
+            "SELECT * FROM orders WHERE seq > ? ORDER BY seq LIMIT ?", (seq, limit)
+        ).fetchall()
+        return [(row['seq'], self._order_from_row(row)) for row in rows]
+
+    def counts(self):
+        """Order counts by status"""
+        rows = self.db.execute("SELECT status, COUNT(*) AS n FROM orders GROUP BY status").fetchall()
+        return {row['status']: row['n'] for row in rows}
+
+
+class _Transaction:
+    """BEGIN IMMEDIATE ... COMMIT/ROLLBACK for an autocommit connection"""
+
+    def __init__(self, db):
+        self.db = db
+
+    def __enter__(self):
+        self.db.execute("BEGIN IMMEDIATE")
+        return self.db
+
+    def __exit__(self, exc_type, exc, tb):
+        self.db.execute("COMMIT" if exc_type is None else "ROLLBACK")
+        return False
+
+
+def _text(value):
+    return None if value is None else str(value)
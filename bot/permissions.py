@@ -0,0 +1,99 @@
+#!/usr/bin/env python3
+# -*- coding: utf-8 -*-
+"""Precompiled, cached permission checks for ticket commands and buttons"""
+
+import time
+from collections import OrderedDict
+
+# Permission tiers, lowest to highest
+NONE = 0
+STAFF = 1
+ADMIN = 2
+
+TIER_NAMES = {'none': NONE, 'staff': STAFF, 'admin': ADMIN}
+
+
+def parse_command_tiers(spec, defaults=None):
+    """Parse 'command=tier,command=tier' into a {command: tier level} map"""
+    tiers = dict(defaults or {})
+    for entry in (spec or '').split(','):
+        if '=' not in entry:
+            continue
+        command, tier = (part.strip() for part in entry.split('=', 1))
+        if command and tier.lower() in TIER_NAMES:
+            tiers[command] = TIER_NAMES[tier.lower()]
+    return tiers
+
+
+class PermissionEngine:
+    """Resolves a member's permission tier once and caches the answer
+
+    The configured id lists are frozen into sets up front. Decisions are
+    cached per (guild, member) in an LRU of max_cache entries and must be
+    invalidated when a member's roles change; see invalidate() and clear().
+    With a ttl, entries also expire after that many seconds, for when role
+    changes aren't dispatched (the lean member cache mode doesn't get
+    member updates for uncached members).
+    """
+
+    def __init__(self, owner_id, allowed_user_ids=(), allowed_role_ids=(),
+                 admin_user_ids=(), admin_role_ids=(), command_tiers=None, max_cache=10_000,
+                 ttl=None, clock=time.monotonic):
+        self.owner_id = owner_id
+        self.allowed_user_ids = frozenset(allowed_user_ids)
+        self.allowed_role_ids = frozenset(allowed_role_ids)
+        self.admin_user_ids = frozenset(admin_user_ids)
+        self.admin_role_ids = frozenset(admin_role_ids)
+        self.command_tiers = dict(command_tiers or {})
+        self.max_cache = max_cache
+        self.ttl = ttl
+        self.clock = clock
+        # (guild id, member id) -> (tier, expires at or None)
+        self._cache = OrderedDict()
+
+    def _evaluate(self, member, guild):
+        if member.id == self.owner_id or (guild is not None and member.id == guild.owner_id):
+            return ADMIN
+        if member.id in self.admin_user_ids:
+            return ADMIN
+        role_ids = {role.id for role in getattr(member, 'roles', ())}
+        if not role_ids.isdisjoint(self.admin_role_ids):
+            return ADMIN
+        permissions = getattr(member, 'guild_permissions', None)
+        if permissions is not None and permissions.administrator:
+            return ADMIN
+        if member.id in self.allowed_user_ids or not role_ids.isdisjoint(self.allowed_role_ids):
+            return STAFF
+        return NONE
+
+    def tier(self, member, guild):
+        """Highest tier the member holds in the guild"""
+        key = (guild.id if guild is not None else None, member.id)
+        cached = self._cache.get(key)
+        if cached is not None and (cached[1] is None or cached[1] > self.clock()):
+            self._cache.move_to_end(key)
+            return cached[0]
+        level = self._evaluate(member, guild)
+        self._cache[key] = (level, self.clock() + self.ttl if self.ttl else None)
+        self._cache.move_to_end(key)
+        if len(self._cache) > self.max_cache:
+            self._cache.popitem(last=False)
+        return level
+
+    def allows(self, member, guild, required=STAFF):
+        return self.tier(member, guild) >= required
+
+    def allows_command(self, member, guild, command):
+        """Check a member against the tier configured for a command (staff by default)"""
+        return self.tier(member, guild) >= self.command_tiers.get(command, STAFF)
+
+    def invalidate(self, member_id, guild_id=None):
+        """Drop cached decisions for a member (e.g. after a role change)"""
+        if guild_id is not None:
+            self._cache.pop((guild_id, member_id), None)
+            return
+        for key in [key for key in self._cache if key[1] == member_id]:
+            del self._cache[key]
+
+    def clear(self):
+        self._cache.clear()
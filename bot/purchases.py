@@ -0,0 +1,138 @@
+#!/usr/bin/env python3
+# -*- coding: utf-8 -*-
+"""Purchase payload validation and background ticket job tracking"""
+
+import json
+import time
+from collections import OrderedDict
+
+REQUIRED_FIELDS = ('buyer', 'discord', 'transactionId', 'totalAmount', 'items')
+
+# One NDJSON line (a single order) may not exceed this many bytes
+MAX_LINE_BYTES = 64 * 1024
+
+# Job states reported by GET /webhook/purchase/{transactionId}
+QUEUED = 'queued'
+IN_PROGRESS = 'in_progress'
+CREATED = 'created'
+FAILED = 'failed'
+
+
+class InvalidPurchase(ValueError):
+    """The purchase payload is missing fields or has the wrong shape"""
+
+
+def parse_purchase(data):
+    """Validate a webhook/ticket-file payload and return the normalized purchase"""
+    if not isinstance(data, dict):
+        raise InvalidPurchase("Purchase payload must be a JSON object")
+    missing = [field for field in REQUIRED_FIELDS if data.get(field) in (None, '')]
+    if missing:
+        raise InvalidPurchase(f"Missing required fields: {', '.join(missing)}")
+    items = data['items']
+    if not isinstance(items, list) or not all(isinstance(item, dict) for item in items):
+        raise InvalidPurchase("items must be a list of objects")
+    return {
+        'buyer': str(data['buyer']),
+        'discord': str(data['discord']),
+        'transactionId': str(data['transactionId']),
+        'totalAmount': str(data['totalAmount']),
+        'items': items,
+        'store': data.get('store'),
+    }
+
+
+async def iter_ndjson(chunks, max_line_bytes=MAX_LINE_BYTES):
+    """Parse newline-delimited JSON from an async iterator of byte chunks
+
+    Yields (line number, purchase) for valid lines and (line number,
+    InvalidPurchase) for broken ones, holding at most one line in memory.
+    Blank lines are skipped but still counted.
+    """
+    buffer = b''
+    line_number = 0
+    oversized = False
+    async for chunk in chunks:
+        buffer += chunk
+        while True:
+            end = buffer.find(b'\n')
+            if end < 0:
+                break
+            line, buffer = buffer[:end], buffer[end + 1:]
+            line_number += 1
+            if oversized:
+                oversized = False
+                yield line_number, InvalidPurchase(f"Line exceeds {max_line_bytes} bytes")
+            elif line.strip():
+                yield line_number, _parse_line(line)
+        if len(buffer) > max_line_bytes:
+            # Drop the rest of this line as it arrives instead of buffering it
+            oversized = True
+            buffer = b''
+    if oversized:
+        yield line_number + 1, InvalidPurchase(f"Line exceeds {max_line_bytes} bytes")
+    elif buffer.strip():
+        yield line_number + 1, _parse_line(buffer)
+
+
+def _parse_line(line):
+    try:
+        return parse_purchase(json.loads(line))
+    except InvalidPurchase as e:
+        return e
+    except ValueError as e:
+        return InvalidPurchase(f"Invalid JSON: {e}")
+
+
+class PurchaseJobs:
+    """Bounded map of transaction id -> background ticket job status"""
+
+    def __init__(self, max_jobs=10_000):
+        self.max_jobs = max_jobs
+        self._jobs = OrderedDict()
+
+    def __contains__(self, transaction_id):
+        return transaction_id in self._jobs
+
+    def __len__(self):
+        return len(self._jobs)
+
+    def enqueue(self, transaction_id):
+        """Record a newly accepted job; returns False if it is already known"""
+        if transaction_id in self._jobs:
+            return False
+        self._jobs[transaction_id] = {
+            'transactionId': transaction_id,
+            'status': QUEUED,
+            'attempts': 0,
+            'channel_id': None,
+            'error': None,
+            'queued_at': time.time(),
+            'updated_at': time.time(),
+        }
+        while len(self._jobs) > self.max_jobs:
+            self._jobs.popitem(last=False)
+        return True
+
+    def update(self, transaction_id, status, **fields):
+        job = self._jobs.get(transaction_id)
+        if job is None:
+            return None
+        job['status'] = status
+        job['updated_at'] = time.time()
+        job.update(fields)
+        if status == IN_PROGRESS:
+            job['attempts'] += 1
+        return job
+
+    def get(self, transaction_id):
+        return self._jobs.get(transaction_id)
+
+    def forget(self, transaction_id):
+        self._jobs.pop(transaction_id, None)
+
+    def counts(self):
+        counts = {QUEUED: 0, IN_PROGRESS: 0, CREATED: 0, FAILED: 0}
+        for job in self._jobs.values():
+            counts[job['status']] += 1
+        return counts
@@ -0,0 +1,244 @@
+#!/usr/bin/env python3
+# -*- coding: utf-8 -*-
+"""Token-bucket scheduler for the bot's Discord REST calls"""
+
+import asyncio
+import contextvars
+import logging
+import time
+
+# Priorities: interactive work (a user is waiting on a button/command) goes first
+INTERACTIVE = 0
+BACKGROUND = 1
+
+# route class -> (burst capacity, period in seconds); per-guild/per-channel keys get their own bucket
+DEFAULT_ROUTE_LIMITS = {
+    'create_channel': (10, 10.0),
+    'delete_channel': (5, 5.0),
+    'send_message': (5, 5.0),
+    'edit_message': (5, 5.0),
+    'pin_message': (5, 5.0),
+    'create_category': (2, 10.0),
+    'read_history': (5, 5.0),
+}
+
+# Discord's global limit is 50 requests per second per bot
+GLOBAL_LIMIT = (50, 1.0)
+
+# discord.py sleeps out and retries 429s itself, logging each one to discord.http with this prefix
+RATE_LIMIT_LOG_PREFIX = 'We are being rate limited.'
+
+# (route, bucket) of the scheduled REST call running in the current task
+_current_call = contextvars.ContextVar('rest_call', default=None)
+
+# Seconds between sweeps for idle per-key buckets (one per ticket channel would pile up otherwise)
+BUCKET_SWEEP_INTERVAL = 60.0
+
+
+def parse_route_limits(spec, defaults=None):
+    """Parse 'route=capacity/period,...' (e.g. 'create_channel=10/10') into limits"""
+    limits = dict(defaults or {})
+    for entry in (spec or '').split(','):
+        if '=' not in entry or '/' not in entry:
+            continue
+        route, rate = (part.strip() for part in entry.split('=', 1))
+        capacity, period = rate.split('/', 1)
+        try:
+            limits[route] = (int(capacity), float(period))
+        except ValueError:
+            continue
+    return limits
+
+
+class TokenBucket:
+    """Classic token bucket refilled continuously at capacity/period tokens per second"""
+
+    __slots__ = ('capacity', 'rate', 'tokens', 'updated', 'blocked_until')
+
+    def __init__(self, capacity, period):
+        self.capacity = capacity
+        self.rate = capacity / period
+        self.tokens = float(capacity)
+        self.updated = time.monotonic()
+        self.blocked_until = 0.0
+
+    def _refill(self, now):
+        self.tokens = min(self.capacity, self.tokens + (now - self.updated) * self.rate)
+        self.updated = now
+
+    def wait_time(self, now=None):
+        """Seconds until a token is available (0 if one is available now)"""
+        now = now if now is not None else time.monotonic()
+        self._refill(now)
+        if now < self.blocked_until:
+            return self.blocked_until - now
+        if self.tokens >= 1:
+            return 0.0
+        return (1 - self.tokens) / self.rate
+
+    def take(self):
+        self.tokens -= 1
+
+    def idle(self, now):
+        """Untouched for a whole period and not blocked, so it has refilled and can be recreated"""
+        return now - self.updated > self.capacity / self.rate and now >= self.blocked_until
+
+    def block(self, seconds):
+        """Empty the bucket for a server-provided retry-after"""
+        self.tokens = 0.0
+        self.blocked_until = max(self.blocked_until, time.monotonic() + seconds)
+
+
+class RouteStats:
+    __slots__ = ('calls', 'waiting', 'wait_seconds', 'max_wait', 'rate_limited')
+
+    def __init__(self):
+        self.calls = 0
+        self.waiting = 0
+        self.wait_seconds = 0.0
+        self.max_wait = 0.0
+        self.rate_limited = 0
+
+
+class RateLimitLogHandler(logging.Handler):
+    """Feeds discord.http's per-429 warnings to a scheduler
+
+    discord.py only raises once it has given up retrying, and its
+    HTTPException carries no retry_after, so these log records are the
+    only per-429 signal. Handlers run synchronously in the task that made
+    the request, which is how the 429 is matched to its scheduler route.
+    """
+
+    def __init__(self, scheduler):
+        super().__init__(logging.WARNING)
+        self.scheduler = scheduler
+
+    def emit(self, record):
+        if not isinstance(record.msg, str) or not record.msg.startswith(RATE_LIMIT_LOG_PREFIX):
+            return
+        retry_after = record.args[-1] if isinstance(record.args, tuple) and record.args else None
+        self.scheduler.rate_limited(retry_after if isinstance(retry_after, (int, float)) else None)
+
+
+class RestScheduler:
+    """Paces REST calls through per-route and global token buckets
+
+    Callers hand over a zero-argument coroutine factory; the scheduler waits
+    until both the route bucket (keyed per guild/channel) and the global
+    bucket have a token, letting interactive callers jump ahead of
+    background ticket work, then runs the call.
+    """
+
+    def __init__(self, route_limits=None, global_limit=GLOBAL_LIMIT):
+        self.route_limits = dict(DEFAULT_ROUTE_LIMITS if route_limits is None else route_limits)
+        self.global_bucket = TokenBucket(*global_limit)
+        self._buckets = {}
+        self._next_sweep = time.monotonic() + BUCKET_SWEEP_INTERVAL
+        self._stats = {}
+        self._interactive_waiting = 0
+
+    def _bucket(self, route, key):
+        limit = self.route_limits.get(route)
+        if limit is None:
+            return None
+        now = time.monotonic()
+        if now >= self._next_sweep:
+            self._sweep(now)
+        bucket = self._buckets.get((route, key))
+        if bucket is None:
+            bucket = self._buckets[(route, key)] = TokenBucket(*limit)
+        return bucket
+
+    def _sweep(self, now):
+        """Drop idle buckets; a fresh one behaves exactly like a refilled one"""
+        self._next_sweep = now + BUCKET_SWEEP_INTERVAL
+        for key in [key for key, bucket in self._buckets.items() if bucket.idle(now)]:
+            del self._buckets[key]
+
+    def install_rate_limit_hook(self, logger_name='discord.http'):
+        """Count the 429s discord.py handles internally (see RateLimitLogHandler)"""
+        logger = logging.getLogger(logger_name)
+        logger.addHandler(RateLimitLogHandler(self))
+        if logger.getEffectiveLevel() > logging.WARNING:
+            logger.setLevel(logging.WARNING)
+
+    def rate_limited(self, retry_after=None):
+        """Record a 429 for the scheduled call running in this task; its bucket waits out retry_after"""
+        current = _current_call.get()
+        route, bucket = current if current is not None else ('unscheduled', None)
+        self._route_stats(route).rate_limited += 1
+        if bucket is not None and retry_after:
+            bucket.block(retry_after)
+
+    def _route_stats(self, route):
+        stats = self._stats.get(route)
+        if stats is None:
+            stats = self._stats[route] = RouteStats()
+        return stats
+
+    async def _acquire(self, bucket, priority):
+        while True:
+            now = time.monotonic()
+            wait = self.global_bucket.wait_time(now)
+            if bucket is not None:
+                wait = max(wait, bucket.wait_time(now))
+            if wait == 0 and priority == BACKGROUND and self._interactive_waiting:
+                # Let waiting interactive calls take the next global token
+                wait = 1 / self.global_bucket.rate
+            if wait == 0:
+                self.global_bucket.take()
+                if bucket is not None:
+                    bucket.take()
+                return
+            await asyncio.sleep(wait)
+
+    async def run(self, route, factory, key=None, priority=BACKGROUND):
+        """Run factory() once the route (and global) rate limits allow it"""
+        stats = self._route_stats(route)
+        bucket = self._bucket(route, key)
+        stats.waiting += 1
+        if priority == INTERACTIVE:
+            self._interactive_waiting += 1
+        started = time.monotonic()
+        try:
+            await self._acquire(bucket, priority)
+        finally:
+            stats.waiting -= 1
+            if priority == INTERACTIVE:
+                self._interactive_waiting -= 1
+        waited = time.monotonic() - started
+        stats.calls += 1
+        stats.wait_seconds += waited
+        if waited > stats.max_wait:
+            stats.max_wait = waited
+        token = _current_call.set((route, bucket))
+        try:
+            return await factory()
+        except Exception as e:
+            # Raised once discord.py stops retrying (already counted from its log records);
+            # discord.RateLimited carries the retry_after it refused to wait for
+            retry_after = getattr(e, 'retry_after', None)
+            if retry_after and bucket is not None:
+                bucket.block(retry_after)
+            raise
+        finally:
+            _current_call.reset(token)
+
+    def queue_depth(self):
+        return sum(stats.waiting for stats in self._stats.values())
+
+    def snapshot(self):
+        """Per-route call counts, queue depth and time spent waiting on limits"""
+        return {
+            'queue_depth': self.queue_depth(),
+            'routes': {
+                route: {
+                    'calls': stats.calls,
+                    'waiting': stats.waiting,
+                    'wait_seconds_total': round(stats.wait_seconds, 3),
+                    'wait_seconds_max': round(stats.max_wait, 3),
+                    'rate_limited': stats.rate_limited,
+                }
+                for route, stats in sorted(self._stats.items())
+            },
+        }
@@ -0,0 +1,267 @@
+#!/usr/bin/env python3
+# -*- coding: utf-8 -*-
+"""Running sales aggregates (by store, product, hour and day) with a Space-Saving top-buyers sketch"""
+
+import json
+import os
+import time
+from decimal import Decimal
+
+from catalog import parse_amount, to_decimal
+
+HOUR = 3600
+DAY = 24 * HOUR
+
+# Buckets older than this are folded away (all-time totals keep everything)
+HOUR_RETENTION = 48
+DAY_RETENTION = 90
+
+# Buyers tracked per sketch; estimates for the top few are exact unless the tail is very heavy
+TOP_BUYERS_CAPACITY = 100
+
+DEFAULT_STORE = 'DonutMarket'
+
+
+class TopBuyers:
+    """Space-Saving heavy-hitters sketch: at most `capacity` buyers, weighted by revenue
+
+    A new buyer that doesn't fit evicts the smallest entry and inherits its
+    weight as an over-estimate (recorded as the error bound).
+    """
+
+    def __init__(self, capacity=TOP_BUYERS_CAPACITY):
+        self.capacity = capacity
+        self.entries = {}
+
+    def add(self, buyer, weight):
+        entry = self.entries.get(buyer)
+        if entry is not None:
+            entry[0] += weight
+            return
+        if len(self.entries) < self.capacity:
+            self.entries[buyer] = [weight, Decimal(0)]
+            return
+        victim = min(self.entries, key=lambda key: self.entries[key][0])
+        floor = self.entries.pop(victim)[0]
+        self.entries[buyer] = [floor + weight, floor]
+
+    def merge(self, other):
+        """Sum another sketch into this one, keeping the `capacity` heaviest buyers"""
+        for buyer, (weight, error) in other.entries.items():
+            entry = self.entries.setdefault(buyer, [Decimal(0), Decimal(0)])
+            entry[0] += weight
+            entry[1] += error
+        if len(self.entries) > self.capacity:
+            self.entries = {buyer: [weight, error] for buyer, weight, error in self.top(self.capacity)}
+        return self
+
+    def top(self, n):
+        """[(buyer, estimated revenue, max over-estimate)], largest first"""
+        ranked = sorted(self.entries.items(), key=lambda item: item[1][0], reverse=True)[:n]
+        return [(buyer, weight, error) for buyer, (weight, error) in ranked]
+
+    def to_json(self):
+        return {buyer: [str(weight), str(error)] for buyer, (weight, error) in self.entries.items()}
+
+    @classmethod
+    def from_json(cls, data, capacity=TOP_BUYERS_CAPACITY):
+        sketch = cls(capacity)
+        sketch.entries = {buyer: [Decimal(weight), Decimal(error)] for buyer, (weight, error) in data.items()}
+        return sketch
+
+
+class _Bucket:
+    """Orders and revenue for one hour or day, overall and per store"""
+    __slots__ = ('count', 'revenue', 'stores', 'buyers')
+
+    def __init__(self, with_buyers=False):
+        self.count = 0
+        self.revenue = Decimal(0)
+        self.stores = {}
+        self.buyers = TopBuyers() if with_buyers else None
+
+    def add(self, store, buyer, revenue):
+        self.count += 1
+        self.revenue += revenue
+        entry = self.stores.setdefault(store, [0, Decimal(0)])
+        entry[0] += 1
+        entry[1] += revenue
+        if self.buyers is not None:
+            self.buyers.add(buyer, revenue)
+
+    def to_json(self):
+        data = {
+            'count': self.count,
+            'revenue': str(self.revenue),
+            'stores': {store: [count, str(revenue)] for store, (count, revenue) in self.stores.items()},
+        }
+        if self.buyers is not None:
+            data['buyers'] = self.buyers.to_json()
+        return data
+
+    @classmethod
+    def from_json(cls, data):
+        bucket = cls(with_buyers='buyers' in data)
+        bucket.count = data['count']
+        bucket.revenue = Decimal(data['revenue'])
+        bucket.stores = {store: [count, Decimal(revenue)] for store, (count, revenue) in data['stores'].items()}
+        if bucket.buyers is not None:
+            bucket.buyers = TopBuyers.from_json(data['buyers'])
+        return bucket
+
+
+def order_store_name(order):
+    items = order.get('items') or []
+    return order.get('store') or next((item['store'] for item in items if item.get('store')), None) or DEFAULT_STORE
+
+
+class SalesStats:
+    """Incrementally updated sales aggregates, checkpointed to a JSON file
+
+    record() is O(items in the order). Queries read at most HOUR_RETENTION
+    hour buckets or DAY_RETENTION day buckets, so they cost the same no
+    matter how many orders have been recorded. The checkpoint carries the
+    order store seq it covers, so a restart only folds in newer orders.
+    """
+
+    def __init__(self, path, clock=time.time):
+        self.path = path
+        self.clock = clock
+        self.dirty = False
+        self._reset()
+
+    def _reset(self):
+        self.count = 0
+        self.revenue = Decimal(0)
+        self.stores = {}
+        # store -> product -> [orders, units, revenue, unit]
+        self.products = {}
+        self.hours = {}
+        self.days = {}
+        self.buyers = TopBuyers()
+
+    def record(self, order):
+        when = order.get('received_at') or self.clock()
+        store = order_store_name(order)
+        buyer = order.get('buyer') or 'unknown'
+        items = order.get('items') or []
+        revenue = to_decimal(order.get('totalAmount'))
+        if revenue is None:
+            revenue = sum((to_decimal(item.get('price')) or Decimal(0) for item in items), Decimal(0))
+
+        self.count += 1
+        self.revenue += revenue
+        entry = self.stores.setdefault(store, [0, Decimal(0)])
+        entry[0] += 1
+        entry[1] += revenue
+        self.buyers.add(buyer, revenue)
+
+        products = self.products.setdefault(store, {})
+        for item in items:
+            amount = parse_amount(item.get('amount'))
+            quantity, unit = amount if amount else (Decimal(1), '')
+            product = products.setdefault(item.get('name') or 'Unknown Item', [0, Decimal(0), Decimal(0), unit])
+            product[0] += 1
+            product[1] += quantity
+            product[2] += to_decimal(item.get('price')) or Decimal(0)
+
+        now = self.clock()
+        hour = int(when // HOUR * HOUR)
+        if hour > now - HOUR_RETENTION * HOUR:
+            self.hours.setdefault(hour, _Bucket(with_buyers=True)).add(store, buyer, revenue)
+        day = int(when // DAY * DAY)
+        if day > now - DAY_RETENTION * DAY:
+            self.days.setdefault(day, _Bucket(with_buyers=True)).add(store, buyer, revenue)
+        self.dirty = True
+
+    def prune(self):
+        now = self.clock()
+        for buckets, width, keep in ((self.hours, HOUR, HOUR_RETENTION), (self.days, DAY, DAY_RETENTION)):
+            cutoff = now - keep * width
+            for start in [start for start in buckets if start <= cutoff]:
+                del buckets[start]
+
+    def summary(self, hours=None, days=None, store=None, top=5):
+        """Orders, revenue, top stores and top buyers for the last `hours`/`days`, or all time"""
+        now = self.clock()
+        if hours is None and days is None:
+            count, revenue, stores, buyers = self.count, self.revenue, self.stores, self.buyers
+        else:
+            buckets, width, span = (self.hours, HOUR, hours) if hours is not None else (self.days, DAY, days)
+            current = int(now // width * width)
+            starts = [current - index * width for index in range(span)]
+            count, revenue, stores, buyers = 0, Decimal(0), {}, TopBuyers()
+            for start in starts:
+                bucket = buckets.get(start)
+                if bucket is None:
+                    continue
+                count += bucket.count
+                revenue += bucket.revenue
+                for name, (store_count, store_revenue) in bucket.stores.items():
+                    entry = stores.setdefault(name, [0, Decimal(0)])
+                    entry[0] += store_count
+                    entry[1] += store_revenue
+                if bucket.buyers is not None:
+                    buyers.merge(bucket.buyers)
+        if store is not None:
+            count, revenue = stores.get(store, [0, Decimal(0)])
+        products = sorted(
+            ((name, *values) for name, values in self.products.get(store, {}).items()),
+            key=lambda product: product[3], reverse=True
+        )[:top] if store is not None else []
+        return {
+            'orders': count,
+            'revenue': revenue,
+            'stores': sorted(stores.items(), key=lambda item: item[1][1], reverse=True)[:top],
+            'products': products,
+            # Buyer sketches aren't split by store
+            'buyers': buyers.top(top) if store is None else [],
+        }
+
+    def checkpoint(self, watermark):
+        """Write the aggregates (covering orders up to `watermark`) atomically"""
+        self.prune()
+        data = {
+            'watermark': watermark,
+            'written_at': self.clock(),
+            'count': self.count,
+            'revenue': str(self.revenue),
+            'stores': {store: [count, str(revenue)] for store, (count, revenue) in self.stores.items()},
+            'products': {
+                store: {name: [count, str(units), str(revenue), unit] for name, (count, units, revenue, unit) in products.items()}
+                for store, products in self.products.items()
+            },
+            'hours': {str(start): bucket.to_json() for start, bucket in self.hours.items()},
+            'days': {str(start): bucket.to_json() for start, bucket in self.days.items()},
+            'buyers': self.buyers.to_json(),
+        }
+        os.makedirs(os.path.dirname(self.path) or '.', exist_ok=True)
+        # Per-process temp name: replicas sharing the data directory checkpoint independently
+        tmp_path = f"{self.path}.{os.getpid()}.tmp"
+        with open(tmp_path, 'w') as f:
+            json.dump(data, f, separators=(',', ':'))
+            f.flush()
+            os.fsync(f.fileno())
+        os.replace(tmp_path, self.path)
+        self.dirty = False
+
+    def load(self):
+        """Restore the last checkpoint; returns the order seq it covers (0 if there is none)"""
+        self._reset()
+        try:
+            with open(self.path, 'r') as f:
+                data = json.load(f)
+        except (OSError, ValueError):
+            return 0
+        self.count = data['count']
+        self.revenue = Decimal(data['revenue'])
+        self.stores = {store: [count, Decimal(revenue)] for store, (count, revenue) in data['stores'].items()}
+        self.products = {
+            store: {name: [count, Decimal(units), Decimal(revenue), unit] for name, (count, units, revenue, unit) in products.items()}
+            for store, products in data['products'].items()
+        }
+        self.hours = {int(start): _Bucket.from_json(bucket) for start, bucket in data['hours'].items()}
+        self.days = {int(start): _Bucket.from_json(bucket) for start, bucket in data['days'].items()}
+        self.buyers = TopBuyers.from_json(data['buyers'])
+        self.prune()
+        return data['watermark']
@@ -0,0 +1,87 @@
+#!/usr/bin/env python3
+# -*- coding: utf-8 -*-
+"""Once-per-process startup helpers: persisted startup state, command tree hashing and phase timing"""
+
+import hashlib
+import json
+import os
+import time
+from contextlib import contextmanager
+
+
+def command_tree_hash(payloads, application_id=None):
+    """Stable hash of the slash command payloads Discord would receive on sync"""
+    canonical = json.dumps(
+        {'application_id': application_id, 'commands': sorted(payloads, key=lambda payload: payload.get('name', ''))},
+        sort_keys=True,
+        separators=(',', ':'),
+        default=str,
+    )
+    return hashlib.sha256(canonical.encode()).hexdigest()
+
+
+def embed_hash(embed_dict):
+    """Hash of an embed's dict form, ignoring the timestamp"""
+    payload = {key: value for key, value in embed_dict.items() if key != 'timestamp'}
+    return hashlib.sha256(json.dumps(payload, sort_keys=True, default=str).encode()).hexdigest()
+
+
+class StartupState:
+    """Small JSON document of values that must survive restarts (command hash, panel message id)"""
+
+    def __init__(self, path):
+        self.path = path
+        self._data = {}
+
+    def load(self):
+        try:
+            with open(self.path, 'r') as f:
+                self._data = json.load(f)
+        except (OSError, ValueError):
+            self._data = {}
+        return self
+
+    def get(self, key, default=None):
+        return self._data.get(key, default)
+
+    def set(self, key, value):
+        """Update one key and write the document atomically"""
+        if self._data.get(key) == value:
+            return
+        self._data[key] = value
+        os.makedirs(os.path.dirname(self.path) or '.', exist_ok=True)
+        tmp_path = self.path + '.tmp'
+        with open(tmp_path, 'w') as f:
+            json.dump(self._data, f, indent=2, sort_keys=True)
+            f.flush()
+            os.fsync(f.fileno())
+        os.replace(tmp_path, self.path)
+
+
+class PhaseTimer:
+    """Wall-clock duration of each named startup phase"""
+
+    def __init__(self):
+        self.phases = {}
+        self.started = None
+        self.finished = None
+
+    @contextmanager
+    def phase(self, name):
+        if self.started is None:
+            self.started = time.time()
+        began = time.perf_counter()
+        try:
+            yield
+        finally:
+            self.phases[name] = round(time.perf_counter() - began, 3)
+
+    def finish(self):
+        self.finished = time.time()
+
+    def snapshot(self):
+        return {
+            'started_at': self.started,
+            'total_seconds': round(self.finished - self.started, 3) if self.started and self.finished else None,
+            'phases': dict(self.phases),
+        }
@@ -0,0 +1,92 @@
+#!/usr/bin/env python3
+# -*- coding: utf-8 -*-
+"""Per-store routing of purchase tickets to a guild and ticket category"""
+
+
+def _key(name):
+    return str(name or '').strip().casefold()
+
+
+def parse_store_routes(spec):
+    """Parse 'store=guild_id/category_id,...' (store id or name) into {store: (guild_id, category_id)}"""
+    routes = {}
+    for entry in (spec or '').split(','):
+        if '=' not in entry or '/' not in entry:
+            continue
+        store, target = (part.strip() for part in entry.split('=', 1))
+        guild_id, category_id = (part.strip() for part in target.split('/', 1))
+        if store and guild_id.isdigit() and category_id.isdigit():
+            routes[store] = (int(guild_id), int(category_id))
+    return routes
+
+
+class StoreRoute:
+    __slots__ = ('store', 'guild_id', 'category_id', 'pool')
+
+    def __init__(self, store, guild_id, category_id, pool):
+        self.store = store
+        self.guild_id = guild_id
+        self.category_id = category_id
+        self.pool = pool
+
+
+class StoreRouter:
+    """Store -> route, guild -> pools and category -> pool maps, all built up front
+
+    Stores without a route (and orders without a store) use the default
+    route, i.e. GUILD_ID / TICKET_CATEGORY_ID. Routes that share a ticket
+    category share one CategoryPool. alias(name) may map a store's display
+    name to its id (the catalog knows both).
+    """
+
+    def __init__(self, default_guild_id, default_pool, routes=None, pool_factory=None, alias=None):
+        self.default = StoreRoute(None, default_guild_id, default_pool.primary_id, default_pool)
+        self.alias = alias
+        pools = {default_pool.primary_id: default_pool}
+        self._by_store = {}
+        for store, (guild_id, category_id) in (routes or {}).items():
+            if category_id not in pools:
+                pools[category_id] = pool_factory(category_id)
+            self._by_store[_key(store)] = StoreRoute(store, guild_id, category_id, pools[category_id])
+        self._routes = [self.default] + list(self._by_store.values())
+        self._pools_by_guild = {}
+        for route in self._routes:
+            guild_pools = self._pools_by_guild.setdefault(route.guild_id, [])
+            if route.pool not in guild_pools:
+                guild_pools.append(route.pool)
+        self._pools = list(pools.values())
+
+    def route(self, store=None):
+        """The route for a store id or name"""
+        if store:
+            route = self._by_store.get(_key(store))
+            if route is None and self.alias is not None:
+                route = self._by_store.get(_key(self.alias(store)))
+            if route is not None:
+                return route
+        return self.default
+
+    def routes(self):
+        """Default route first, then one per configured store"""
+        return list(self._routes)
+
+    def guild_ids(self):
+        return list(self._pools_by_guild)
+
+    def pools_for_guild(self, guild_id):
+        return self._pools_by_guild.get(guild_id, [])
+
+    def pool_for_guild(self, guild_id):
+        """The pool for tickets opened from inside a guild (panel buttons, /create_ticket)"""
+        pools = self._pools_by_guild.get(guild_id)
+        return pools[0] if pools else self.default.pool
+
+    def pool_for_category(self, category_id):
+        """The pool owning a primary or overflow category, or None"""
+        for pool in self._pools:
+            if category_id in pool:
+                return pool
+        return None
+
+    def __contains__(self, category_id):
+        return self.pool_for_category(category_id) is not None
@@ -0,0 +1,190 @@
+#!/usr/bin/env python3
+# -*- coding: utf-8 -*-
+"""Structured JSON logging written from a background thread so the event loop never blocks on stdout"""
+
+import atexit
+import contextvars
+import copy
+import json
+import logging
+import logging.handlers
+import queue
+import sys
+from contextlib import contextmanager
+
+LOGGER_NAME = 'donutmarket'
+
+# Transaction id attached to every record logged while handling a purchase
+transaction_id_var = contextvars.ContextVar('transaction_id', default=None)
+
+# LogRecord attributes that are not user-supplied `extra` fields
+_RESERVED = set(vars(logging.LogRecord('', 0, '', 0, '', (), None))) | {'message', 'asctime', 'txn'}
+
+
+def get_logger(name=None):
+    return logging.getLogger(f"{LOGGER_NAME}.{name}" if name else LOGGER_NAME)
+
+
+@contextmanager
+def transaction_context(transaction_id):
+    """Tag everything logged inside the block with this transaction id"""
+    token = transaction_id_var.set(transaction_id)
+    try:
+        yield
+    finally:
+        transaction_id_var.reset(token)
+
+
+def parse_sample_rates(spec):
+    """Parse 'logger=N,...' (keep 1 in N records below WARNING) into a dict"""
+    rates = {}
+    for entry in (spec or '').split(','):
+        if '=' not in entry:
+            continue
+        name, rate = (part.strip() for part in entry.split('=', 1))
+        try:
+            rates[name] = max(1, int(rate))
+        except ValueError:
+            continue
+    return rates
+
+
+class ContextFilter(logging.Filter):
+    """Capture the transaction id on the logging thread, before the record crosses to the writer thread"""
+
+    def filter(self, record):
+        if not hasattr(record, 'txn'):
+            record.txn = transaction_id_var.get()
+        return True
+
+
+class SamplingFilter(logging.Filter):
+    """Keep 1 in N sub-WARNING records per logger (child loggers inherit the rate)"""
+
+    def __init__(self, rates):
+        super().__init__()
+        self.rates = dict(rates)
+        self._seen = {}
+
+    def _rate(self, name):
+        while name:
+            rate = self.rates.get(name)
+            if rate is not None:
+                return rate
+            name = name.rpartition('.')[0]
+        return 1
+
+    def filter(self, record):
+        if record.levelno >= logging.WARNING:
+            return True
+        rate = self._rate(record.name)
+        if rate == 1:
+            return True
+        seen = self._seen.get(record.name, 0)
+        self._seen[record.name] = seen + 1
+        return seen % rate == 0
+
+
+class JsonFormatter(logging.Formatter):
+    """One JSON object per line: ts, level, logger, msg, txn plus any `extra` fields"""
+
+    def format(self, record):
+        entry = {
+            'ts': round(record.created, 3),
+            'level': record.levelname.lower(),
+            'logger': record.name,
+            'msg': record.getMessage(),
+        }
+        txn = getattr(record, 'txn', None)
+        if txn is not None:
+            entry['txn'] = txn
+        for key, value in record.__dict__.items():
+            if key not in _RESERVED and not key.startswith('_'):
+                entry[key] = value
+        if record.exc_info:
+            entry['exc'] = self.formatException(record.exc_info)
+        elif record.exc_text:
+            entry['exc'] = record.exc_text
+        return json.dumps(entry, ensure_ascii=False, default=str)
+
+
+class TextFormatter(logging.Formatter):
+    """Human-readable lines for local runs"""
+
+    def __init__(self):
+        super().__init__('%(asctime)s %(levelname)-7s %(name)s: %(message)s')
+
+    def format(self, record):
+        line = super().format(record)
+        txn = getattr(record, 'txn', None)
+        return f"{line} [txn={txn}]" if txn is not None else line
+
+
+_EXCEPTION_FORMATTER = logging.Formatter()
+
+
+class NonBlockingQueueHandler(logging.handlers.QueueHandler):
+    """QueueHandler that drops records (and counts them) when the queue is full instead of blocking"""
+
+    def __init__(self, log_queue):
+        super().__init__(log_queue)
+        self.dropped = 0
+
+    def prepare(self, record):
+        # Merge args and render the traceback now (the exception may not survive
+        # the handoff), but leave JSON formatting to the writer thread
+        record = copy.copy(record)
+        record.msg = record.getMessage()
+        record.args = None
+        if record.exc_info:
+            record.exc_text = _EXCEPTION_FORMATTER.formatException(record.exc_info)
+            record.exc_info = None
+        return record
+
+    def enqueue(self, record):
+        try:
+            self.queue.put_nowait(record)
+        except queue.Full:
+            self.dropped += 1
+
+
+class LoggingSetup:
+    """Handle on the configured queue handler and its writer thread"""
+
+    def __init__(self, handler, listener):
+        self.handler = handler
+        self.listener = listener
+
+    @property
+    def dropped(self):
+        return self.handler.dropped
+
+    def stop(self):
+        if self.listener is not None:
+            self.listener.stop()
+            self.listener = None
+
+
+def setup_logging(level='INFO', fmt='json', sample_rates=None, stream=None, max_queue=10_000):
+    """Route the 'donutmarket' loggers through a bounded queue to a background writer thread"""
+    writer = logging.StreamHandler(stream or sys.stdout)
+    writer.setFormatter(JsonFormatter() if fmt == 'json' else TextFormatter())
+
+    handler = NonBlockingQueueHandler(queue.Queue(maxsize=max_queue))
+    handler.addFilter(ContextFilter())
+    if sample_rates:
+        handler.addFilter(SamplingFilter(sample_rates))
+
+    logger = logging.getLogger(LOGGER_NAME)
+    logger.setLevel(level if isinstance(level, int) else getattr(logging, str(level).upper(), logging.INFO))
+    for existing in list(logger.handlers):
+        logger.removeHandler(existing)
+    logger.addHandler(handler)
+    logger.propagate = False
+
+    listener = logging.handlers.QueueListener(handler.queue, writer, respect_handler_level=True)
+    listener.start()
+    setup = LoggingSetup(handler, listener)
+    # Flush whatever is still queued on shutdown
+    atexit.register(setup.stop)
+    return setup
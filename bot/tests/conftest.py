@@ -0,0 +1,29 @@
+# -*- coding: utf-8 -*-
+"""Shared fixtures; the bot's modules live flat in bot/ and import each other top-level"""
+
+import os
+import sys
+
+import pytest
+
+sys.path.insert(0, os.path.dirname(os.path.dirname(os.path.abspath(__file__))))
+
+from order_store import OrderStore  # noqa: E402
+
+
+@pytest.fixture
+def store(tmp_path):
+    order_store = OrderStore(str(tmp_path / 'orders.db'))
+    yield order_store
+    order_store.close()
+
+
+def purchase(transaction_id, buyer='Steve', total='15.00', items=None, store=None):
+    return {
+        'buyer': buyer,
+        'discord': f"{buyer.lower()}#0001",
+        'transactionId': transaction_id,
+        'totalAmount': total,
+        'items': items if items is not None else [{'name': 'DonutSMP Money', 'amount': '150M', 'price': total}],
+        'store': store,
+    }
@@ -0,0 +1,73 @@
+# -*- coding: utf-8 -*-
+import json
+from decimal import Decimal
+
+import pytest
+
+from catalog import StoreCatalog, parse_amount, to_decimal
+
+
+@pytest.fixture
+def catalog(tmp_path):
+    (tmp_path / 'pedros.json').write_text(json.dumps({
+        'storeId': 'pedros',
+        'storeName': "Pedro's Market",
+        'storeProducts': [
+            {'productName': 'DonutSMP Money', 'productPrice': 0.10, 'productType': 'currency',
+             'productUnit': 'M', 'minAmount': 5, 'maxAmount': 180},
+            {'productName': 'Skeleton Spawners', 'productPrice': 0.15, 'productType': 'item'},
+        ],
+    }))
+    (tmp_path / 'other.json').write_text(json.dumps({
+        'storeId': 'other',
+        'storeName': 'Other Store',
+        'storeProducts': [{'productName': 'Skeleton Spawners', 'productPrice': 0.20, 'productType': 'item'}],
+    }))
+    store_catalog = StoreCatalog(str(tmp_path))
+    store_catalog.refresh()
+    return store_catalog
+
+
+def test_to_decimal_and_parse_amount():
+    assert to_decimal('$1.20') == Decimal('1.20')
+    assert to_decimal(0.1) == Decimal('0.1')
+    assert to_decimal('abc') is None
+    assert to_decimal(True) is None
+    assert parse_amount('12.5 M') == (Decimal('12.5'), 'M')
+    assert parse_amount(None) == (Decimal(1), 'x')
+    assert parse_amount('lots') is None
+
+
+def test_exact_decimal_totals(catalog):
+    # 0.15 * 3 is 0.45 exactly, which float math gets wrong
+    items = [{'name': 'Skeleton Spawners', 'amount': '3x', 'price': '0.45'},
+             {'name': 'DonutSMP Money', 'amount': '150M', 'price': '15.00'}]
+    check = catalog.check_order(items, '15.45', "Pedro's Market")
+    assert check.ok, check.issues
+    assert check.expected_total == Decimal('15.45')
+
+
+def test_wrong_price_and_total(catalog):
+    check = catalog.check_order([{'name': 'DonutSMP Money', 'amount': '150M', 'price': '10.00'}], '10.00', "Pedro's Market")
+    assert check.issues == [
+        'DonutSMP Money: charged $10.00, catalog price $15.00',
+        "Total $10.00 doesn't match catalog total $15.00",
+    ]
+
+
+def test_currency_limits(catalog):
+    check = catalog.check_order([{'name': 'DonutSMP Money', 'amount': '200M'}], '20.00', "Pedro's Market")
+    assert check.issues == ['DonutSMP Money: 200M is above the maximum 180M']
+
+
+def test_ambiguous_product_needs_a_store(catalog):
+    assert not catalog.check_order([{'name': 'Skeleton Spawners', 'amount': '1x'}], '0.15').ok
+    assert catalog.check_order([{'name': 'Skeleton Spawners', 'amount': '1x'}], '0.20', 'Other Store').ok
+
+
+def test_unknown_store_is_not_priced_from_another_store(catalog):
+    check = catalog.check_order([{'name': 'DonutSMP Money', 'amount': '150M'}], '15.00', 'Nowhere')
+    assert check.issues == ["DonutSMP Money: unknown store 'Nowhere'"]
+    assert check.expected_total is None
+    assert catalog.product('DonutSMP Money', 'Nowhere') is None
+    assert catalog.product('DonutSMP Money').store_id == 'pedros'
@@ -0,0 +1,253 @@
+# -*- coding: utf-8 -*-
+import asyncio
+import time
+
+from delayed_actions import DelayedActions
+from order_store import OrderStore
+
+
+def run(coro):
+    return asyncio.run(coro)
+
+
+def test_fires_and_deletes_the_row(store):
+    fired = []
+
+    async def reminder(target, payload):
+        fired.append((target, payload))
+
+    async def main():
+        actions = DelayedActions(store, {'reminder': reminder})
+        await actions.schedule('reminder', 1, 0.01, {'n': 1})
+        actions.start()
+        await asyncio.sleep(0.1)
+        await actions.stop()
+
+    run(main())
+    assert fired == [(1, {'n': 1})]
+    assert store.scheduled_actions() == []
+
+
+def test_pending_actions_are_replayed_by_load(store):
+    store.save_action('reminder', 1, time.time() - 5, {'n': 1})
+    fired = []
+
+    async def reminder(target, payload):
+        fired.append(target)
+
+    async def main():
+        actions = DelayedActions(store, {'reminder': reminder})
+        assert actions.load() == 1
+        actions.start()
+        await asyncio.sleep(0.1)
+        await actions.stop()
+
+    run(main())
+    assert fired == [1]
+
+
+def test_row_is_kept_until_the_handler_succeeds(store):
+    async def main():
+        gate = asyncio.Event()
+
+        async def delete_channel(target, payload):
+            await gate.wait()
+
+        actions = DelayedActions(store, {'delete_channel': delete_channel})
+        await actions.schedule('delete_channel', 1, 0)
+        actions.start()
+        await asyncio.sleep(0.05)
+        # Interrupted mid-handler: the row survives for the next start to replay
+        assert [row[:2] for row in store.scheduled_actions()] == [('delete_channel', 1)]
+        gate.set()
+        await asyncio.sleep(0.05)
+        assert store.scheduled_actions() == []
+        await actions.stop()
+
+    run(main())
+
+
+def test_failed_handler_is_rescheduled_with_backoff(store):
+    attempts = []
+
+    async def flaky(target, payload):
+        attempts.append(time.monotonic())
+        if len(attempts) < 3:
+            raise RuntimeError('discord is down')
+
+    async def main():
+        actions = DelayedActions(store, {'auto_close': flaky}, retry_delay=0.05, max_attempts=3)
+        await actions.schedule('auto_close', 1, 0)
+        actions.start()
+        await asyncio.sleep(0.05)
+        row = store.get_action('auto_close', 1)
+        assert row is not None and row[2] == 1
+        await asyncio.sleep(0.4)
+        await actions.stop()
+        return actions
+
+    actions = run(main())
+    assert len(attempts) == 3
+    # Second retry waits twice as long as the first
+    assert attempts[2] - attempts[1] > attempts[1] - attempts[0]
+    assert actions.fired == 1 and actions.failed == 0
+    assert store.scheduled_actions() == []
+
+
+def test_gives_up_after_max_attempts(store):
+    async def broken(target, payload):
+        raise RuntimeError('nope')
+
+    async def main():
+        actions = DelayedActions(store, {'reminder': broken}, retry_delay=0.01, max_attempts=2)
+        await actions.schedule('reminder', 1, 0)
+        actions.start()
+        await asyncio.sleep(0.2)
+        await actions.stop()
+        return actions
+
+    actions = run(main())
+    assert actions.failed == 1
+    assert store.scheduled_actions() == []
+
+
+def test_cancel_and_reschedule(store):
+    fired = []
+
+    async def handler(target, payload):
+        fired.append(target)
+
+    async def main():
+        actions = DelayedActions(store, {'reminder': handler})
+        await actions.schedule('reminder', 1, 0.02)
+        await actions.schedule('reminder', 2, 0.02)
+        await actions.cancel('reminder', 1)
+        # Moving a timer replaces it rather than adding a second one
+        await actions.schedule('reminder', 2, 0.05)
+        assert actions.counts() == {'reminder': 1}
+        actions.start()
+        await asyncio.sleep(0.15)
+        await actions.stop()
+
+    run(main())
+    assert fired == [2]
+    assert store.scheduled_actions() == []
+
+
+def test_min_shift_skips_small_moves(store):
+    async def main():
+        actions = DelayedActions(store, {})
+        assert await actions.schedule('auto_close', 1, 100)
+        assert not await actions.schedule('auto_close', 1, 101, min_shift=10)
+        assert await actions.schedule('auto_close', 1, 200, min_shift=10)
+
+    run(main())
+
+
+def test_writes_wait_out_another_process_holding_the_write_lock(tmp_path):
+    path = str(tmp_path / 'orders.db')
+    store, other = OrderStore(path), OrderStore(path)
+
+    async def main():
+        actions = DelayedActions(store, {})
+        other.db.execute("BEGIN IMMEDIATE")
+        write = asyncio.create_task(actions.schedule('delete_channel', 1, 60, {'reason': 'closed'}))
+        await asyncio.sleep(0.3)
+        # Still waiting (without blocking the loop) rather than failing with "database is locked"
+        assert not write.done()
+        other.db.execute("COMMIT")
+        assert await asyncio.wait_for(write, 5)
+        assert [row[:2] for row in other.scheduled_actions()] == [('delete_channel', 1)]
+        other.db.execute("BEGIN IMMEDIATE")
+        asyncio.get_running_loop().call_later(0.2, other.db.execute, "COMMIT")
+        await actions.cancel_target(1)
+
+    run(main())
+    assert other.scheduled_actions() == []
+    store.close()
+    other.close()
+
+
+def test_only_one_replica_fires_a_shared_action(tmp_path):
+    path = str(tmp_path / 'orders.db')
+    first, second = OrderStore(path), OrderStore(path)
+    fired = []
+
+    def handler(name):
+        async def fire(target, payload):
+            fired.append(name)
+            await asyncio.sleep(0.02)
+        return fire
+
+    async def main():
+        a = DelayedActions(first, {'reminder': handler('a')}, owner='a')
+        b = DelayedActions(second, {'reminder': handler('b')}, owner='b')
+        await a.schedule('reminder', 1, 0.01)
+        b.load()
+        a.start()
+        b.start()
+        await asyncio.sleep(0.15)
+        await a.stop()
+        await b.stop()
+
+    run(main())
+    assert len(fired) == 1
+    assert first.scheduled_actions() == []
+    first.close()
+    second.close()
+
+
+def test_expired_lease_of_a_dead_replica_is_taken_over(store):
+    now = time.time()
+    store.save_action('reminder', 1, now - 1)
+    store.claim_action('reminder', 1, now, 'dead', 0.05)
+    fired = []
+
+    async def handler(target, payload):
+        fired.append(target)
+
+    async def main():
+        actions = DelayedActions(store, {'reminder': handler}, owner='b')
+        actions.load()
+        actions.start()
+        await asyncio.sleep(0.02)
+        assert fired == []
+        await asyncio.sleep(0.15)
+        await actions.stop()
+
+    run(main())
+    assert fired == [1]
+    assert store.scheduled_actions() == []
+
+
+def test_replicas_contending_for_the_write_lock_fire_once(tmp_path, monkeypatch):
+    monkeypatch.setattr('order_store.LOCK_RETRIES', 2)
+    path = str(tmp_path / 'orders.db')
+    first, second, locker = OrderStore(path, busy_timeout=10), OrderStore(path, busy_timeout=10), OrderStore(path)
+    fired = []
+
+    async def handler(target, payload):
+        fired.append(target)
+
+    async def main():
+        a = DelayedActions(first, {'reminder': handler}, owner='a', retry_delay=0.1)
+        b = DelayedActions(second, {'reminder': handler}, owner='b', retry_delay=0.1)
+        await a.schedule('reminder', 1, 0)
+        b.load()
+        # Another process holds the write lock past both replicas' claim retries
+        locker.db.execute("BEGIN IMMEDIATE")
+        a.start()
+        b.start()
+        await asyncio.sleep(0.08)
+        assert fired == []
+        locker.db.execute("COMMIT")
+        await asyncio.sleep(0.3)
+        await a.stop()
+        await b.stop()
+
+    run(main())
+    assert fired == [1]
+    assert first.scheduled_actions() == []
+    for order_store in (first, second, locker):
+        order_store.close()
+
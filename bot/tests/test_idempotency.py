@@ -0,0 +1,89 @@
+# -*- coding: utf-8 -*-
+import asyncio
+import json
+
+from idempotency import IdempotencyIndex
+
+
+class Clock:
+    def __init__(self, now=1_000_000.0):
+        self.now = now
+
+    def __call__(self):
+        return self.now
+
+
+def test_record_and_get(store):
+    index = IdempotencyIndex(store, ttl=60, clock=Clock())
+    assert index.get('t1') is None
+    index.record('t1', 42)
+    assert index.get('t1') == 42
+    assert 't1' in index
+
+
+def test_tickets_older_than_ttl_are_ignored(store):
+    clock = Clock()
+    index = IdempotencyIndex(store, ttl=60, clock=clock)
+    index.record('t1', 42)
+    clock.now += 61
+    assert index.get('t1') is None
+
+
+def test_newest_ticket_wins(store):
+    clock = Clock()
+    index = IdempotencyIndex(store, ttl=60, clock=clock)
+    index.record('t1', 42)
+    clock.now += 1
+    index.record('t1', 43)
+    assert index.get('t1') == 43
+
+
+def test_import_log_moves_live_entries_into_the_store(store, tmp_path):
+    clock = Clock()
+    path = str(tmp_path / 'ticket_index.jsonl')
+    with open(path, 'w') as f:
+        f.write(json.dumps({'txn': 'live', 'channel': 1, 'ts': clock.now - 10}) + '\n')
+        f.write(json.dumps({'txn': 'old', 'channel': 2, 'ts': clock.now - 1000}) + '\n')
+        f.write(json.dumps({'txn': 'gone', 'channel': 3, 'ts': clock.now - 10}) + '\n')
+        f.write(json.dumps({'txn': 'gone', 'channel': None}) + '\n')
+        f.write('{"txn": "torn"')
+    index = IdempotencyIndex(store, ttl=60, clock=clock)
+    assert index.import_log(path) == 1
+    assert index.get('live') == 1
+    assert index.get('old') is None
+    assert index.get('gone') is None
+    assert not (tmp_path / 'ticket_index.jsonl').exists()
+    assert (tmp_path / 'ticket_index.jsonl.imported').exists()
+    assert index.import_log(path) == 0
+
+
+def test_guard_serializes_one_transaction(store):
+    index = IdempotencyIndex(store)
+    events = []
+
+    async def create(name):
+        async with index.guard('t1'):
+            events.append(('start', name))
+            await asyncio.sleep(0.01)
+            events.append(('end', name))
+
+    async def main():
+        await asyncio.gather(create('a'), create('b'))
+
+    asyncio.run(main())
+    assert events == [('start', 'a'), ('end', 'a'), ('start', 'b'), ('end', 'b')]
+    assert index._locks == {}
+
+
+def test_prune_deletes_closed_tickets_past_the_ttl(store):
+    clock = Clock()
+    index = IdempotencyIndex(store, ttl=60, clock=clock)
+    index.record('old-closed', 1, created_at=clock.now - 120)
+    index.record('old-open', 2, created_at=clock.now - 120)
+    index.record('new-closed', 3, created_at=clock.now - 10)
+    store.close_ticket(1)
+    store.close_ticket(3)
+    assert index.prune() == [1]
+    remaining = {ticket['channel_id'] for ticket in store.tickets_with_orders()}
+    assert remaining == {2, 3}
+    assert index.get('new-closed') == 3
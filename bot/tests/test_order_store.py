@@ -0,0 +1,127 @@
+# -*- coding: utf-8 -*-
+import time
+
+from conftest import purchase
+from order_store import FAILED, PENDING, TICKETED, OrderStore
+
+
+def test_add_orders_returns_only_new_transactions(store):
+    assert store.add_orders([purchase('t1'), purchase('t2')], source='webhook') == ['t1', 't2']
+    assert store.add_orders([purchase('t2'), purchase('t3')], source='webhook') == ['t3']
+
+
+def test_order_lifecycle(store):
+    store.add_orders([purchase('t1'), purchase('t2')], source='file')
+    assert [order['transactionId'] for order in store.pending_orders()] == ['t1', 't2']
+    store.mark_ticketed('t1', 42)
+    store.mark_failed('t2', 'boom')
+    assert store.get_order('t1')['status'] == TICKETED and store.get_order('t1')['channel_id'] == 42
+    assert store.get_order('t2')['status'] == FAILED
+    assert store.pending_orders() == []
+    assert store.counts().get(PENDING, 0) == 0
+
+
+def test_orders_after_pages_in_insertion_order(store):
+    store.add_orders([purchase('t1'), purchase('t2'), purchase('t3')], source='webhook')
+    first = store.orders_after(0, limit=2)
+    assert [order['transactionId'] for _, order in first] == ['t1', 't2']
+    rest = store.orders_after(first[-1][0])
+    assert [order['transactionId'] for _, order in rest] == ['t3']
+
+
+def test_tickets_by_transaction(store):
+    store.add_ticket(1, 'purchase', transaction_id='t1', created_at=100)
+    store.record_tickets([(2, 't1', 'purchase', 200), (1, 't1', 'purchase', 300)])
+    assert store.ticket_for_transaction('t1')['channel_id'] == 2
+    assert store.ticket_for_transaction('t1', since=250) is None
+
+
+def test_claim_orders_skips_orders_leased_elsewhere(store):
+    store.add_orders([purchase('t1')], source='webhook', lease_owner='a', lease_seconds=60)
+    store.add_orders([purchase('t2')], source='file')
+    assert [order['transactionId'] for order in store.claim_orders('b', 60)] == ['t2']
+    # The owner's own leases are renewed by claiming again
+    assert [order['transactionId'] for order in store.claim_orders('a', 60)] == ['t1']
+
+
+def test_expired_lease_is_taken_over(store):
+    store.add_orders([purchase('t1')], source='webhook', lease_owner='a', lease_seconds=-1)
+    assert [order['transactionId'] for order in store.claim_orders('b', 60)] == ['t1']
+    assert not store.acquire_lease('t1', 'a', 60)
+    assert store.lease_counts('b') == {'held': 1, 'elsewhere': 0, 'expired': 0}
+
+
+def test_acquire_lease(store):
+    store.add_orders([purchase('t1')], source='webhook', lease_owner='a', lease_seconds=60)
+    assert store.acquire_lease('t1', 'a', 60)
+    assert not store.acquire_lease('t1', 'b', 60)
+    store.mark_ticketed('t1', 42)
+    # Done (and unknown) orders need no lease
+    assert store.acquire_lease('t1', 'b', 60)
+    assert store.acquire_lease('missing', 'b', 60)
+
+
+def test_renew_leases_only_touches_pending_orders_of_owner(store):
+    store.add_orders([purchase('t1'), purchase('t2')], source='webhook', lease_owner='a', lease_seconds=60)
+    store.add_orders([purchase('t3')], source='webhook', lease_owner='b', lease_seconds=60)
+    store.mark_failed('t2', 'boom')
+    assert store.renew_leases('a', 60) == 1
+    assert store.lease_counts('a') == {'held': 1, 'elsewhere': 1, 'expired': 0}
+
+
+def test_leases_are_shared_between_connections(tmp_path):
+    first = OrderStore(str(tmp_path / 'orders.db'))
+    second = OrderStore(str(tmp_path / 'orders.db'))
+    first.add_orders([purchase('t1')], source='webhook', lease_owner='a', lease_seconds=60)
+    assert second.claim_orders('b', 60) == []
+    assert not second.acquire_lease('t1', 'b', 60)
+    first.close()
+    second.close()
+
+
+def test_claim_action_leases_due_rows_to_one_owner(store):
+    now = time.time()
+    store.save_action('reminder', 1, now - 1)
+    assert store.claim_action('reminder', 1, now, 'a', 60)
+    assert not store.claim_action('reminder', 1, now, 'b', 60)
+    # Not due yet at the time the caller fires it
+    store.save_action('reminder', 2, now + 60)
+    assert not store.claim_action('reminder', 2, now, 'a', 60)
+    assert not store.claim_action('reminder', 3, now, 'a', 60)
+
+
+def test_delete_action_with_owner_keeps_rows_rescheduled_by_others(store):
+    now = time.time()
+    store.save_action('reminder', 1, now - 1)
+    store.claim_action('reminder', 1, now, 'a', 60)
+    # Saving again (e.g. another replica moving the timer) clears the lease
+    store.save_action('reminder', 1, now + 60)
+    store.delete_action('reminder', 1, owner='a')
+    assert store.get_action('reminder', 1) is not None
+
+
+def test_orders_after_survives_vacuum(store):
+    store.add_orders([purchase('t1'), purchase('t2'), purchase('t3')], source='webhook')
+    watermark = store.orders_after(0)[1][0]
+    store.db.execute("DELETE FROM order_items WHERE transaction_id = 't1'")
+    store.db.execute("DELETE FROM orders WHERE transaction_id = 't1'")
+    store.db.execute("VACUUM")
+    assert [order['transactionId'] for _, order in store.orders_after(watermark)] == ['t3']
+    store.add_orders([purchase('t4')], source='webhook')
+    assert [order['transactionId'] for _, order in store.orders_after(watermark)] == ['t3', 't4']
+
+
+def test_orders_from_before_seq_keep_their_rowid(tmp_path):
+    path = str(tmp_path / 'orders.db')
+    legacy = OrderStore(path)
+    legacy.add_orders([purchase('t1'), purchase('t2')], source='webhook')
+    legacy.db.execute("DROP INDEX idx_orders_seq")
+    legacy.db.execute("ALTER TABLE orders DROP COLUMN seq")
+    rowids = [row[0] for row in legacy.db.execute("SELECT rowid FROM orders ORDER BY rowid")]
+    legacy.close()
+
+    store = OrderStore(path)
+    assert [seq for seq, _ in store.orders_after(0)] == rowids
+    store.add_orders([purchase('t3')], source='webhook')
+    assert store.orders_after(rowids[-1])[0][1]['transactionId'] == 't3'
+    store.close()
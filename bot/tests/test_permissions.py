@@ -0,0 +1,69 @@
+# -*- coding: utf-8 -*-
+from types import SimpleNamespace
+
+from permissions import ADMIN, NONE, STAFF, PermissionEngine, parse_command_tiers
+
+GUILD = SimpleNamespace(id=9, owner_id=2)
+
+
+class Clock:
+    def __init__(self):
+        self.now = 0.0
+
+    def __call__(self):
+        return self.now
+
+
+def member(member_id, *role_ids, administrator=False):
+    return SimpleNamespace(
+        id=member_id,
+        roles=[SimpleNamespace(id=role_id) for role_id in role_ids],
+        guild_permissions=SimpleNamespace(administrator=administrator),
+    )
+
+
+def test_tiers():
+    engine = PermissionEngine(1, allowed_user_ids=[10], allowed_role_ids=[5], admin_role_ids=[6])
+    assert engine.tier(member(1), GUILD) == ADMIN
+    assert engine.tier(member(2), GUILD) == ADMIN
+    assert engine.tier(member(3, 6), GUILD) == ADMIN
+    assert engine.tier(member(4, administrator=True), GUILD) == ADMIN
+    assert engine.tier(member(10), GUILD) == STAFF
+    assert engine.tier(member(11, 5), GUILD) == STAFF
+    assert engine.tier(member(12, 7), GUILD) == NONE
+
+
+def test_cached_until_invalidated():
+    engine = PermissionEngine(1, allowed_role_ids=[5])
+    assert engine.tier(member(3), GUILD) == NONE
+    assert engine.tier(member(3, 5), GUILD) == NONE
+    engine.invalidate(3, GUILD.id)
+    assert engine.tier(member(3, 5), GUILD) == STAFF
+
+
+def test_ttl_picks_up_role_changes_nobody_dispatched():
+    clock = Clock()
+    engine = PermissionEngine(1, allowed_role_ids=[5], ttl=60, clock=clock)
+    assert engine.tier(member(3), GUILD) == NONE
+    clock.now = 59
+    assert engine.tier(member(3, 5), GUILD) == NONE
+    clock.now = 61
+    assert engine.tier(member(3, 5), GUILD) == STAFF
+
+
+def test_lru_evicts_the_least_recently_used_entry():
+    engine = PermissionEngine(1, allowed_role_ids=[5], max_cache=2)
+    engine.tier(member(3), GUILD)
+    engine.tier(member(4), GUILD)
+    engine.tier(member(3), GUILD)
+    engine.tier(member(5), GUILD)
+    assert list(engine._cache) == [(9, 3), (9, 5)]
+
+
+def test_command_tiers():
+    tiers = parse_command_tiers('close=admin, bogus=root, find_ticket=none', defaults={'sales_stats': ADMIN})
+    assert tiers == {'sales_stats': ADMIN, 'close': ADMIN, 'find_ticket': NONE}
+    engine = PermissionEngine(1, allowed_role_ids=[5], command_tiers=tiers)
+    assert not engine.allows_command(member(3, 5), GUILD, 'close')
+    assert engine.allows_command(member(3, 5), GUILD, 'add_user')
+    assert engine.allows_command(member(4), GUILD, 'find_ticket')
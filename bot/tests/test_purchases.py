@@ -0,0 +1,39 @@
+# -*- coding: utf-8 -*-
+import asyncio
+import json
+
+from purchases import InvalidPurchase, iter_ndjson
+
+
+def collect(chunks, **kwargs):
+    async def source():
+        for chunk in chunks:
+            yield chunk
+
+    async def main():
+        return [item async for item in iter_ndjson(source(), **kwargs)]
+
+    return asyncio.run(main())
+
+
+def line(transaction_id):
+    return json.dumps({'buyer': 'Steve', 'discord': 'steve#1', 'transactionId': transaction_id,
+                       'totalAmount': '2.00', 'items': [{'name': 'Netherite Set', 'amount': '1x'}]}).encode()
+
+
+def test_lines_split_across_chunks():
+    data = line('t1') + b'\n\n' + line('t2')
+    results = collect([data[:7], data[7:50], data[50:]])
+    assert [(number, purchase['transactionId']) for number, purchase in results] == [(1, 't1'), (3, 't2')]
+
+
+def test_invalid_lines_are_reported_in_place():
+    results = collect([line('t1') + b'\n{"buyer": 1}\nnot json\n'])
+    assert results[0][1]['transactionId'] == 't1'
+    assert [number for number, result in results[1:] if isinstance(result, InvalidPurchase)] == [2, 3]
+
+
+def test_oversized_line_is_dropped_without_buffering():
+    results = collect([b'x' * 40, b'x' * 40 + b'\n' + line('t1') + b'\n'], max_line_bytes=50)
+    assert results[0][0] == 1 and isinstance(results[0][1], InvalidPurchase)
+    assert results[1][0] == 2 and results[1][1]['transactionId'] == 't1'
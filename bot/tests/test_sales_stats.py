@@ -0,0 +1,76 @@
+# -*- coding: utf-8 -*-
+from decimal import Decimal
+
+from sales_stats import DAY, HOUR, SalesStats, TopBuyers
+
+
+class Clock:
+    def __init__(self, now=100 * DAY):
+        self.now = now
+
+    def __call__(self):
+        return self.now
+
+
+def order(buyer, total, when, store="Pedro's Market"):
+    return {'buyer': buyer, 'totalAmount': total, 'received_at': when, 'store': store,
+            'items': [{'name': 'Elytra', 'amount': '1x', 'price': total}]}
+
+
+def test_windows(tmp_path):
+    clock = Clock()
+    stats = SalesStats(str(tmp_path / 'sales.json'), clock=clock)
+    stats.record(order('alex', '20', clock.now - 60))
+    stats.record(order('steve', '2', clock.now - 2 * DAY))
+    stats.record(order('alex', '5', clock.now - 40 * DAY))
+
+    day = stats.summary(hours=24)
+    assert day['orders'] == 1 and day['revenue'] == Decimal('20')
+    assert [buyer for buyer, _, _ in day['buyers']] == ['alex']
+    week = stats.summary(days=7)
+    assert week['orders'] == 2 and week['revenue'] == Decimal('22')
+    everything = stats.summary()
+    assert everything['orders'] == 3
+    assert everything['buyers'][0][:2] == ('alex', Decimal('25'))
+    assert stats.summary(store="Pedro's Market")['products'][0][:2] == ('Elytra', 3)
+
+
+def test_checkpoint_round_trip(tmp_path):
+    clock = Clock()
+    path = str(tmp_path / 'sales.json')
+    stats = SalesStats(path, clock=clock)
+    stats.record(order('alex', '20', clock.now - 60))
+    stats.checkpoint(7)
+    assert not stats.dirty
+
+    restored = SalesStats(path, clock=clock)
+    assert restored.load() == 7
+    assert restored.summary(hours=24) == stats.summary(hours=24)
+    assert restored.summary() == stats.summary()
+
+
+def test_load_without_checkpoint(tmp_path):
+    stats = SalesStats(str(tmp_path / 'missing.json'))
+    assert stats.load() == 0
+    assert stats.count == 0
+
+
+def test_old_buckets_are_pruned(tmp_path):
+    clock = Clock()
+    stats = SalesStats(str(tmp_path / 'sales.json'), clock=clock)
+    stats.record(order('alex', '20', clock.now - 60))
+    clock.now += 100 * DAY
+    stats.prune()
+    assert stats.hours == {} and stats.days == {}
+    assert stats.count == 1
+
+
+def test_top_buyers_sketch_keeps_heavy_hitters():
+    sketch = TopBuyers(capacity=2)
+    sketch.add('whale', Decimal(100))
+    sketch.add('a', Decimal(1))
+    sketch.add('b', Decimal(2))
+    top = sketch.top(2)
+    assert top[0] == ('whale', Decimal(100), Decimal(0))
+    # 'b' evicted 'a' and inherited its weight as the error bound
+    assert top[1] == ('b', Decimal(3), Decimal(1))
@@ -0,0 +1,36 @@
+# -*- coding: utf-8 -*-
+from ticket_search import CLOSED, TicketEntry, TicketSearchIndex
+
+
+def entry(channel_id, buyer, created_at, status='open', **fields):
+    return TicketEntry(channel_id, name=f"purchase-{buyer}", buyer=buyer, status=status, created_at=created_at, **fields)
+
+
+def test_prefix_lookup_orders_open_then_newest():
+    index = TicketSearchIndex()
+    index.load([
+        entry(1, 'Steve', 10),
+        entry(2, 'Stella', 30, status=CLOSED),
+        entry(3, 'Stan', 20),
+        entry(4, 'Alex', 40),
+    ])
+    assert [ticket.channel_id for ticket in index.search('st')] == [3, 1, 2]
+    assert [ticket.channel_id for ticket in index.search('ST', limit=1)] == [3]
+    assert index.search('zz') == []
+
+
+def test_words_inside_fields_are_searchable():
+    index = TicketSearchIndex()
+    index.add(entry(1, 'Steve', 10, transaction_id='TXN-123', items=['Netherite Set']))
+    assert [ticket.channel_id for ticket in index.search('netherite')] == [1]
+    assert [ticket.channel_id for ticket in index.search('txn-1')] == [1]
+
+
+def test_update_and_remove_reindex():
+    index = TicketSearchIndex()
+    index.add(entry(1, 'Steve', 10))
+    index.update(1, buyer='Alex', name='purchase-alex')
+    assert index.search('steve') == []
+    assert [ticket.channel_id for ticket in index.search('alex')] == [1]
+    index.remove(1)
+    assert index.search('alex') == [] and len(index) == 0
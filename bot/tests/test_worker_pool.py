@@ -0,0 +1,72 @@
+# -*- coding: utf-8 -*-
+import asyncio
+
+from worker_pool import WorkerPool
+
+
+def test_retries_until_success():
+    calls = []
+
+    async def handler(item):
+        calls.append(item)
+        if len(calls) < 3:
+            raise RuntimeError('try again')
+
+    async def main():
+        pool = WorkerPool(handler, concurrency=2, max_attempts=5, base_delay=0.01)
+        assert pool.submit('t1', 'order')
+        await asyncio.wait_for(pool.join(), 2)
+        await pool.stop()
+        return pool.stats()
+
+    stats = asyncio.run(main())
+    assert calls == ['order'] * 3
+    assert stats['completed'] == 1 and stats['retried'] == 2 and stats['failed'] == 0
+
+
+def test_gives_up_and_awaits_the_hook():
+    given_up = []
+
+    async def handler(item):
+        raise RuntimeError('always')
+
+    async def on_give_up(item, error):
+        given_up.append((item, str(error)))
+
+    async def main():
+        pool = WorkerPool(handler, max_attempts=2, base_delay=0.01, on_give_up=on_give_up)
+        pool.submit('t1', 'order')
+        await asyncio.wait_for(pool.join(), 2)
+        await pool.stop()
+        return pool
+
+    pool = asyncio.run(main())
+    assert given_up == [('order', 'always')]
+    assert pool.failed == 1
+    # The key is free again once the pool gave up on it
+    assert 't1' not in pool._keys
+
+
+def test_duplicate_keys_are_not_queued_twice():
+    async def handler(item):
+        await asyncio.sleep(0.01)
+
+    async def main():
+        pool = WorkerPool(handler)
+        assert pool.submit('t1', 'a')
+        assert not pool.submit('t1', 'b')
+        await pool.join()
+        # Done items can be submitted again
+        assert pool.submit('t1', 'c')
+        await pool.join()
+        await pool.stop()
+        return pool.completed
+
+    assert asyncio.run(main()) == 2
+
+
+def test_backoff_is_capped_full_jitter():
+    pool = WorkerPool(None, base_delay=1.0, max_delay=8.0)
+    for attempt, ceiling in ((1, 1.0), (2, 2.0), (3, 4.0), (4, 8.0), (10, 8.0)):
+        delay = pool.backoff(attempt)
+        assert ceiling / 2 <= delay <= ceiling
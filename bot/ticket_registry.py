@@ -0,0 +1,148 @@
+#!/usr/bin/env python3
+# -*- coding: utf-8 -*-
+"""In-memory registry of open ticket channels"""
+
+import re
+from datetime import datetime, timezone
+
+# Channel name prefix -> ticket type
+TICKET_PREFIXES = {
+    'purchase-': 'purchase',
+    'ticket-': 'support',
+    'rewards-': 'rewards',
+}
+
+_TOPIC_FIELD = re.compile(r'(\w+)=([^|]+)')
+
+
+def ticket_type_for_name(channel_name):
+    """Return the ticket type implied by a channel name, or None"""
+    for prefix, ticket_type in TICKET_PREFIXES.items():
+        if channel_name.startswith(prefix):
+            return ticket_type
+    return None
+
+
+def format_topic(ticket_type, owner_id=None, transaction_id=None):
+    """Channel topic carrying the ticket metadata so it survives restarts"""
+    parts = [f"DonutMarket {ticket_type} ticket", f"type={ticket_type}"]
+    if owner_id:
+        parts.append(f"owner={owner_id}")
+    if transaction_id:
+        parts.append(f"txn={transaction_id}")
+    return " | ".join(parts)
+
+
+def parse_topic(topic):
+    """Extract the metadata written by format_topic()"""
+    fields = {key: value.strip() for key, value in _TOPIC_FIELD.findall(topic or '')}
+    owner = fields.get('owner')
+    return {
+        'type': fields.get('type'),
+        'owner_id': int(owner) if owner and owner.isdigit() else None,
+        'transaction_id': fields.get('txn'),
+    }
+
+
+class TicketRecord:
+    __slots__ = ('channel_id', 'ticket_type', 'owner_id', 'transaction_id', 'created_at', 'name')
+
+    def __init__(self, channel_id, ticket_type, owner_id=None, transaction_id=None, created_at=None, name=None):
+        self.channel_id = channel_id
+        self.ticket_type = ticket_type
+        self.owner_id = owner_id
+        self.transaction_id = transaction_id
+        self.created_at = created_at or datetime.now(timezone.utc)
+        self.name = name
+
+    @property
+    def mention(self):
+        return f"<#{self.channel_id}>"
+
+
+class TicketRegistry:
+    """Open tickets indexed by channel, owner + type and transaction id"""
+
+    def __init__(self):
+        self._by_channel = {}
+        self._by_owner = {}
+        self._by_transaction = {}
+        self._counts = {ticket_type: 0 for ticket_type in TICKET_PREFIXES.values()}
+        # ticket types -> sorted records, dropped on any change
+        self._sorted = {}
+
+    def __len__(self):
+        return len(self._by_channel)
+
+    def __contains__(self, channel_id):
+        return channel_id in self._by_channel
+
+    def add(self, record):
+        """Register (or replace) the record for a channel"""
+        self.remove(record.channel_id)
+        self._sorted.clear()
+        self._by_channel[record.channel_id] = record
+        self._counts[record.ticket_type] = self._counts.get(record.ticket_type, 0) + 1
+        if record.owner_id:
+            self._by_owner.setdefault((record.owner_id, record.ticket_type), set()).add(record.channel_id)
+        if record.transaction_id:
+            self._by_transaction[record.transaction_id] = record.channel_id
+        return record
+
+    def remove(self, channel_id):
+        """Forget a channel; returns the removed record, if any"""
+        record = self._by_channel.pop(channel_id, None)
+        if record is None:
+            return None
+        self._sorted.clear()
+        self._counts[record.ticket_type] -= 1
+        if record.owner_id:
+            key = (record.owner_id, record.ticket_type)
+            channels = self._by_owner.get(key)
+            if channels is not None:
+                channels.discard(channel_id)
+                if not channels:
+                    del self._by_owner[key]
+        if record.transaction_id and self._by_transaction.get(record.transaction_id) == channel_id:
+            del self._by_transaction[record.transaction_id]
+        return record
+
+    def clear(self):
+        self._by_channel.clear()
+        self._by_owner.clear()
+        self._by_transaction.clear()
+        self._sorted.clear()
+        self._counts = {ticket_type: 0 for ticket_type in TICKET_PREFIXES.values()}
+
+    def get(self, channel_id):
+        return self._by_channel.get(channel_id)
+
+    def find_open(self, owner_id, ticket_type):
+        """Return one open ticket of this type owned by the user, or None"""
+        channels = self._by_owner.get((owner_id, ticket_type))
+        if not channels:
+            return None
+        return self._by_channel[next(iter(channels))]
+
+    def by_transaction(self, transaction_id):
+        channel_id = self._by_transaction.get(transaction_id)
+        return self._by_channel.get(channel_id) if channel_id is not None else None
+
+    def count(self, *ticket_types):
+        """Number of open tickets, optionally limited to some types"""
+        if not ticket_types:
+            return len(self._by_channel)
+        return sum(self._counts.get(ticket_type, 0) for ticket_type in ticket_types)
+
+    def records(self, *ticket_types):
+        """Open tickets (optionally filtered by type), oldest first
+
+        The sorted list is cached until the next add/remove; treat it as read-only.
+        """
+        cached = self._sorted.get(ticket_types)
+        if cached is None:
+            records = self._by_channel.values()
+            if ticket_types:
+                records = [record for record in records if record.ticket_type in ticket_types]
+            cached = self._sorted[ticket_types] = sorted(records, key=lambda record: record.created_at)
+        return cached
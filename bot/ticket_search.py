@@ -0,0 +1,132 @@
+#!/usr/bin/env python3
+# -*- coding: utf-8 -*-
+"""Prefix search over open and archived tickets (buyer, Discord tag, transaction id, items, channel name)"""
+
+import heapq
+import re
+from bisect import bisect_left, insort
+
+OPEN = 'open'
+CLOSED = 'closed'
+
+# Tokens are split on anything that isn't a letter, digit, '_' or '#'
+_TOKEN_SPLIT = re.compile(r"[^\w#]+")
+
+
+def _normalize(text):
+    return str(text or '').strip().casefold()
+
+
+class TicketEntry:
+    __slots__ = ('channel_id', 'name', 'status', 'buyer', 'discord', 'transaction_id', 'items',
+                 'created_at', 'transcript_path')
+
+    def __init__(self, channel_id, name=None, status=OPEN, buyer=None, discord=None, transaction_id=None,
+                 items=(), created_at=None, transcript_path=None):
+        self.channel_id = channel_id
+        self.name = name
+        self.status = status
+        self.buyer = buyer
+        self.discord = discord
+        self.transaction_id = transaction_id
+        self.items = tuple(items)
+        self.created_at = created_at
+        self.transcript_path = transcript_path
+
+    def keys(self):
+        """Every searchable string: whole fields plus their individual words"""
+        keys = set()
+        for field in (self.buyer, self.discord, self.transaction_id, self.name, *self.items):
+            value = _normalize(field)
+            if not value:
+                continue
+            keys.add(value)
+            keys.update(token for token in _TOKEN_SPLIT.split(value) if token)
+        return keys
+
+
+class TicketSearchIndex:
+    """Sorted (key, channel id) pairs searched with bisect
+
+    A prefix lookup is one binary search plus a scan of the matching run,
+    so autocomplete stays well inside Discord's 3 second window with tens
+    of thousands of tickets. Updates are O(n) list inserts, which is fine
+    at the rate tickets are opened and closed.
+    """
+
+    def __init__(self):
+        self._keys = []
+        self._entries = {}
+
+    def __len__(self):
+        return len(self._entries)
+
+    def get(self, channel_id):
+        return self._entries.get(channel_id)
+
+    def add(self, entry):
+        """Index (or re-index) a ticket"""
+        self.remove(entry.channel_id)
+        self._entries[entry.channel_id] = entry
+        for key in entry.keys():
+            insort(self._keys, (key, entry.channel_id))
+        return entry
+
+    def load(self, entries):
+        """Replace the index with these entries, sorting the keys once"""
+        self.clear()
+        for entry in entries:
+            self._entries[entry.channel_id] = entry
+            self._keys.extend((key, entry.channel_id) for key in entry.keys())
+        self._keys.sort()
+
+    def remove(self, channel_id):
+        entry = self._entries.pop(channel_id, None)
+        if entry is None:
+            return None
+        for key in entry.keys():
+            index = bisect_left(self._keys, (key, channel_id))
+            if index < len(self._keys) and self._keys[index] == (key, channel_id):
+                del self._keys[index]
+        return entry
+
+    def update(self, channel_id, **fields):
+        """Change some fields of an indexed ticket; returns the entry, or None if unknown"""
+        entry = self._entries.get(channel_id)
+        if entry is None:
+            return None
+        if {'name', 'buyer', 'discord', 'transaction_id', 'items'} & fields.keys():
+            self.remove(channel_id)
+            for name, value in fields.items():
+                setattr(entry, name, tuple(value) if name == 'items' else value)
+            return self.add(entry)
+        for name, value in fields.items():
+            setattr(entry, name, value)
+        return entry
+
+    def clear(self):
+        self._keys.clear()
+        self._entries.clear()
+
+    def search(self, prefix, limit=25):
+        """Tickets with a key starting with prefix: open ones first, then newest first"""
+        prefix = _normalize(prefix)
+        if not prefix:
+            matches = list(self._entries)
+        else:
+            matches = []
+            seen = set()
+            index = bisect_left(self._keys, (prefix,))
+            while index < len(self._keys):
+                key, channel_id = self._keys[index]
+                if not key.startswith(prefix):
+                    break
+                if channel_id not in seen:
+                    seen.add(channel_id)
+                    matches.append(channel_id)
+                index += 1
+        return heapq.nsmallest(
+            limit,
+            (self._entries[channel_id] for channel_id in matches),
+            key=lambda entry: (entry.status != OPEN, -(entry.created_at or 0))
+        )
@@ -0,0 +1,258 @@
+#!/usr/bin/env python3
+# -*- coding: utf-8 -*-
+"""Event-driven watcher for the tickets/ queue written by the Express server"""
+
+import asyncio
+import ctypes
+import ctypes.util
+import errno
+import logging
+import os
+import struct
+import sys
+import time
+from collections import deque
+
+# inotify(7) constants
+IN_CLOSE_WRITE = 0x00000008
+IN_MOVED_TO = 0x00000080
+IN_Q_OVERFLOW = 0x00004000
+IN_IGNORED = 0x00008000
+IN_NONBLOCK = os.O_NONBLOCK
+IN_CLOEXEC = 0o2000000
+
+_EVENT_HEADER = struct.Struct('iIII')
+
+log = logging.getLogger('donutmarket.ticket_watcher')
+
+# A claimed ticket file is renamed to "<name>.claimed-<owner>", which the watcher ignores
+CLAIM_MARKER = '.claimed-'
+
+
+def claim_file(path, owner):
+    """Atomically take a ticket file for owner; returns the claimed path, or None if it's gone
+
+    rename(2) succeeds for exactly one of several racing replicas, so only
+    the winner reads the file.
+    """
+    claimed = f"{path}{CLAIM_MARKER}{owner}"
+    try:
+        os.rename(path, claimed)
+    except FileNotFoundError:
+        return None
+    return claimed
+
+
+def unclaim_file(claimed):
+    """Put a claimed file back under its original name so any replica can take it"""
+    original = claimed.rsplit(CLAIM_MARKER, 1)[0]
+    try:
+        os.replace(claimed, original)
+    except FileNotFoundError:
+        return None
+    return original
+
+
+def release_stale_claims(directory, max_age, now=None):
+    """Unclaim files whose claimer hasn't finished with them within max_age seconds
+
+    The rename that claims a file updates its ctime, so that is the claim
+    time. Returns the number of files released.
+    """
+    now = time.time() if now is None else now
+    released = 0
+    try:
+        with os.scandir(directory) as entries:
+            claims = [entry for entry in entries if CLAIM_MARKER in entry.name]
+        for entry in claims:
+            try:
+                stale = now - entry.stat().st_ctime > max_age
+            except FileNotFoundError:
+                continue
+            if stale and unclaim_file(entry.path):
+                log.warning(f"♻️ Released stale claim on {entry.name}")
+                released += 1
+    except FileNotFoundError:
+        pass
+    return released
+
+
+def _load_inotify():
+    """Return libc with inotify bound, or None if the platform lacks it"""
+    if not sys.platform.startswith('linux'):
+        return None
+    try:
+        libc = ctypes.CDLL(ctypes.util.find_library('c') or 'libc.so.6', use_errno=True)
+    except OSError:
+        return None
+    if not hasattr(libc, 'inotify_init1') or not hasattr(libc, 'inotify_add_watch'):
+        return None
+    libc.inotify_init1.argtypes = [ctypes.c_int]
+    libc.inotify_add_watch.argtypes = [ctypes.c_int, ctypes.c_char_p, ctypes.c_uint32]
+    return libc
+
+
+class LatencyStats:
+    """Rolling window of file-written -> channel-created latencies (seconds)"""
+
+    def __init__(self, window=500):
+        self.samples = deque(maxlen=window)
+        self.total = 0
+        self.max = 0.0
+
+    def record(self, seconds):
+        self.samples.append(seconds)
+        self.total += 1
+        if seconds > self.max:
+            self.max = seconds
+
+    def percentile(self, pct):
+        if not self.samples:
+            return None
+        ordered = sorted(self.samples)
+        index = min(len(ordered) - 1, int(round(pct / 100 * (len(ordered) - 1))))
+        return ordered[index]
+
+    def snapshot(self):
+        """Summary suitable for JSON health output"""
+        last = self.samples[-1] if self.samples else None
+        return {
+            'count': self.total,
+            'last_seconds': round(last, 3) if last is not None else None,
+            'p50_seconds': _round(self.percentile(50)),
+            'p95_seconds': _round(self.percentile(95)),
+            'max_seconds': round(self.max, 3),
+        }
+
+
+def _round(value):
+    return round(value, 3) if value is not None else None
+
+
+class TicketWatcher:
+    """Watch a directory for ticket_*.json files and hand them off in batches
+
+    Uses inotify when available so a file is picked up as soon as its writer
+    closes it, and falls back to polling the directory otherwise. Files that
+    arrive together are coalesced into a single handler call.
+    """
+
+    def __init__(self, directory, handler, prefix='ticket_', suffix='.json',
+                 poll_interval=5.0, settle_delay=0.05, rescan_interval=60.0):
+        self.directory = directory
+        self.handler = handler
+        self.prefix = prefix
+        self.suffix = suffix
+        self.poll_interval = poll_interval
+        self.settle_delay = settle_delay
+        self.rescan_interval = rescan_interval
+        self.mode = None
+        self._pending = set()
+        self._wakeup = asyncio.Event()
+        self._fd = None
+        self._libc = None
+
+    def _matches(self, filename):
+        return filename.startswith(self.prefix) and filename.endswith(self.suffix)
+
+    def _scan(self):
+        """Queue every matching file currently in the directory"""
+        try:
+            with os.scandir(self.directory) as entries:
+                for entry in entries:
+                    if self._matches(entry.name):
+                        self._pending.add(entry.name)
+        except FileNotFoundError:
+            pass
+        if self._pending:
+            self._wakeup.set()
+
+    def _start_inotify(self):
+        libc = _load_inotify()
+        if libc is None:
+            return False
+        fd = libc.inotify_init1(IN_NONBLOCK | IN_CLOEXEC)
+        if fd < 0:
+            return False
+        wd = libc.inotify_add_watch(fd, os.fsencode(self.directory), IN_CLOSE_WRITE | IN_MOVED_TO)
+        if wd < 0:
+            os.close(fd)
+            return False
+        self._libc = libc
+        self._fd = fd
+        asyncio.get_running_loop().add_reader(fd, self._on_readable)
+        return True
+
+    def _stop_inotify(self):
+        if self._fd is None:
+            return
+        try:
+            asyncio.get_running_loop().remove_reader(self._fd)
+        except RuntimeError:
+            pass
+        os.close(self._fd)
+        self._fd = None
+
+    def _on_readable(self):
+        """Read all queued inotify events without blocking"""
+        rescan = False
+        while True:
+            try:
+                data = os.read(self._fd, 65536)
+            except BlockingIOError:
+                break
+            except OSError as e:
+                if e.errno == errno.EINTR:
+                    continue
+                raise
+            offset = 0
+            while offset + _EVENT_HEADER.size <= len(data):
+                _, mask, _, name_len = _EVENT_HEADER.unpack_from(data, offset)
+                offset += _EVENT_HEADER.size
+                name = data[offset:offset + name_len].rstrip(b'\0').decode('utf-8', 'replace')
+                offset += name_len
+                if mask & (IN_Q_OVERFLOW | IN_IGNORED):
+                    rescan = True
+                elif name and self._matches(name):
+                    self._pending.add(name)
+        if rescan:
+            self._scan()
+        if self._pending:
+            self._wakeup.set()
+
+    async def _poll(self):
+        """Periodic directory scan; the only source of files in fallback mode"""
+        interval = self.poll_interval if self.mode == 'polling' else self.rescan_interval
+        while True:
+            await asyncio.sleep(interval)
+            self._scan()
+
+    async def run(self):
+        """Run forever, calling handler(paths) for each batch of new files"""
+        os.makedirs(self.directory, exist_ok=True)
+        self.mode = 'inotify' if self._start_inotify() else 'polling'
+        log.info(f"👀 Watching {self.directory} for ticket files ({self.mode})")
+
+        # Pick up anything written while the bot was offline
+        self._scan()
+        poller = asyncio.create_task(self._poll())
+        try:
+            while True:
+                await self._wakeup.wait()
+                # Give a burst of writes a moment to land so they drain together
+                await asyncio.sleep(self.settle_delay)
+                self._wakeup.clear()
+                batch = sorted(self._pending)
+                self._pending.clear()
+                paths = [os.path.join(self.directory, name) for name in batch]
+                paths = [path for path in paths if os.path.exists(path)]
+                if not paths:
+                    continue
+                try:
+                    await self.handler(paths)
+                except Exception as e:
+                    log.exception(f"❌ Error handling ticket batch: {e}")
+        finally:
+            poller.cancel()
+            self._stop_inotify()
+
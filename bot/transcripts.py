@@ -0,0 +1,145 @@
+#!/usr/bin/env python3
+# -*- coding: utf-8 -*-
+"""Stream a ticket channel's history into gzipped JSONL and HTML transcripts before it is deleted"""
+
+import asyncio
+import gzip
+import html
+import json
+import os
+from datetime import datetime, timezone
+
+# Discord returns at most 100 messages per history request
+PAGE_SIZE = 100
+
+_HTML_HEAD = """<!DOCTYPE html>
+<html><head><meta charset="utf-8"><title>{title}</title>
+<style>
+body{{font-family:sans-serif;background:#313338;color:#dbdee1;margin:2em}}
+.m{{margin:.6em 0}}.a{{font-weight:bold;color:#fff}}.t{{color:#949ba4;font-size:.8em;margin-left:.5em}}
+.c{{white-space:pre-wrap}}.e{{border-left:4px solid #036fff;padding:.3em .6em;margin:.3em 0;background:#2b2d31}}
+</style></head><body>
+<h1>#{title}</h1><p>Transcript generated {generated}</p>
+"""
+
+
+class Transcript:
+    __slots__ = ('jsonl_path', 'html_path', 'messages')
+
+    def __init__(self, jsonl_path, html_path, messages):
+        self.jsonl_path = jsonl_path
+        self.html_path = html_path
+        self.messages = messages
+
+
+def message_record(message):
+    """JSON-serializable form of a discord.Message"""
+    return {
+        'id': message.id,
+        'author_id': message.author.id,
+        'author': str(message.author),
+        'bot': getattr(message.author, 'bot', False),
+        'created_at': message.created_at.isoformat(),
+        'edited_at': message.edited_at.isoformat() if message.edited_at else None,
+        'content': message.content,
+        'attachments': [
+            {'filename': attachment.filename, 'url': attachment.url, 'size': attachment.size}
+            for attachment in message.attachments
+        ],
+        'embeds': [embed.to_dict() for embed in message.embeds],
+        'pinned': message.pinned,
+    }
+
+
+def _html_message(record):
+    parts = [
+        f'<div class="m" id="m{record["id"]}"><span class="a">{html.escape(record["author"])}</span>'
+        f'<span class="t">{html.escape(record["created_at"])}</span>',
+    ]
+    if record['content']:
+        parts.append(f'<div class="c">{html.escape(record["content"])}</div>')
+    for embed in record['embeds']:
+        lines = [embed.get('title'), embed.get('description')]
+        lines += [f"{field.get('name')}: {field.get('value')}" for field in embed.get('fields', [])]
+        body = '<br>'.join(html.escape(str(line)) for line in lines if line)
+        parts.append(f'<div class="e">{body}</div>')
+    for attachment in record['attachments']:
+        parts.append(f'<div><a href="{html.escape(attachment["url"])}">{html.escape(attachment["filename"])}</a></div>')
+    parts.append('</div>\n')
+    return ''.join(parts)
+
+
+class TranscriptArchiver:
+    """Pages through channel history oldest-first and appends each page to the transcript files
+
+    Only one page of messages is held in memory; compression and disk
+    writes run in a worker thread so the event loop keeps serving
+    interactions while a long ticket is archived.
+    """
+
+    def __init__(self, directory, scheduler=None, page_size=PAGE_SIZE):
+        self.directory = directory
+        self.scheduler = scheduler
+        self.page_size = page_size
+
+    def paths(self, channel, when=None):
+        when = when or datetime.now(timezone.utc)
+        folder = os.path.join(self.directory, when.strftime('%Y'), when.strftime('%m'))
+        stem = f"{channel.name}-{channel.id}"
+        return os.path.join(folder, f"{stem}.jsonl.gz"), os.path.join(folder, f"{stem}.html.gz")
+
+    async def _page(self, channel, after):
+        async def fetch():
+            return [message async for message in channel.history(limit=self.page_size, after=after, oldest_first=True)]
+        if self.scheduler is None:
+            return await fetch()
+        # Background priority: button clicks and commands go first
+        return await self.scheduler.run('read_history', fetch, key=channel.id)
+
+    async def archive(self, channel):
+        """Write the channel's transcript; returns a Transcript with the final paths"""
+        jsonl_path, html_path = self.paths(channel)
+        os.makedirs(os.path.dirname(jsonl_path), exist_ok=True)
+        jsonl_tmp, html_tmp = jsonl_path + '.tmp', html_path + '.tmp'
+        jsonl_file = gzip.open(jsonl_tmp, 'wt', encoding='utf-8')
+        html_file = gzip.open(html_tmp, 'wt', encoding='utf-8')
+        count = 0
+        try:
+            title = html.escape(channel.name)
+            html_file.write(_HTML_HEAD.format(title=title, generated=datetime.now(timezone.utc).isoformat()))
+            after = None
+            while True:
+                page = await self._page(channel, after)
+                if not page:
+                    break
+                records = [message_record(message) for message in page]
+                await asyncio.to_thread(self._write_page, jsonl_file, html_file, records)
+                count += len(records)
+                after = page[-1]
+                if len(page) < self.page_size:
+                    break
+            html_file.write(f"<p>{count} messages</p></body></html>\n")
+        except BaseException:
+            jsonl_file.close()
+            html_file.close()
+            for path in (jsonl_tmp, html_tmp):
+                if os.path.exists(path):
+                    os.remove(path)
+            raise
+        await asyncio.to_thread(self._finish, jsonl_file, html_file)
+        os.replace(jsonl_tmp, jsonl_path)
+        os.replace(html_tmp, html_path)
+        return Transcript(jsonl_path, html_path, count)
+
+    @staticmethod
+    def _write_page(jsonl_file, html_file, records):
+        for record in records:
+            jsonl_file.write(json.dumps(record, ensure_ascii=False, default=str) + '\n')
+            html_file.write(_html_message(record))
+
+    @staticmethod
+    def _finish(jsonl_file, html_file):
+        for f in (jsonl_file, html_file):
+            f.flush()
+            os.fsync(f.fileno())
+            f.close()
@@ -0,0 +1,89 @@
+#!/usr/bin/env python3
+# -*- coding: utf-8 -*-
+"""aiohttp app, routing and request helpers shared by the inline webhook server and ingest_server.py"""
+
+import json
+
+from aiohttp import web
+
+from purchases import InvalidPurchase, iter_ndjson
+
+try:
+    import aiohttp_cors
+except ImportError:
+    aiohttp_cors = None
+
+
+def wants_async(request, default=False):
+    """Async (202) unless the client or config (default) says otherwise"""
+    mode = request.query.get('mode', '').lower()
+    if mode in ('async', 'sync'):
+        return mode == 'async'
+    if 'respond-async' in request.headers.get('Prefer', '').lower():
+        return True
+    return default
+
+
+async def stream_purchase_batch(request, accept_batch, batch_size, log):
+    """Ingest newline-delimited purchases and stream back one JSON result per line
+
+    Valid purchases are handed to accept_batch(purchases) in batches of
+    batch_size; it returns one status per purchase ('queued', 'duplicate'
+    or 'failed'). Neither the request nor the response is ever held in
+    memory as a whole.
+    """
+    response = web.StreamResponse(headers={'Content-Type': 'application/x-ndjson'})
+    await response.prepare(request)
+    totals = {'queued': 0, 'duplicate': 0, 'invalid': 0, 'failed': 0}
+    pending = []
+
+    async def flush():
+        if not pending:
+            return
+        statuses = await accept_batch([purchase for _, purchase in pending])
+        lines = []
+        for (line_number, purchase), status in zip(pending, statuses):
+            totals[status] += 1
+            lines.append(json.dumps({'line': line_number, 'transactionId': purchase['transactionId'], 'status': status}))
+        pending.clear()
+        await response.write(('\n'.join(lines) + '\n').encode())
+
+    async for line_number, result in iter_ndjson(request.content.iter_any()):
+        if isinstance(result, InvalidPurchase):
+            # Keep results in line order
+            await flush()
+            totals['invalid'] += 1
+            await response.write((json.dumps({'line': line_number, 'status': 'invalid', 'error': str(result)}) + '\n').encode())
+            continue
+        pending.append((line_number, result))
+        if len(pending) >= batch_size:
+            await flush()
+    await flush()
+
+    log.info("📦 Batch ingest complete", extra=totals)
+    await response.write((json.dumps({'summary': totals}) + '\n').encode())
+    await response.write_eof()
+    return response
+
+
+def build_app(purchase, batch, status, health, metrics, middlewares=()):
+    """aiohttp application with the webhook, batch, status, health and metrics routes (CORS open to all origins)"""
+    app = web.Application(middlewares=list(middlewares))
+    app.router.add_post('/webhook/purchase', purchase)
+    app.router.add_post('/webhook/purchase/batch', batch)
+    app.router.add_get('/webhook/purchase/{transactionId}', status)
+    app.router.add_get('/health', health)
+    app.router.add_get('/metrics', metrics)
+
+    if aiohttp_cors is not None:
+        cors = aiohttp_cors.setup(app, defaults={
+            "*": aiohttp_cors.ResourceOptions(
+                allow_credentials=True,
+                expose_headers="*",
+                allow_headers="*",
+                allow_methods="*"
+            )
+        })
+        for route in list(app.router.routes()):
+            cors.add(route)
+    return app
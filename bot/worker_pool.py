@@ -0,0 +1,128 @@
+#!/usr/bin/env python3
+# -*- coding: utf-8 -*-
+"""Bounded asyncio worker pool used to create queued tickets concurrently"""
+
+import asyncio
+import inspect
+import logging
+import random
+
+log = logging.getLogger('donutmarket.worker_pool')
+
+
+class WorkerPool:
+    """Fixed number of workers draining one shared queue
+
+    Each item is retried with its own exponential backoff, so a failing
+    item never holds a worker while it waits and never blocks the others.
+    """
+
+    def __init__(self, handler, concurrency=5, max_attempts=5, base_delay=1.0,
+                 max_delay=60.0, on_give_up=None, name='pool'):
+        self.handler = handler
+        self.concurrency = max(1, concurrency)
+        self.max_attempts = max_attempts
+        self.base_delay = base_delay
+        self.max_delay = max_delay
+        self.on_give_up = on_give_up
+        self.name = name
+        # Created in start() so the queue binds to the running loop
+        self.queue = None
+        self.completed = 0
+        self.failed = 0
+        self.retried = 0
+        self._keys = set()
+        self._workers = []
+        self._retry_handles = set()
+
+    def submit(self, key, item):
+        """Queue an item unless the same key is already queued or running"""
+        if key in self._keys:
+            return False
+        self.start()
+        self._keys.add(key)
+        self.queue.put_nowait((key, item, 1))
+        return True
+
+    def start(self):
+        """Spawn the workers (idempotent)"""
+        if self._workers:
+            return
+        if self.queue is None:
+            self.queue = asyncio.Queue()
+        for index in range(self.concurrency):
+            self._workers.append(asyncio.create_task(self._worker(), name=f"{self.name}-worker-{index}"))
+
+    async def stop(self):
+        for handle in self._retry_handles:
+            handle.cancel()
+        self._retry_handles.clear()
+        for worker in self._workers:
+            worker.cancel()
+        await asyncio.gather(*self._workers, return_exceptions=True)
+        self._workers.clear()
+
+    async def join(self):
+        """Wait until every queued item (including pending retries) has settled"""
+        if self.queue is None:
+            return
+        while True:
+            await self.queue.join()
+            if not self._retry_handles:
+                return
+            await asyncio.sleep(0.05)
+
+    def backoff(self, attempt):
+        """Full-jitter exponential backoff for the given attempt number"""
+        delay = min(self.max_delay, self.base_delay * (2 ** (attempt - 1)))
+        return random.uniform(delay / 2, delay)
+
+    def _schedule_retry(self, key, item, attempt):
+        loop = asyncio.get_running_loop()
+
+        def requeue():
+            self._retry_handles.discard(handle)
+            self.queue.put_nowait((key, item, attempt))
+
+        handle = loop.call_later(self.backoff(attempt - 1), requeue)
+        self._retry_handles.add(handle)
+
+    async def _worker(self):
+        while True:
+            key, item, attempt = await self.queue.get()
+            try:
+                await self.handler(item)
+                self.completed += 1
+                self._keys.discard(key)
+            except asyncio.CancelledError:
+                raise
+            except Exception as e:
+                if attempt < self.max_attempts:
+                    self.retried += 1
+                    log.warning(f"⚠️ {self.name}: {key} failed (attempt {attempt}/{self.max_attempts}): {e} - retrying", extra={'txn': key})
+                    self._schedule_retry(key, item, attempt + 1)
+                else:
+                    self.failed += 1
+                    self._keys.discard(key)
+                    log.error(f"❌ {self.name}: giving up on {key} after {attempt} attempts: {e}", extra={'txn': key})
+                    if self.on_give_up:
+                        try:
+                            result = self.on_give_up(item, e)
+                            if inspect.isawaitable(result):
+                                await result
+                        except Exception as hook_error:
+                            log.exception(f"❌ {self.name}: give-up hook failed for {key}: {hook_error}", extra={'txn': key})
+            finally:
+                self.queue.task_done()
+
+    def stats(self):
+        queued = self.queue.qsize() if self.queue is not None else 0
+        return {
+            'concurrency': self.concurrency,
+            'queued': queued,
+            'retry_pending': len(self._retry_handles),
+            'in_flight': len(self._keys) - queued - len(self._retry_handles),
+            'completed': self.completed,
+            'retried': self.retried,
+            'failed': self.failed,
+        }